@@ -0,0 +1,194 @@
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import time
+from functools import partial
+
+from benchmark.mock_server import MockCatalog, MockWalmartServer
+from benchmark.stores import SqliteProductStore, throwaway_mysql
+from core.config import DB_CONFIG, LOG_CONFIG
+from core.http_fetcher import BotChallengeError, HttpFetcher
+from core.instrumentation import metrics, setup_logging
+from core.pipeline import parse_product_page, scrape_product_details
+from core.retry import RetryScheduler
+from core.workers import ConcurrentScraper
+from search_results_scraper import parse_search_next_data
+
+STAGES = ('driver_launch', 'page_load', 'parse', 'extract', 'db_write')
+
+
+def scrape_http(product_url, fetcher):
+    """Fast path of scrape_product_details, without its browser fallback on challenges"""
+    return parse_product_page(fetcher.get_page(product_url), product_url)
+
+
+def list_search(search_url, fetcher, attempts=5):
+    """Product URLs of every results page of a search, retrying pages that got a challenge"""
+    def next_data(url):
+        for attempt in range(attempts):
+            try:
+                return fetcher.get_next_data(url)
+            except BotChallengeError:
+                if attempt == attempts - 1:
+                    raise
+
+    product_urls, last_page_number = parse_search_next_data(next_data(search_url))
+    for page_nu in range(2, last_page_number + 1):
+        product_urls += parse_search_next_data(next_data(f"{search_url}&page={page_nu}"))[0]
+    return product_urls
+
+
+def scrape_products(product_urls, scrape, writer, workers, retry, pool_config=None):
+    """Scrape and store product_urls on workers threads, retrying failed pages"""
+    failed = 0
+    with ConcurrentScraper(workers=workers, mode='thread', domain_rate=0, pool_config=pool_config) as scraper:
+        retry.add(product_urls)
+        while True:
+            batch = retry.next_batch(wait=True)
+            if not batch:
+                return failed
+
+            for product_url, product_data, error in scraper.map(scrape, batch):
+                if error is not None:
+                    failed += 1
+                    retry.fail(product_url, error)
+                    continue
+                retry.succeed(product_url)
+                writer.add(product_data)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stage_report():
+    """count, p50 and p99 (ms) of every timed stage that ran"""
+    stages = {}
+    for stage in STAGES:
+        samples = metrics.samples('stage_duration_seconds', stage=stage)
+        if not samples:
+            continue
+        quantiles = metrics.percentiles('stage_duration_seconds', (0.5, 0.99), stage=stage)
+        stages[stage] = {
+            "count": len(samples),
+            "p50_ms": round(quantiles[0.5] * 1000, 3),
+            "p99_ms": round(quantiles[0.99] * 1000, 3),
+        }
+    return stages
+
+
+def run(args, db):
+    """Crawl the mock server's search results into db and return the report"""
+    server = MockWalmartServer(
+        MockCatalog(args.products, args.page_size),
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        captcha_rate=args.captcha_rate,
+        captcha_status=args.captcha_status
+    )
+    retry = RetryScheduler(base_delay=args.retry_delay, max_delay=args.retry_delay * 8)
+
+    with server, HttpFetcher(pool_size=args.workers, timeout=30) as fetcher, \
+            db.product_writer(batch_size=args.batch_size, handle_signals=False, upsert=True) as writer:
+        if args.browser:
+            # Every product page goes through the driver pool, as with HTTP_FAST_PATH=false
+            scrape = scrape_product_details
+            pool_config = {'max_pages': args.max_pages, 'headless': True}
+        else:
+            scrape = partial(scrape_http, fetcher=fetcher)
+            pool_config = None
+
+        started = time.perf_counter()
+        product_urls = list_search(server.search_url(args.keyword), fetcher)
+        listed = time.perf_counter()
+
+        failed = scrape_products(product_urls, scrape, writer, args.workers, retry, pool_config)
+        writer.flush()
+        elapsed = time.perf_counter() - started
+
+    children_rss = None
+    if args.browser:
+        children_rss = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+
+    pages = metrics.counter_total('pages_total')
+    return {
+        "ts": round(time.time(), 3),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "elapsed_seconds": round(elapsed, 3),
+        "listing_seconds": round(listed - started, 3),
+        "pages": int(pages),
+        "pages_per_second": round(pages / elapsed, 2),
+        "products_listed": len(product_urls),
+        "products_written": writer.rows_written,
+        "products_per_second": round(writer.rows_written / elapsed, 2),
+        "failed_attempts": failed,
+        "dead_lettered": retry.dead_lettered,
+        "server": server.stats(),
+        "stages": stage_report(),
+        # ru_maxrss is in KB on Linux; children are the Chrome processes of browser mode
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_rss_children_mb": children_rss,
+    }
+
+
+def print_report(report):
+    print(f"commit {report['commit']}, {report['products_written']}/{report['products_listed']} products "
+          f"in {report['elapsed_seconds']:.2f}s")
+    print(f"{'pages/sec':<24} {report['pages_per_second']:10.2f}")
+    print(f"{'products/sec':<24} {report['products_per_second']:10.2f}")
+    print(f"{'challenges served':<24} {report['server']['captchas']:10d}")
+    print(f"{'failed attempts':<24} {report['failed_attempts']:10d}")
+    print(f"{'peak RSS (MB)':<24} {report['peak_rss_mb']:10.1f}")
+    if report['peak_rss_children_mb']:
+        print(f"{'peak RSS children (MB)':<24} {report['peak_rss_children_mb']:10.1f}")
+    print(f"{'stage':<24} {'count':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for stage, values in report['stages'].items():
+        print(f"{stage:<24} {values['count']:10d} {values['p50_ms']:10.3f} {values['p99_ms']:10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end crawl benchmark against a local mock walmart.com")
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=40, help="products per search results page")
+    parser.add_argument("--keyword", default="bread italian")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay of every mock response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="random extra delay of every mock response")
+    parser.add_argument("--captcha-rate", type=float, default=0, help="share of responses answered with a captcha")
+    parser.add_argument("--captcha-status", type=int, default=200, help="status of challenge responses (200, 403, 429)")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="base backoff before retrying a page")
+    parser.add_argument("--batch-size", type=int, default=100, help="rows per DB write")
+    parser.add_argument("--db", choices=('sqlite', 'mysql'), default='sqlite')
+    parser.add_argument("--sqlite-path", default=':memory:')
+    parser.add_argument("--browser", action="store_true", help="load product pages in Chrome instead of over HTTP")
+    parser.add_argument("--max-pages", type=int, default=20, help="pages per driver before it is recycled")
+    parser.add_argument("--output", help="append the report as one JSON line to this file")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    setup_logging(args.log_level, LOG_CONFIG['format'])
+    metrics.keep_samples = True
+
+    if args.db == 'mysql':
+        # DB_CONFIG without its database: a fresh one is created and dropped
+        with throwaway_mysql(DB_CONFIG) as db:
+            report = run(args, db)
+    else:
+        db = SqliteProductStore(args.sqlite_path)
+        try:
+            report = run(args, db)
+        finally:
+            db.close()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(report) + "\n")
@@ -0,0 +1,94 @@
+import argparse
+import glob
+import json
+import os
+import re
+import time
+
+from core import next_data
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+NEXT_DATA_PATTERN = re.compile(r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL)
+
+
+def load_pages(pattern, pad_kb=0):
+    """Read fixture pages, optionally padded with extra markup to mimic full-size pages"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, pattern))):
+        with open(path, 'rb') as f:
+            page = f.read()
+        if pad_kb:
+            filler = b'<div class="flex items-center mv2"><span class="f6 gray">filler</span></div>\n'
+            padding = filler * (pad_kb * 1024 // len(filler))
+            page = page.replace(b'<div id="__next">', b'<div id="__next">' + padding, 1)
+        pages.append((os.path.basename(path), page))
+    return pages
+
+
+def product_with_bs4(page):
+    soup = BeautifulSoup(page.decode('utf-8'), 'html.parser')
+    payload = json.loads(soup.find('script', {'id': '__NEXT_DATA__'}).text)
+    return payload['props']['pageProps']['initialData']['data']['product']
+
+
+def product_with_regex(page):
+    payload = json.loads(NEXT_DATA_PATTERN.search(page.decode('utf-8')).group(1))
+    return payload['props']['pageProps']['initialData']['data']['product']
+
+
+def product_with_scan_json(page):
+    payload = json.loads(next_data.find_next_data(page))
+    return payload['props']['pageProps']['initialData']['data']['product']
+
+
+def product_with_scan_fast(page):
+    return next_data.extract_product(page)
+
+
+def product_with_stream(page):
+    return next_data.extract_product(page, stream=True)
+
+
+def candidates():
+    methods = []
+    if BeautifulSoup is not None:
+        methods.append(('bs4 html.parser + json', product_with_bs4))
+    methods.append(('regex + json', product_with_regex))
+    methods.append(('byte scan + json', product_with_scan_json))
+    if next_data.orjson is not None:
+        methods.append(('byte scan + orjson', product_with_scan_fast))
+    if next_data.ijson is not None:
+        methods.append(('byte scan + ijson stream', product_with_stream))
+    return methods
+
+
+def bench(func, pages, rounds):
+    """Return the mean milliseconds per page over rounds passes on all pages"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for _, page in pages:
+            func(page)
+    return (time.perf_counter() - started) * 1000 / (rounds * len(pages))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark of __NEXT_DATA__ product extraction")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--pad-kb", type=int, default=0, help="extra markup added to every page")
+    args = parser.parse_args()
+
+    pages = load_pages('product_*.html', args.pad_kb)
+    size_kb = sum(len(page) for _, page in pages) / len(pages) / 1024
+    print(f"{len(pages)} product pages, {size_kb:.0f} KB on average, {args.rounds} rounds")
+
+    # Every method has to extract the same product
+    expected = product_with_scan_json(pages[0][1])
+    for name, func in candidates():
+        assert func(pages[0][1])['usItemId'] == expected['usItemId'], name
+        print(f"{name:<28} {bench(func, pages, args.rounds):8.3f} ms/page")
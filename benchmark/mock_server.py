@@ -0,0 +1,260 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from benchmark.bench_next_data import load_pages
+from core.next_data import extract_product
+
+HUB_PATH = '/cp/food/976759'
+
+SUBCATEGORIES = [
+    "Bread", "Milk", "Eggs", "Cheese", "Coffee", "Snacks", "Cereal", "Frozen Pizza",
+    "Fresh Fruit", "Fresh Vegetables", "Yogurt", "Pasta",
+]
+
+CAPTCHA_PAGE = (
+    b'<!DOCTYPE html><html><head><title>Robot or human?</title></head><body>'
+    b'<h1>Robot or human?</h1><p>Activate and hold the button to confirm that you\xe2\x80\x99re human.</p>'
+    b'<div id="px-captcha"></div></body></html>'
+)
+
+
+def next_data_script(payload: Dict) -> str:
+    return f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(payload)}</script>'
+
+
+class MockCatalog:
+    def __init__(self, products: int = 200, page_size: int = 40, seed: int = 42):
+        """
+        Fake product catalog built from the recorded product pages in benchmark/fixtures
+
+        Every product is a copy of one fixture page with its item id swapped, so
+        pages have the size and structure of real ones.
+        """
+        self.page_size = page_size
+        self.base_url = ''
+
+        self._templates = []
+        for _, page in load_pages('product_*.html'):
+            product = extract_product(page)
+            self._templates.append((str(product['usItemId']), product, page))
+
+        rng = random.Random(seed)
+        self.items = []
+        for index in range(products):
+            _, product, _ = self._templates[index % len(self._templates)]
+            self.items.append({
+                "item_id": str(100000000 + index),
+                "template": index % len(self._templates),
+                "name": f"{product.get('name', 'Product')} #{index}",
+                "price": round(rng.uniform(0.5, 30), 2),
+            })
+        self._by_id = {item['item_id']: item for item in self.items}
+
+    @property
+    def max_page(self) -> int:
+        return max(1, -(-len(self.items) // self.page_size))
+
+    def product_url(self, item: Dict) -> str:
+        return f"{self.base_url}/ip/product-{item['item_id']}/{item['item_id']}"
+
+    def product_page(self, item_id: str) -> Optional[bytes]:
+        item = self._by_id.get(item_id)
+        if item is None:
+            return None
+        original_id, _, page = self._templates[item['template']]
+        return page.replace(original_id.encode(), item_id.encode())
+
+    def tile(self, item: Dict) -> Dict:
+        """Search results tile of one product, shaped like Walmart's itemStacks items"""
+        return {
+            "__typename": "Product",
+            "usItemId": item['item_id'],
+            "canonicalUrl": self.product_url(item),
+            "name": item['name'],
+            "priceInfo": {"currentPrice": {"price": item['price'], "priceString": f"${item['price']:.2f}"}},
+            "imageInfo": {"thumbnailUrl": f"{self.base_url}/images/{item['item_id']}.jpeg"},
+            "availabilityStatusV2": {"value": "IN_STOCK"},
+            "fulfillmentSummary": [{"storeId": "3081"}],
+        }
+
+    def listing_page(self, page: int) -> bytes:
+        """Search / browse results page with an item stack, pagination and __NEXT_DATA__"""
+        page = min(max(page, 1), self.max_page)
+        items = self.items[(page - 1) * self.page_size:page * self.page_size]
+
+        anchors = ''.join(f'<a href="{self.product_url(item)}">{item["name"]}</a>' for item in items)
+        pages = ''.join(
+            f'<li><a data-automation-id="page-number" href="?page={number}">{number}</a></li>'
+            for number in range(1, self.max_page + 1)
+        )
+        payload = {"props": {"pageProps": {"initialData": {"searchResult": {
+            "itemStacks": [{"items": [self.tile(item) for item in items]}],
+            "paginationV2": {"maxPage": self.max_page},
+        }}}}}
+
+        return (
+            '<!DOCTYPE html><html><head><title>Search - Walmart.com</title></head><body><div id="__next">'
+            f'<div data-testid="item-stack">{anchors}</div>'
+            f'<ul class="list flex items-center justify-center pa0">{pages}</ul>'
+            f'</div>{next_data_script(payload)}</body></html>'
+        ).encode()
+
+    def hub_page(self) -> bytes:
+        """Category hub page listing subcategory links, plus the two trailing links the scraper skips"""
+        links = [f'<a href="{self.base_url}/browse/food/{name.lower().replace(" ", "-")}/976759_{index}">{name}</a>'
+                 for index, name in enumerate(SUBCATEGORIES)]
+        links += [f'<a href="{self.base_url}/cp/deals">Deals</a>', f'<a href="{self.base_url}/cp/all">All</a>']
+        payload = {"props": {"pageProps": {"initialData": {"contentLayout": {"modules": []}}}}}
+        return (
+            '<!DOCTYPE html><html><head><title>Food - Walmart.com</title></head><body><div id="__next">'
+            f'<div id="Hubspokes4orNxMGrid">{"".join(links)}</div>'
+            f'</div>{next_data_script(payload)}</body></html>'
+        ).encode()
+
+
+class MockWalmartServer:
+    def __init__(self, catalog: MockCatalog, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, captcha_rate: float = 0.0,
+                 captcha_status: int = 200, seed: int = 42):
+        """
+        Local HTTP server answering like walmart.com for benchmarks
+
+        Serves the category hub (HUB_PATH), paginated /search and /browse
+        results pages, /ip/ product pages and robots.txt from a MockCatalog.
+
+        Args:
+            catalog: Products served
+            port: 0 picks a free port, see base_url
+            latency: Seconds every response is delayed by
+            jitter: Up to this many seconds are added to latency at random
+            captcha_rate: Share of responses replaced by a bot challenge page
+            captcha_status: Status code of the challenge (200 = captcha page, 429 / 403 = blocked status)
+        """
+        self.catalog = catalog
+        self.latency = latency
+        self.jitter = jitter
+        self.captcha_rate = captcha_rate
+        self.captcha_status = captcha_status
+
+        self.requests = 0
+        self.captchas = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        catalog.base_url = self.base_url
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def search_url(self, keyword: str) -> str:
+        return f"{self.base_url}/search?q={keyword.replace(' ', '+')}"
+
+    def _roll(self):
+        """Delay to apply and whether to answer with a challenge"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            challenge = self.captcha_rate > 0 and self._random.random() < self.captcha_rate
+            if challenge:
+                self.captchas += 1
+        return delay, challenge
+
+    def route(self, path: str, query: Dict) -> Optional[bytes]:
+        if path == '/robots.txt':
+            return b"User-agent: *\n"
+        if path == HUB_PATH:
+            return self.catalog.hub_page()
+        if path.startswith(('/search', '/browse/')):
+            return self.catalog.listing_page(int(query.get('page', ['1'])[0]))
+        if path.startswith('/ip/'):
+            return self.catalog.product_page(path.rstrip('/').rsplit('/', 1)[-1])
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                delay, challenge = server._roll()
+                if delay:
+                    time.sleep(delay)
+
+                parts = urlparse(self.path)
+                if challenge and parts.path != '/robots.txt':
+                    self._send(server.captcha_status, CAPTCHA_PAGE)
+                    return
+
+                body = server.route(parts.path, parse_qs(parts.query))
+                if body is None:
+                    self._send(404, b"Not found")
+                else:
+                    self._send(200, body)
+
+            def _send(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def stats(self) -> Dict:
+        return {"requests": self.requests, "captchas": self.captchas}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a mock walmart.com for benchmarks")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--captcha-rate", type=float, default=0, help="share of responses answered with a captcha")
+    parser.add_argument("--captcha-status", type=int, default=200)
+    args = parser.parse_args()
+
+    server = MockWalmartServer(
+        MockCatalog(args.products, args.page_size),
+        port=args.port,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        captcha_rate=args.captcha_rate,
+        captcha_status=args.captcha_status
+    )
+    print(f"Serving {args.products} products on {server.base_url}")
+    print(f"  hub:     {server.base_url}{HUB_PATH}")
+    print(f"  search:  {server.search_url('bread italian')}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+import mysql.connector
+
+from core.database import PRODUCT_COLUMNS, PRODUCT_KEY_COLUMNS, BufferedProductWriter, DatabaseManager
+
+# products table of the README schema, migrations included
+MYSQL_PRODUCTS_TABLE = """
+    CREATE TABLE products (
+        id SERIAL PRIMARY KEY,
+        item_id VARCHAR(64),
+        upc VARCHAR(64),
+        product_id VARCHAR(64),
+        url TEXT,
+        url_hash CHAR(32),
+        NAME VARCHAR(1000),
+        categories JSON,
+        image TEXT,
+        store_id VARCHAR(64),
+        store_location VARCHAR(255),
+        price VARCHAR(64),
+        mrp VARCHAR(64),
+        discount VARCHAR(32),
+        availability VARCHAR(32),
+        keyword VARCHAR(255),
+        size VARCHAR(64),
+        size_quantity DECIMAL(12, 3),
+        size_unit VARCHAR(16),
+        last_scraped_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        price_changes INT NOT NULL DEFAULT 0,
+        price_changed_at DATETIME,
+        INDEX idx_products_url_hash (url_hash),
+        INDEX idx_products_item_id (item_id),
+        UNIQUE INDEX uq_products_item_store (item_id, store_id)
+    )
+"""
+
+
+class SqliteProductStore:
+    def __init__(self, path: str = ':memory:'):
+        """
+        products table in SQLite, for benchmarks without a MySQL server
+
+        Offers the insert_product_rows() of DatabaseManager, so the regular
+        BufferedProductWriter can write to it (see product_writer).
+        """
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.connection.execute(f"""
+            CREATE TABLE IF NOT EXISTS products (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {', '.join(f'{column} TEXT' for column in PRODUCT_COLUMNS)},
+                last_scraped_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE ({', '.join(PRODUCT_KEY_COLUMNS)})
+            )
+        """)
+
+    def insert_product_rows(self, rows: List[tuple], upsert: bool = False):
+        """Same contract as DatabaseManager.insert_product_rows"""
+        if not rows:
+            return
+
+        query = f"""
+            INSERT {'' if upsert else 'OR IGNORE '}INTO products ({', '.join(PRODUCT_COLUMNS)})
+            VALUES ({', '.join(['?'] * len(PRODUCT_COLUMNS))})
+        """
+        if upsert:
+            query += f"""
+                ON CONFLICT ({', '.join(PRODUCT_KEY_COLUMNS)}) DO UPDATE SET
+                {', '.join(f'{column} = excluded.{column}' for column in PRODUCT_COLUMNS if column not in PRODUCT_KEY_COLUMNS)},
+                last_scraped_at = CURRENT_TIMESTAMP
+            """
+        with self._lock, self.connection:
+            self.connection.executemany(query, rows)
+
+    def product_writer(self, batch_size: int = 100, flush_interval: float = 5.0,
+                       handle_signals: bool = True, upsert: bool = False) -> BufferedProductWriter:
+        return BufferedProductWriter(self, batch_size, flush_interval, handle_signals, upsert)
+
+    def count_products(self) -> int:
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+@contextmanager
+def throwaway_mysql(db_config: Dict, name: str = ''):
+    """
+    DatabaseManager on a MySQL database created for one benchmark run and
+    dropped afterwards, holding only the products table
+    """
+    name = name or f"walmart_bench_{os.getpid()}"
+    server_config = {key: value for key, value in db_config.items() if key != 'database'}
+    admin = mysql.connector.connect(**server_config)
+    cursor = admin.cursor()
+    cursor.execute(f"CREATE DATABASE `{name}`")
+    try:
+        with DatabaseManager({**db_config, 'database': name}) as db:
+            db.execute_query(MYSQL_PRODUCTS_TABLE)
+            yield db
+    finally:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+        cursor.close()
+        admin.close()
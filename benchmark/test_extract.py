@@ -0,0 +1,85 @@
+import random
+import re
+
+import pytest
+
+from benchmark.bench_next_data import load_pages
+from core.extract import extract_size, fill_product_data
+from core.next_data import extract_product
+
+# Needs the benchmark fixture: pip install pytest-benchmark
+pytest.importorskip('pytest_benchmark')
+
+TITLES = 20000
+PAYLOAD_COPIES = 300
+
+LEGACY_SIZE_PATTERNS = [
+    r'(\d+\.?\d*)\s*(?:fl\s*)?oz',
+    r'(\d+)\s*lb',
+    r'(\d+)\s*g',
+    r'(\d+)\s*ml',
+    r'(\d+)\s*l',
+    r'Pack of (\d+)',
+]
+
+TITLE_PARTS = [
+    "Great Value", "Freshness Guaranteed", "Nature's Own", "Sara Lee", "Marketside",
+    "Italian Bread", "Whole Wheat Sandwich Bread", "Garlic Knots", "Sourdough Loaf", "Brioche Buns",
+    "Organic", "Gluten Free", "Thick Sliced", "Family Size", "Soft",
+]
+TITLE_SIZES = ["20 oz", "16 oz Loaf", "12 fl oz", "2 lb", "500 g", "750 ml", "1 L", "Pack of 4", "12 ct", ""]
+
+
+def legacy_extract_size(title):
+    """extract_size as it was duplicated in both scrapers: six separate re.search calls"""
+    for pattern in LEGACY_SIZE_PATTERNS:
+        match = re.search(pattern, title, re.IGNORECASE)
+        if match:
+            return match.group(0)
+    return ''
+
+
+def title_corpus(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(TITLE_PARTS)} {rng.choice(TITLE_PARTS)} {rng.choice(TITLE_PARTS)}, {rng.choice(TITLE_SIZES)}"
+        for _ in range(count)
+    ]
+
+
+def payload_corpus(copies):
+    """Product payloads of the fixture pages, repeated to the wanted corpus size"""
+    payloads = [extract_product(page) for _, page in load_pages('product_*.html')]
+    return payloads * copies
+
+
+def map_all(func, items):
+    return [func(item) for item in items]
+
+
+@pytest.fixture(scope='module')
+def titles():
+    return title_corpus(TITLES)
+
+
+@pytest.fixture(scope='module')
+def payloads():
+    return payload_corpus(PAYLOAD_COPIES)
+
+
+@pytest.mark.benchmark(group='extract_size')
+def test_legacy_extract_size(benchmark, titles):
+    sizes = benchmark(map_all, legacy_extract_size, titles)
+    assert len(sizes) == len(titles)
+
+
+@pytest.mark.benchmark(group='extract_size')
+def test_extract_size(benchmark, titles):
+    sizes = benchmark(map_all, extract_size, titles)
+    assert len(sizes) == len(titles)
+
+
+@pytest.mark.benchmark(group='fill_product_data')
+def test_fill_product_data(benchmark, payloads):
+    rows = benchmark(map_all, fill_product_data, payloads)
+    assert all(row['item_id'] for row in rows)
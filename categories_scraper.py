@@ -1,94 +1,101 @@
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from core.database import DatabaseManager
-from core.config import DB_CONFIG
+from core.config import DB_CONFIG, DRIVER_POOL_CONFIG, HTTP_FETCHER_CONFIG, RESPONSE_CACHE_CONFIG, LOG_CONFIG, METRICS_CONFIG, RATE_LIMIT_CONFIG, CATEGORY_TREE_CONFIG
+from core.category_tree import CategoryTreeDiscovery, diff_subcategories
 from core.driver_setup import get_driver
+from core.driver_pool import DriverPool
+from core.http_fetcher import HttpFetcher, BotChallengeError
+from core.response_cache import ResponseCache
+from core.rate_limiter import AdaptiveRateLimiter
+from core.instrumentation import start_instrumentation
+import argparse
+import logging
 
-def scrape_subcategories(category_name, category_url):
-    """Scrapes subcategory for each given category page URL."""
-    driver = get_driver(headless=True)
-    print("Opening: ", category_url)
-    driver.get(category_url)
+logger = logging.getLogger(__name__)
 
-    wait = WebDriverWait(driver, 10)
 
-    # Get all the subcategory anchor tags
-    try:
-        subcat_elements= wait.until(
-            EC.visibility_of_element_located((By.ID, "Hubspokes4orNxMGrid"))
-        ).find_elements(By.TAG_NAME, "a")
-    except Exception:
-        # Check if it's a product page
+def fetch_category_page(category_url, pool=None, fetcher=None):
+    """HTML of a category page, fetched without a browser when possible"""
+    if fetcher is not None:
         try:
-            driver.find_element(By.CSS_SELECTOR, "[data-testid='item-stack']")
-            return [{
-                "category_name": category_name,
-                "category_url": category_url,
-                "subcategory_name": category_name,
-                "subcategory_url": category_url
-            }]
-        except Exception:
-            raise
-
-    print("Total subcategories found: ", len(subcat_elements))
-
-    subcategories = []
+            logger.debug("Fetching %s", category_url)
+            return fetcher.get_page(category_url)
+        except BotChallengeError as e:
+            logger.warning("%s, falling back to browser", e)
 
-    for subcat_a in subcat_elements:
-        subcategories.append({
-            "category_name": category_name,
-            "category_url": category_url,
-            "subcategory_name": subcat_a.text,
-            "subcategory_url": subcat_a.get_attribute('href')
-        })
-    
-    driver.close()
-    del driver
-    
-    return subcategories
+    logger.debug("Opening %s", category_url)
+    if pool is not None:
+        with pool.driver() as pooled:
+            return pooled.get(category_url)
 
-
-def scrape_categories():
-    """Scrape category names and URLs from Kroger's homepage"""
-    page_url = "https://www.walmart.com/cp/food/976759"
     driver = get_driver(headless=True)
     try:
-        # Open URL in current tab
-        driver.get(page_url)
-
-        wait = WebDriverWait(driver, 10)  # 10 second timeout
-
-        # Get all the category divs
-        category_elements= wait.until(
-            EC.visibility_of_element_located((By.ID, "Hubspokes4orNxMGrid"))
-        ).find_elements(By.TAG_NAME, "a")[:-2]  # slice last two, since they contain irrelevant categories
-
-        print("Total Grocery categories found: ", len(category_elements))
-
-        categories = []
-
-        for cat_a in category_elements:
-            category = {
-                "category_name": cat_a.text,
-                "category_url": cat_a.get_attribute('href')
-            }
-
-            categories.append(category)
-        
-        return categories
-
+        driver.get(category_url)
+        return driver.page_source
     finally:
-        driver.close()
-        del driver
+        # quit() ends the chromedriver process too, close() only the window
+        driver.quit()
+
 
 if __name__ == "__main__":
-    # PS: Opening URLs in current window's tab yields captcha, to deal with it, we'll open URLs in whole new chrome instance repteadly
-    with DatabaseManager(DB_CONFIG) as db:
-        categories = scrape_categories()
-        
-        for cat in categories:
-            subcategories = scrape_subcategories(cat['category_name'], cat['category_url'])
-            db.insert_subcategories(subcategories)
+    parser = argparse.ArgumentParser(description="Discover the category tree and sync the subcategories table")
+    parser.add_argument("--max-depth", type=int, default=CATEGORY_TREE_CONFIG['max_depth'],
+                        help="depth of the stored subcategories, the root hub's categories are depth 1")
+    parser.add_argument("--dry-run", action="store_true", help="only log what would change")
+    args = parser.parse_args()
+
+    # PS: Opening URLs in current window's tab yields captcha, to deal with it, drivers are
+    # kept warm in a pool and recycled after a few pages or as soon as a captcha shows up
+    exporter = start_instrumentation(LOG_CONFIG, METRICS_CONFIG)
+
+    rate_limiter = None
+    if RATE_LIMIT_CONFIG['enabled']:
+        rate_limiter = AdaptiveRateLimiter(**RATE_LIMIT_CONFIG['limits'])
+
+    cache = None
+    if RESPONSE_CACHE_CONFIG['enabled']:
+        cache = ResponseCache(
+            RESPONSE_CACHE_CONFIG['directory'],
+            ttls=RESPONSE_CACHE_CONFIG['ttls'],
+            max_bytes=RESPONSE_CACHE_CONFIG['max_bytes']
+        )
+
+    fetcher = None
+    if HTTP_FETCHER_CONFIG['enabled']:
+        fetcher = HttpFetcher(
+            pool_size=HTTP_FETCHER_CONFIG['pool_size'],
+            timeout=HTTP_FETCHER_CONFIG['timeout'],
+            cache=cache,
+            rate_limiter=rate_limiter
+        )
 
-        print("Total categories scraped: ", len(categories))
\ No newline at end of file
+    try:
+        with DatabaseManager(DB_CONFIG) as db, DriverPool(**DRIVER_POOL_CONFIG, rate_limiter=rate_limiter) as pool:
+            discovery = CategoryTreeDiscovery(
+                lambda url: fetch_category_page(url, pool, fetcher),
+                max_depth=args.max_depth,
+                concurrency=CATEGORY_TREE_CONFIG['concurrency'],
+                cache=cache
+            )
+            discovered = discovery.discover(CATEGORY_TREE_CONFIG['root_url'])
+            logger.info("Discovered %d subcategories: %s", len(discovered), discovery.stats())
+
+            added, changed, removed = diff_subcategories(db.get_subcategory_nodes(), discovered)
+            if discovery.failed or not discovered:
+                # Subcategories below a page that failed to load were not seen, they are not gone
+                logger.warning("%d category pages failed, keeping %d subcategories not seen", len(discovery.failed), len(removed))
+                removed = []
+
+            logger.info("Subcategory changes: %d added, %d changed, %d removed", len(added), len(changed), len(removed))
+            if not args.dry_run:
+                db.sync_subcategories(added, changed, removed)
+    finally:
+        if fetcher is not None:
+            logger.info("HTTP fetcher stats: %s", fetcher.stats())
+            fetcher.close()
+        if rate_limiter is not None:
+            logger.info("Rate limiter stats: %s", rate_limiter.stats())
+        if cache is not None:
+            logger.info("Response cache stats: %s", cache.stats())
+            cache.close()
+        if exporter is not None:
+            exporter.stop()
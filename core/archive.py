@@ -0,0 +1,180 @@
+import glob
+import json
+import mmap
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from core.dedup import item_id_from_url
+
+# Segment extension per codec, so a reader knows how to decompress a segment
+CODEC_EXTENSIONS = {'zstd': '.zst', 'zlib': '.zz'}
+
+# Writers unpickled in a worker process, one per archive directory
+_process_writers = {}
+
+
+def _compressor(codec: str, level: int):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress
+    return lambda data: zlib.compress(data, level)
+
+
+def _decompressor(codec: str):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress
+    return zlib.decompress
+
+
+class PageArchiveWriter:
+    def __init__(self, directory: str, segment_size: int = 256 * 1024 * 1024, level: int = 3):
+        """
+        Append-only archive of raw __NEXT_DATA__ payloads
+
+        Every record is compressed on its own (zstd when the zstandard package is
+        installed, zlib otherwise) and appended to the current segment file. Its
+        offset and length go to the segment's .idx file (one JSON line per record)
+        so a reader can slice records straight out of a memory-mapped segment.
+
+        Args:
+            directory: Where segment and index files are written
+            segment_size: Bytes after which a new segment is started
+            level: Compression level
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.level = level
+        self.codec = 'zstd' if zstandard is not None else 'zlib'
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._segment = None
+        self._index = None
+        self._offset = 0
+        self._compress = None
+
+        self.records_written = 0
+        self.bytes_written = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def __reduce__(self):
+        # Open files and locks stay in the process that created them; every task
+        # sent to a worker process shares that process's own writer instead
+        return _process_writer, (self.directory, self.segment_size, self.level)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _open_segment(self):
+        self._close_segment()
+
+        name = f"segment-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{self.records_written:08d}"
+        path = os.path.join(self.directory, name + CODEC_EXTENSIONS[self.codec])
+        self._segment = open(path, 'ab')
+        self._index = open(os.path.join(self.directory, name + '.idx'), 'a', encoding='utf-8')
+        self._offset = self._segment.tell()
+        self._compress = _compressor(self.codec, self.level)
+        self._pid = os.getpid()
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = None
+            self._index = None
+
+    def append(self, url: str, next_data: bytes, item_id: Optional[str] = None):
+        """Compress and append the raw __NEXT_DATA__ of one product page"""
+        with self._lock:
+            if self._segment is None or self._pid != os.getpid() or self._offset >= self.segment_size:
+                self._open_segment()
+
+            record = self._compress(next_data)
+            self._segment.write(record)
+            # Flush data before the index entry pointing at it
+            self._segment.flush()
+            self._index.write(json.dumps({
+                "offset": self._offset,
+                "length": len(record),
+                "url": url,
+                "item_id": item_id or item_id_from_url(url),
+                "ts": int(time.time()),
+            }) + "\n")
+            self._index.flush()
+
+            self._offset += len(record)
+            self.records_written += 1
+            self.bytes_written += len(record)
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+
+    def stats(self) -> Dict:
+        return {
+            "records_written": self.records_written,
+            "bytes_written": self.bytes_written,
+            "codec": self.codec,
+        }
+
+
+def _process_writer(directory: str, segment_size: int, level: int) -> PageArchiveWriter:
+    if directory not in _process_writers:
+        _process_writers[directory] = PageArchiveWriter(directory, segment_size, level)
+    return _process_writers[directory]
+
+
+def list_segments(directory: str) -> List[str]:
+    """Segment files of an archive directory, oldest first"""
+    segments = []
+    for extension in CODEC_EXTENSIONS.values():
+        segments += glob.glob(os.path.join(directory, f"segment-*{extension}"))
+    return sorted(segments)
+
+
+def iter_segment(segment_path: str) -> Iterator[Tuple[Dict, bytes]]:
+    """Yield (index entry, raw __NEXT_DATA__ bytes) for every record of one segment"""
+    base, extension = os.path.splitext(segment_path)
+    codec = {ext: codec for codec, ext in CODEC_EXTENSIONS.items()}[extension]
+    if codec == 'zstd' and zstandard is None:
+        raise RuntimeError(f"zstandard is required to read {segment_path}")
+    decompress = _decompressor(codec)
+
+    if os.path.getsize(segment_path) == 0:
+        return
+
+    with open(segment_path, 'rb') as segment, open(base + '.idx', encoding='utf-8') as index:
+        with mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for line in index:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                end = entry['offset'] + entry['length']
+                if end > len(data):
+                    # Index entry of a record that never made it to disk
+                    break
+                yield entry, decompress(data[entry['offset']:end])
+
+
+class PageArchiveReader:
+    def __init__(self, directory: str):
+        """Read the records of an archive written by PageArchiveWriter"""
+        self.directory = directory
+
+    def segments(self) -> List[str]:
+        return list_segments(self.directory)
+
+    def __iter__(self) -> Iterator[Tuple[Dict, bytes]]:
+        for segment_path in self.segments():
+            yield from iter_segment(segment_path)
@@ -0,0 +1,69 @@
+import re
+from typing import Optional, Union
+from urllib.parse import urlparse
+
+# Titles of Walmart's bot-check interstitial and of the CDN's denial page (served
+# with a 200 as often as with a 403), with the kind of block each one stands for.
+# Only the <title> in the page's head is looked at: the same words in the
+# description or reviews of a real product page do not make it a block.
+BLOCKED_PAGE_TITLES = {
+    "robot or human?": 'robot_check',
+    "access denied": 'access_denied',
+}
+TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+
+# The PerimeterX challenge widget; in the JSON of a real page the quotes of
+# such markup would be escaped, so only a rendered element matches
+CAPTCHA_CONTAINER_PATTERN = re.compile(r'<div[^>]*\sid=["\']px-captcha["\']', re.IGNORECASE)
+
+# Path Walmart redirects a blocked client to (/blocked?url=...)
+BLOCKED_PATH = '/blocked'
+
+# Status codes Walmart answers with when it wants a browser challenge solved or
+# sheds load from a client it considers too fast (503)
+CHALLENGE_STATUS_CODES = (403, 412, 429, 503)
+
+
+class BlockedError(Exception):
+    """Raised when a page turned out to be a captcha / robot check instead of the real page"""
+
+    def __init__(self, message: str, reason: Optional[str] = None):
+        super().__init__(message)
+        self.reason = reason
+
+
+def detect_block(page_source: Union[str, bytes, None] = None, status_code: Optional[int] = None,
+                 url: Optional[str] = None) -> Optional[str]:
+    """
+    Tell whether a response is a block and why
+
+    Args:
+        page_source: Body of the response / page source of the browser
+        status_code: HTTP status of the response, if known
+        url: URL the response was finally served from, after redirects
+
+    Returns:
+        The block reason ('captcha', 'robot_check', 'blocked', 'access_denied', 'http_<status>'),
+        or None for a regular page
+    """
+    if status_code in CHALLENGE_STATUS_CODES:
+        return f"http_{status_code}"
+    if url and urlparse(url).path.rstrip('/') == BLOCKED_PATH:
+        return 'blocked'
+    if not page_source:
+        return None
+
+    if isinstance(page_source, bytes):
+        page_source = page_source.decode('utf-8', errors='ignore')
+
+    head_end = page_source.find('</head>')
+    title = TITLE_PATTERN.search(page_source if head_end < 0 else page_source[:head_end])
+    if title is not None:
+        title_text = title.group(1).strip().lower()
+        for marker, reason in BLOCKED_PAGE_TITLES.items():
+            if marker in title_text:
+                return reason
+
+    if CAPTCHA_CONTAINER_PATTERN.search(page_source):
+        return 'captcha'
+    return None
@@ -0,0 +1,236 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import urljoin
+
+from core.dedup import url_hash
+
+logger = logging.getLogger(__name__)
+
+# Element of a category hub page holding the links to its subcategories
+HUB_GRID_ID = 'Hubspokes4orNxMGrid'
+
+# Marker of a results (listing) page, which has products instead of subcategories
+LISTING_MARKER = b'data-testid="item-stack"'
+
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class _GridClosed(Exception):
+    pass
+
+
+class HubLinkParser(HTMLParser):
+    """Collects (text, href) of every link inside the element with id grid_id"""
+
+    def __init__(self, grid_id: str = HUB_GRID_ID):
+        super().__init__(convert_charrefs=True)
+        self.grid_id = grid_id
+        self.links: List[Tuple[str, str]] = []
+        self._depth = 0
+        self._href = None
+        self._text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if not self._depth:
+            if dict(attrs).get('id') == self.grid_id:
+                self._depth = 1
+            return
+
+        if tag not in VOID_ELEMENTS:
+            self._depth += 1
+        if tag == 'a':
+            self._href = dict(attrs).get('href')
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if not self._depth or tag in VOID_ELEMENTS:
+            return
+        if tag == 'a' and self._href:
+            self.links.append((' '.join(''.join(self._text).split()), self._href))
+            self._href = None
+        self._depth -= 1
+        if not self._depth:
+            # Nothing after the grid is needed
+            raise _GridClosed
+
+    def handle_data(self, data):
+        if self._href:
+            self._text.append(data)
+
+
+def parse_category_page(page: Union[str, bytes], page_url: str) -> Dict:
+    """
+    Subcategory links of a category page, and whether it is a listing page instead
+
+    Returns:
+        {"links": [[name, absolute url], ...], "listing": bool}
+    """
+    if isinstance(page, str):
+        page = page.encode('utf-8')
+
+    links = []
+    start = page.find(f'id="{HUB_GRID_ID}"'.encode())
+    if start != -1:
+        # Parse from the grid's start tag on instead of the whole page
+        parser = HubLinkParser()
+        try:
+            parser.feed(page[page.rfind(b'<', 0, start):].decode('utf-8', errors='replace'))
+            parser.close()
+        except _GridClosed:
+            pass
+        links = [[name, urljoin(page_url, href)] for name, href in parser.links]
+
+    return {"links": links, "listing": LISTING_MARKER in page}
+
+
+def subcategory_row(category: Dict, node: Dict) -> Dict:
+    return {
+        "category_name": category['name'],
+        "category_url": category['url'],
+        "subcategory_name": node['name'],
+        "subcategory_url": node['url'],
+        "url_hash": url_hash(node['url']),
+    }
+
+
+class CategoryTreeDiscovery:
+    def __init__(self, fetch_page: Callable[[str], Union[str, bytes]], max_depth: int = 2,
+                 concurrency: int = 4, cache=None, root_trailing_links: int = 2):
+        """
+        Discover the category tree below a hub page, one level at a time
+
+        All pages of a level are loaded concurrently. A hub page's links become
+        the next level; a node without a hub grid that lists products is a
+        leaf, stored as its own subcategory. Nodes at max_depth are stored as
+        subcategories of their parent without being loaded. A URL reached from
+        several branches is kept once, under the first parent in page order,
+        so repeated runs produce the same tree.
+
+        Args:
+            fetch_page: Returns the HTML of a category page
+            max_depth: Depth of the stored subcategories (root = 0, its categories = 1)
+            concurrency: Pages loaded at once
+            cache: Optional ResponseCache the parsed links of every page are kept in
+            root_trailing_links: Links at the end of the root hub that are no
+                grocery categories and are skipped
+        """
+        self.fetch_page = fetch_page
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.cache = cache
+        self.root_trailing_links = root_trailing_links
+
+        self._lock = threading.Lock()
+        self.pages_loaded = 0
+        self.pages_cached = 0
+        self.hubs = 0
+        self.duplicates = 0
+        self.failed: List[str] = []
+
+    def _visit(self, node: Dict) -> Optional[Dict]:
+        url = node['url']
+        if self.cache is not None:
+            parsed = self.cache.get_json(url, 'category_page')
+            if parsed is not None:
+                with self._lock:
+                    self.pages_cached += 1
+                return parsed
+
+        try:
+            logger.debug("Opening %s", url)
+            parsed = parse_category_page(self.fetch_page(url), url)
+            with self._lock:
+                self.pages_loaded += 1
+        except Exception as e:
+            logger.error("Failed to load category page %s: %s", url, e)
+            self.failed.append(url)
+            return None
+
+        if not parsed['links'] and not parsed['listing']:
+            logger.warning("Neither subcategories nor products found on %s", url)
+            self.failed.append(url)
+            return None
+
+        if self.cache is not None:
+            self.cache.put_json(url, 'category_page', parsed)
+        return parsed
+
+    def discover(self, root_url: str) -> Dict[str, Dict]:
+        """
+        Crawl the tree below root_url
+
+        Returns:
+            Subcategory rows (see DatabaseManager.insert_subcategories) by url_hash
+        """
+        seen = {url_hash(root_url)}
+        rows: Dict[str, Dict] = {}
+        level = [{"name": "", "url": root_url, "depth": 0}]
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while level:
+                logger.info("Loading %d category pages at depth %d", len(level), level[0]['depth'])
+                next_level = []
+                # map keeps the page order, which decides where duplicates are kept
+                for node, parsed in zip(level, executor.map(self._visit, level)):
+                    if parsed is None:
+                        continue
+
+                    links = parsed['links']
+                    if node['depth'] == 0 and self.root_trailing_links:
+                        links = links[:-self.root_trailing_links]
+
+                    if not links:
+                        # A listing page is its own subcategory
+                        if node['depth'] > 0:
+                            rows[url_hash(node['url'])] = subcategory_row(node, node)
+                        continue
+
+                    self.hubs += 1
+                    for name, url in links:
+                        key = url_hash(url)
+                        if key in seen:
+                            self.duplicates += 1
+                            continue
+                        seen.add(key)
+
+                        child = {"name": name, "url": url, "depth": node['depth'] + 1}
+                        if child['depth'] >= self.max_depth:
+                            rows[key] = subcategory_row(node, child)
+                        else:
+                            next_level.append(child)
+                level = next_level
+
+        return rows
+
+    def stats(self) -> Dict:
+        return {
+            "pages_loaded": self.pages_loaded,
+            "pages_cached": self.pages_cached,
+            "hubs": self.hubs,
+            "duplicates": self.duplicates,
+            "failed": len(self.failed),
+        }
+
+
+def diff_subcategories(stored: List[Dict], discovered: Dict[str, Dict]) -> Tuple[List[Dict], List[tuple], List[int]]:
+    """
+    Compare stored subcategories with a discovered tree
+
+    Returns:
+        (rows to add, (id, row) pairs whose names or category changed, ids of removed rows)
+    """
+    stored_by_hash = {row['url_hash']: row for row in stored}
+
+    added, changed = [], []
+    for key, row in discovered.items():
+        current = stored_by_hash.get(key)
+        if current is None:
+            added.append(row)
+        elif any(current[column] != row[column] for column in ('category_name', 'category_url', 'subcategory_name')):
+            changed.append((current['id'], row))
+
+    removed = [row['id'] for key, row in stored_by_hash.items() if key not in discovered]
+    return added, changed, removed
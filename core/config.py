@@ -10,4 +10,163 @@ DB_CONFIG = {
     'user': os.getenv('DB_USER', 'root'),
     'password': os.getenv('DB_PASSWORD'),
     'port': int(os.getenv('DB_PORT', 3306))
-}
\ No newline at end of file
+}
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36"
+
+DRIVER_CONFIG = {
+    'lean': os.getenv('LEAN_DRIVER', 'false').lower() == 'true',
+    'page_load_strategy': os.getenv('DRIVER_PAGE_LOAD_STRATEGY', 'eager'),
+    'blocked_urls': [url for url in os.getenv('DRIVER_BLOCKED_URLS', '').split(',') if url],
+    'next_data_timeout': float(os.getenv('DRIVER_NEXT_DATA_TIMEOUT', 10))
+}
+
+DRIVER_POOL_CONFIG = {
+    'size': int(os.getenv('DRIVER_POOL_SIZE', 2)),
+    'max_pages': int(os.getenv('DRIVER_POOL_MAX_PAGES', 20)),
+    'borrow_timeout': float(os.getenv('DRIVER_POOL_BORROW_TIMEOUT', 300)),
+    'headless': os.getenv('DRIVER_HEADLESS', 'true').lower() != 'false'
+}
+
+SCRAPER_CONFIG = {
+    'workers': int(os.getenv('SCRAPER_WORKERS', 1)),
+    'mode': os.getenv('SCRAPER_MODE', 'thread'),
+    'max_in_flight': int(os.getenv('SCRAPER_MAX_IN_FLIGHT', 0)) or None,
+    'domain_rate': float(os.getenv('SCRAPER_DOMAIN_RATE', 1.0))
+}
+
+HTTP_FETCHER_CONFIG = {
+    'enabled': os.getenv('HTTP_FAST_PATH', 'true').lower() != 'false',
+    'pool_size': int(os.getenv('HTTP_POOL_SIZE', 10)),
+    'timeout': float(os.getenv('HTTP_TIMEOUT', 15))
+}
+
+CRAWL_ENGINE_CONFIG = {
+    'enabled': os.getenv('CRAWL_ENGINE', 'sequential').lower() == 'async',
+    'listing_concurrency': int(os.getenv('CRAWL_LISTING_CONCURRENCY', 2)),
+    'detail_concurrency': int(os.getenv('CRAWL_DETAIL_CONCURRENCY', 4)),
+    'queue_size': int(os.getenv('CRAWL_QUEUE_SIZE', 100))
+}
+
+DB_WRITER_CONFIG = {
+    'batch_size': int(os.getenv('DB_WRITE_BATCH_SIZE', 100)),
+    'flush_interval': float(os.getenv('DB_WRITE_FLUSH_INTERVAL', 5.0)),
+    'upsert': os.getenv('INGEST_MODE', 'insert').lower() == 'upsert'
+}
+
+DEDUP_CONFIG = {
+    'use_bloom': os.getenv('DEDUP_USE_BLOOM', 'false').lower() == 'true',
+    'expected_items': int(os.getenv('DEDUP_EXPECTED_ITEMS', 1000000)),
+    'false_positive_rate': float(os.getenv('DEDUP_FALSE_POSITIVE_RATE', 0.001))
+}
+
+DB_POOL_CONFIG = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 0)) or None,
+    'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+    'ping_interval': float(os.getenv('DB_POOL_PING_INTERVAL', 60))
+}
+
+RETRY_CONFIG = {
+    'enabled': os.getenv('RETRY_FAILED', 'true').lower() != 'false',
+    'base_delay': float(os.getenv('RETRY_BASE_DELAY', 5)),
+    'max_delay': float(os.getenv('RETRY_MAX_DELAY', 300)),
+    'max_attempts': {
+        'timeout': int(os.getenv('RETRY_MAX_ATTEMPTS_TIMEOUT', 4)),
+        'block': int(os.getenv('RETRY_MAX_ATTEMPTS_BLOCK', 5)),
+        'db': int(os.getenv('RETRY_MAX_ATTEMPTS_DB', 3)),
+        'parse': int(os.getenv('RETRY_MAX_ATTEMPTS_PARSE', 1)),
+        'unknown': int(os.getenv('RETRY_MAX_ATTEMPTS_UNKNOWN', 3))
+    }
+}
+
+PRICE_HISTORY_CONFIG = {
+    'enabled': os.getenv('PRICE_HISTORY', 'false').lower() == 'true',
+    'cache_size': int(os.getenv('PRICE_HISTORY_CACHE_SIZE', 100000))
+}
+
+FRONTIER_CONFIG = {
+    'enabled': os.getenv('USE_FRONTIER', 'false').lower() == 'true',
+    'lease_seconds': int(os.getenv('FRONTIER_LEASE_SECONDS', 600)),
+    'max_retries': int(os.getenv('FRONTIER_MAX_RETRIES', 3)),
+    'claim_size': int(os.getenv('FRONTIER_CLAIM_SIZE', 20))
+}
+
+SHARD_CONFIG = {
+    'shard_size': int(os.getenv('SHARD_SIZE', 5)),
+    'lease_seconds': int(os.getenv('SHARD_LEASE_SECONDS', 900)),
+    'heartbeat_interval': float(os.getenv('SHARD_HEARTBEAT_INTERVAL', 60)),
+    'max_attempts': int(os.getenv('SHARD_MAX_ATTEMPTS', 3))
+}
+
+ARCHIVE_CONFIG = {
+    'enabled': bool(os.getenv('PAGE_ARCHIVE_DIR')),
+    'directory': os.getenv('PAGE_ARCHIVE_DIR', 'archive'),
+    'segment_size': int(os.getenv('PAGE_ARCHIVE_SEGMENT_MB', 256)) * 1024 * 1024,
+    'level': int(os.getenv('PAGE_ARCHIVE_LEVEL', 3))
+}
+
+RESPONSE_CACHE_CONFIG = {
+    'enabled': bool(os.getenv('RESPONSE_CACHE_DIR')),
+    'directory': os.getenv('RESPONSE_CACHE_DIR', 'cache'),
+    'ttls': {
+        'category': int(float(os.getenv('RESPONSE_CACHE_CATEGORY_TTL_HOURS', 72)) * 3600),
+        'search': int(float(os.getenv('RESPONSE_CACHE_SEARCH_TTL_HOURS', 6)) * 3600),
+        'product': int(float(os.getenv('RESPONSE_CACHE_PRODUCT_TTL_HOURS', 0)) * 3600)
+    },
+    'max_bytes': int(os.getenv('RESPONSE_CACHE_MAX_MB', 1024)) * 1024 * 1024
+}
+
+REFRESH_CONFIG = {
+    'max_age_hours': float(os.getenv('REFRESH_MAX_AGE_HOURS', 24)),
+    'volatile_age_hours': float(os.getenv('REFRESH_VOLATILE_AGE_HOURS', 6)),
+    'volatile_changes': int(os.getenv('REFRESH_VOLATILE_CHANGES', 3)),
+    'batch_size': int(os.getenv('REFRESH_BATCH_SIZE', 500)),
+    'max_listing_pages': int(os.getenv('REFRESH_MAX_LISTING_PAGES', 50)),
+    'listing_page_budget': int(os.getenv('REFRESH_LISTING_PAGE_BUDGET', 200)),
+    'failed_retry_hours': float(os.getenv('REFRESH_FAILED_RETRY_HOURS', 6))
+}
+
+CATEGORY_TREE_CONFIG = {
+    'root_url': os.getenv('CATEGORY_ROOT_URL', 'https://www.walmart.com/cp/food/976759'),
+    'max_depth': int(os.getenv('CATEGORY_MAX_DEPTH', 2)),
+    'concurrency': int(os.getenv('CATEGORY_CONCURRENCY', 4))
+}
+
+STORE_MATRIX_CONFIG = {
+    'stores': os.getenv('STORE_MATRIX_STORES', ''),
+    'concurrency': int(os.getenv('STORE_MATRIX_CONCURRENCY', 4))
+}
+
+EXPORT_CONFIG = {
+    'directory': os.getenv('EXPORT_DIR', 'export'),
+    'chunk_size': int(os.getenv('EXPORT_CHUNK_SIZE', 50000)),
+    'max_rows_per_file': int(os.getenv('EXPORT_MAX_ROWS_PER_FILE', 1000000)),
+    'compression': os.getenv('EXPORT_COMPRESSION', 'zstd')
+}
+
+SEARCH_LISTING_CONFIG = {
+    'enabled': os.getenv('SEARCH_EXTRACTION', 'detail').lower() == 'listing',
+    'enrich': os.getenv('SEARCH_LISTING_ENRICH', 'false').lower() == 'true'
+}
+
+LOG_CONFIG = {
+    'level': os.getenv('LOG_LEVEL', 'INFO'),
+    'format': os.getenv('LOG_FORMAT', 'text')
+}
+
+METRICS_CONFIG = {
+    'path': os.getenv('METRICS_PATH', ''),
+    'interval': float(os.getenv('METRICS_INTERVAL', 30))
+}
+
+RATE_LIMIT_CONFIG = {
+    'enabled': os.getenv('ADAPTIVE_RATE_LIMIT', 'false').lower() == 'true',
+    'limits': {
+        'initial_rate': float(os.getenv('RATE_LIMIT_INITIAL', 1.0)),
+        'min_rate': float(os.getenv('RATE_LIMIT_MIN', 0.05)),
+        'max_rate': float(os.getenv('RATE_LIMIT_MAX', 5.0)),
+        'increase': float(os.getenv('RATE_LIMIT_INCREASE', 0.05)),
+        'decrease': float(os.getenv('RATE_LIMIT_DECREASE', 0.5)),
+        'cooldown': float(os.getenv('RATE_LIMIT_COOLDOWN', 30))
+    }
+}
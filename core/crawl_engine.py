@@ -0,0 +1,212 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlEngine:
+    def __init__(
+        self,
+        list_page: Callable[[str], Tuple[List[str], List[str]]],
+        fetch_detail: Callable[[str], Dict],
+        write: Callable[[Dict], None],
+        url_filter: Optional[Callable[[List[str]], List[str]]] = None,
+        listing_concurrency: int = 2,
+        detail_concurrency: int = 4,
+        queue_size: int = 100,
+        retry=None,
+        retry_poll_interval: float = 1.0
+    ):
+        """
+        Asyncio pipeline running listing, detail and DB-write stages concurrently
+
+        The stage callables are regular blocking functions (Selenium, requests,
+        mysql.connector); they are run in threads so the stages overlap.
+
+        Args:
+            list_page: Takes a listing URL and returns (product_urls, more_listing_urls)
+            fetch_detail: Takes a product URL and returns the product details
+            write: Stores one product; always called from a single DB thread
+            url_filter: Optional check run on the DB thread, once per listing
+                page: takes the page's new product URLs and returns those to
+                fetch (e.g. the ones not in the database yet, in one lookup)
+            listing_concurrency: Number of listing pages loaded at once
+            detail_concurrency: Number of product pages loaded at once
+            queue_size: Bound of the queues between stages, a full queue makes
+                the upstream stage wait (backpressure)
+            retry: Optional RetryScheduler, used by this engine only. A failed
+                listing page, or a product whose page or write failed, is put
+                back on its stage's queue after its backoff (checked every
+                retry_poll_interval seconds, while the stages keep running),
+                and dead-lettered once out of attempts. run() returns once no
+                retry is left. Without one, failures are only logged.
+            retry_poll_interval: Seconds between two checks for due retries
+        """
+        self.list_page = list_page
+        self.fetch_detail = fetch_detail
+        self.write = write
+        self.url_filter = url_filter
+        self.listing_concurrency = listing_concurrency
+        self.detail_concurrency = detail_concurrency
+        self.queue_size = queue_size
+        self.retry = retry
+        self.retry_poll_interval = retry_poll_interval
+
+        self.stats = {
+            "listing_pages": 0,
+            "listing_failed": 0,
+            "products_found": 0,
+            "products_skipped": 0,
+            "products_fetched": 0,
+            "products_failed": 0,
+            "products_written": 0,
+            "retries": 0,
+        }
+
+    async def run(self, listing_urls: Iterable[str]) -> Dict:
+        """Crawl starting from the given listing URLs and return the stage counters"""
+        loop = asyncio.get_running_loop()
+        listing_queue: asyncio.Queue = asyncio.Queue()
+        detail_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        seen_listing_urls = set()
+        seen_product_urls = set()
+
+        # Failed URLs waiting in the retry scheduler, with the stage they go back to
+        retrying: Dict[str, str] = {}
+        requeued = 0
+
+        # mysql.connector connections are not thread-safe, keep every DB call on one thread
+        db_executor = ThreadPoolExecutor(max_workers=1)
+
+        def failed(url, stage, error) -> bool:
+            """Hand a failed URL to the retry scheduler; False once it is given up on"""
+            if self.retry is None:
+                return False
+            self.retry.fail(url, error)
+            if not self.retry.retrying(url):
+                return False
+            retrying[url] = stage
+            self.stats["retries"] += 1
+            return True
+
+        async def requeue_due():
+            nonlocal requeued
+            for url in self.retry.next_batch():
+                stage = retrying.pop(url, None)
+                if stage is None:
+                    continue
+                # Counted before the put, which may wait for room in the detail queue
+                requeued += 1
+                if stage == 'listing':
+                    listing_queue.put_nowait(url)
+                else:
+                    await detail_queue.put(url)
+
+        async def retry_pump():
+            while True:
+                await asyncio.sleep(self.retry_poll_interval)
+                await requeue_due()
+
+        def enqueue_listing(url):
+            if url not in seen_listing_urls:
+                seen_listing_urls.add(url)
+                listing_queue.put_nowait(url)
+
+        async def listing_worker():
+            while True:
+                url = await listing_queue.get()
+                try:
+                    product_urls, more_listing_urls = await asyncio.to_thread(self.list_page, url)
+                    self.stats["listing_pages"] += 1
+                    if self.retry is not None:
+                        self.retry.succeed(url)
+
+                    for listing_url in more_listing_urls:
+                        enqueue_listing(listing_url)
+
+                    new_urls = []
+                    for product_url in product_urls:
+                        if product_url not in seen_product_urls:
+                            seen_product_urls.add(product_url)
+                            new_urls.append(product_url)
+                    self.stats["products_found"] += len(new_urls)
+
+                    if self.url_filter is not None and new_urls:
+                        wanted = await loop.run_in_executor(db_executor, self.url_filter, new_urls)
+                        self.stats["products_skipped"] += len(new_urls) - len(wanted)
+                        new_urls = wanted
+
+                    for product_url in new_urls:
+                        await detail_queue.put(product_url)
+                except Exception as e:
+                    if not failed(url, 'listing', e):
+                        self.stats["listing_failed"] += 1
+                        logger.error("Failed to list %s: %s", url, e)
+                finally:
+                    listing_queue.task_done()
+
+        async def detail_worker():
+            while True:
+                product_url = await detail_queue.get()
+                try:
+                    product_details = await asyncio.to_thread(self.fetch_detail, product_url)
+                    self.stats["products_fetched"] += 1
+                    await write_queue.put(product_details)
+                except Exception as e:
+                    if not failed(product_url, 'detail', e):
+                        self.stats["products_failed"] += 1
+                        logger.error("Failed to scrape %s: %s", product_url, e)
+                finally:
+                    detail_queue.task_done()
+
+        async def writer():
+            while True:
+                product_details = await write_queue.get()
+                try:
+                    await loop.run_in_executor(db_executor, self.write, product_details)
+                    self.stats["products_written"] += 1
+                    if self.retry is not None:
+                        self.retry.succeed(product_details.get('url'))
+                except Exception as e:
+                    # The product is scraped again once its retry is due
+                    if not failed(product_details.get('url'), 'detail', e):
+                        logger.error("Failed to store %s: %s", product_details.get('url'), e)
+                finally:
+                    write_queue.task_done()
+
+        for url in listing_urls:
+            enqueue_listing(url)
+
+        tasks = [asyncio.create_task(listing_worker()) for _ in range(self.listing_concurrency)]
+        tasks += [asyncio.create_task(detail_worker()) for _ in range(self.detail_concurrency)]
+        tasks.append(asyncio.create_task(writer()))
+        if self.retry is not None:
+            tasks.append(asyncio.create_task(retry_pump()))
+
+        try:
+            while True:
+                # Listing pages may discover more listing pages, so wait on the listing
+                # stage first; once it is drained nothing new can reach the later stages,
+                # except for retries put back meanwhile, which take another pass
+                before = requeued
+                await listing_queue.join()
+                await detail_queue.join()
+                await write_queue.join()
+                if requeued != before:
+                    continue
+                if not retrying:
+                    break
+                # Every stage is idle, only retries still waiting out their backoff are left
+                await asyncio.sleep(self.retry_poll_interval)
+                await requeue_due()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            db_executor.shutdown(wait=True)
+
+        return self.stats
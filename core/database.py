@@ -1,11 +1,78 @@
 import mysql.connector
-from mysql.connector import Error
-from typing import List, Dict, Optional
+from mysql.connector import Error, pooling
+from mysql.connector.errors import PoolError
+from typing import List, Dict, Iterator, Optional
 import json
+import logging
+import signal
+from contextlib import contextmanager
+import threading
+import time
+
+from core.dedup import url_hash
+from core.instrumentation import metrics
+from core.price_history import price_observation
+from core.retry import classify_error
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_COLUMNS = [
+    'item_id', 'upc', 'product_id', 'url', 'url_hash', 'name', 'categories',
+    'image', 'store_id', 'store_location', 'price', 'mrp',
+    'discount', 'availability', 'keyword', 'size', 'size_quantity', 'size_unit'
+]
+
+# Columns identifying a product row; the rest is refreshed on re-crawls
+PRODUCT_KEY_COLUMNS = ['item_id', 'store_id']
+
+# Relies on the uq_products_item_store unique index (see core/migrations.py).
+# Assignments run left to right, so price changes are counted before price is overwritten.
+PRODUCT_UPSERT_CLAUSE = " ON DUPLICATE KEY UPDATE " + ", ".join(
+    [
+        "price_changed_at = IF(price <=> VALUES(price), price_changed_at, NOW())",
+        "price_changes = price_changes + IF(price <=> VALUES(price), 0, 1)",
+    ]
+    + [f"{column} = VALUES({column})" for column in PRODUCT_COLUMNS if column not in PRODUCT_KEY_COLUMNS]
+    + ["last_scraped_at = NOW()"]
+)
+
+# The unique index is always there, so plain inserts skip an already stored
+# (item_id, store_id) instead of failing the whole batch on it
+PRODUCT_INSERT = "INSERT IGNORE INTO products"
+
+# Columns a price refresh compares and rewrites (see core/refresh.py)
+REFRESH_COLUMNS = ['name', 'image', 'price', 'mrp', 'discount', 'availability']
+
+
+def product_row(product: Dict) -> tuple:
+    """Convert a product dict to a row tuple without touching the caller's dict"""
+    values = {
+        **product,
+        'categories': json.dumps(product.get('categories', [])),
+        'url_hash': url_hash(product['url']) if product.get('url') else None,
+    }
+    return tuple(values.get(column) for column in PRODUCT_COLUMNS)
+
+
+class PooledSession:
+    """A connection checked out of the pool by one thread, with its cursor"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.cursor(dictionary=True)
+        self.last_ping = time.monotonic()
+
+    def close(self):
+        try:
+            self.cursor.close()
+        finally:
+            # Closing a pooled connection hands it back to the pool
+            self.connection.close()
 
 
 class DatabaseManager:
-    def __init__(self, db_config: Dict):
+    def __init__(self, db_config: Dict, pool_size: Optional[int] = None,
+                 pool_timeout: float = 30.0, ping_interval: float = 60.0):
         """
         Initialize database connection with configuration
         
@@ -18,10 +85,30 @@ class DatabaseManager:
                     'password': 'your_password',
                     'port': 3306
                 }
+            pool_size: When set, connections come from a pool of this size and
+                every thread works on its own checked-out connection
+            pool_timeout: Seconds a thread waits for a free pooled connection
+            ping_interval: Seconds after which a held pooled connection is
+                pinged (and reconnected) again before being used
         """
         self.db_config = db_config
-        self.connection = None
-        self.cursor = None
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.ping_interval = ping_interval
+
+        self.pool = None
+        self._connection = None
+        self._cursor = None
+
+        self._local = threading.local()
+        self._sessions: Dict[int, PooledSession] = {}
+        self._sessions_lock = threading.Lock()
+        self.pool_metrics = {
+            "checkouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "reconnects": 0,
+        }
 
     def __enter__(self):
         """Connect to database when entering context manager"""
@@ -32,23 +119,136 @@ class DatabaseManager:
         """Close connection when exiting context manager"""
         self.close()
 
+    @property
+    def connection(self):
+        if self.pool is None:
+            return self._connection
+        return self._checkout().connection
+
+    @connection.setter
+    def connection(self, connection):
+        self._connection = connection
+
+    @property
+    def cursor(self):
+        if self.pool is None:
+            return self._cursor
+        return self._checkout().cursor
+
+    @cursor.setter
+    def cursor(self, cursor):
+        self._cursor = cursor
+
     def connect(self):
-        """Establish database connection"""
+        """Establish database connection (or the connection pool in pooled mode)"""
         try:
-            self.connection = mysql.connector.connect(**self.db_config)
-            self.cursor = self.connection.cursor(dictionary=True)
-            print("Successfully connected to database")
+            if self.pool_size:
+                self.pool = pooling.MySQLConnectionPool(
+                    pool_name=f"walmart_{id(self)}",
+                    pool_size=self.pool_size,
+                    pool_reset_session=True,
+                    **self.db_config
+                )
+                logger.info("Created database connection pool", extra={"pool_size": self.pool_size})
+            else:
+                self.connection = mysql.connector.connect(**self.db_config)
+                self.cursor = self.connection.cursor(dictionary=True)
+                logger.info("Connected to database")
         except Error as e:
-            print(f"Database connection failed: {e}")
+            logger.error("Database connection failed: %s", e)
             raise
 
     def close(self):
         """Close database connection"""
+        if self.pool is not None:
+            with self._sessions_lock:
+                sessions, self._sessions = list(self._sessions.values()), {}
+            for session in sessions:
+                session.close()
+            self.pool = None
+            logger.info("Database connection pool closed")
+            return
+
         if self.cursor:
             self.cursor.close()
         if self.connection and self.connection.is_connected():
             self.connection.close()
-            print("Database connection closed")
+            logger.info("Database connection closed")
+
+    def _checkout(self) -> PooledSession:
+        """Return the calling thread's pooled session, borrowing a connection if needed"""
+        session = getattr(self._local, 'session', None)
+
+        if session is None:
+            started = time.monotonic()
+            while True:
+                try:
+                    connection = self.pool.get_connection()
+                    break
+                except PoolError:
+                    # Pool exhausted, wait for another thread to release its connection
+                    if time.monotonic() - started > self.pool_timeout:
+                        raise
+                    time.sleep(0.05)
+
+            # Ping on borrow: a connection idle in the pool may have been dropped by the server
+            connection.ping(reconnect=True, attempts=3, delay=1)
+            session = PooledSession(connection)
+            self._local.session = session
+
+            waited = time.monotonic() - started
+            with self._sessions_lock:
+                self._sessions[id(session)] = session
+                self.pool_metrics["checkouts"] += 1
+                self.pool_metrics["wait_time_total"] += waited
+                self.pool_metrics["wait_time_max"] = max(self.pool_metrics["wait_time_max"], waited)
+
+        elif time.monotonic() - session.last_ping > self.ping_interval:
+            if not session.connection.is_connected():
+                with self._sessions_lock:
+                    self.pool_metrics["reconnects"] += 1
+                session.connection.ping(reconnect=True, attempts=3, delay=1)
+                session.cursor = session.connection.cursor(dictionary=True)
+            session.last_ping = time.monotonic()
+
+        return session
+
+    def release(self):
+        """Hand the calling thread's pooled connection back to the pool"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            return
+
+        self._local.session = None
+        with self._sessions_lock:
+            self._sessions.pop(id(session), None)
+        session.close()
+
+    @contextmanager
+    def session(self):
+        """
+        Give the calling thread its own pooled connection for the with-block
+
+        All DatabaseManager methods called inside the block use that connection.
+        Without a pool this simply yields the shared connection.
+        """
+        try:
+            yield self
+        finally:
+            if self.pool is not None:
+                self.release()
+
+    def get_pool_metrics(self) -> Dict:
+        """Pool wait times and connection counts"""
+        with self._sessions_lock:
+            checked_out = len(self._sessions)
+        checkouts = self.pool_metrics["checkouts"]
+        return {
+            **self.pool_metrics,
+            "wait_time_avg": self.pool_metrics["wait_time_total"] / checkouts if checkouts else 0.0,
+            "pool_size": self.pool_size,
+            "connections_checked_out": checked_out,
+        }
 
     def execute_query(self, query: str, params: Optional[tuple] = None):
         """Execute a single SQL query"""
@@ -58,7 +258,7 @@ class DatabaseManager:
             return self.cursor
         except Error as e:
             self.connection.rollback()
-            print(f"Query failed: {e}\nQuery: {query}")
+            logger.error("Query failed: %s", e, extra={"query": query})
             raise
     
         
@@ -73,23 +273,73 @@ class DatabaseManager:
                 - subcategory_url
         """
         try:
+            # Relies on the uq_subcategories_url_hash unique index (see core/migrations.py)
             insert_query = """
                 INSERT INTO subcategories (
-                    category_name, category_url, subcategory_name, subcategory_url
+                    category_name, category_url, subcategory_name, subcategory_url, url_hash
                 ) VALUES (
-                    %(category_name)s, %(category_url)s, %(subcategory_url)s, %(subcategory_url)s)
+                    %(category_name)s, %(category_url)s, %(subcategory_name)s, %(subcategory_url)s, %(url_hash)s)
+                ON DUPLICATE KEY UPDATE
+                    category_name = VALUES(category_name),
+                    category_url = VALUES(category_url),
+                    subcategory_name = VALUES(subcategory_name)
             """
-            
-            self.cursor.executemany(insert_query, subcategories)
+
+            rows = [{**row, 'url_hash': url_hash(row['subcategory_url'])} for row in subcategories]
+            self.cursor.executemany(insert_query, rows)
             self.connection.commit()
-            print(f"Inserted/updated {len(subcategories)} subcategories")
+            logger.info("Inserted/updated %d subcategories", len(subcategories))
 
         except Error as e:
             self.connection.rollback()
-            print(f"Subcategories insertion failed: {e}")
+            logger.error("Subcategories insertion failed: %s", e)
             raise
     
 
+    def get_subcategory_nodes(self) -> List[Dict]:
+        """Every stored subcategory with the columns category discovery compares"""
+        self.cursor.execute("""
+            SELECT id, category_name, category_url, subcategory_name, subcategory_url, url_hash
+            FROM subcategories
+        """)
+        return self.cursor.fetchall()
+
+    def sync_subcategories(self, added: List[Dict], changed: List[tuple], removed_ids: List[int]):
+        """
+        Apply a category discovery diff in one transaction
+
+        Args:
+            added: New subcategory rows, with category_name, category_url,
+                subcategory_name, subcategory_url and url_hash
+            changed: (subcategories.id, row) pairs whose names or parent category changed
+            removed_ids: Subcategories no longer linked from the category tree
+        """
+        try:
+            if added:
+                self.cursor.executemany("""
+                    INSERT INTO subcategories (
+                        category_name, category_url, subcategory_name, subcategory_url, url_hash
+                    ) VALUES (
+                        %(category_name)s, %(category_url)s, %(subcategory_name)s, %(subcategory_url)s, %(url_hash)s)
+                """, added)
+            if changed:
+                self.cursor.executemany("""
+                    UPDATE subcategories
+                    SET category_name = %s, category_url = %s, subcategory_name = %s
+                    WHERE id = %s
+                """, [(row['category_name'], row['category_url'], row['subcategory_name'], row_id)
+                      for row_id, row in changed])
+            if removed_ids:
+                self.cursor.execute(f"""
+                    DELETE FROM subcategories WHERE id IN ({', '.join(['%s'] * len(removed_ids))})
+                """, tuple(removed_ids))
+            self.connection.commit()
+            logger.info("Subcategories: %d added, %d changed, %d removed", len(added), len(changed), len(removed_ids))
+        except Error as e:
+            self.connection.rollback()
+            logger.error("Subcategory sync failed: %s", e)
+            raise
+
     def get_pending_subcategories(self) -> List[Dict]:
         """Fetch subcategories that haven't been processed yet"""
         self.cursor.execute("""
@@ -99,38 +349,71 @@ class DatabaseManager:
         """)
         return self.cursor.fetchall()
 
+    def mark_subcategory_done(self, subcategory_id: int):
+        """Set a subcategory's status to 'done' once all its products are scraped"""
+        self.execute_query("UPDATE subcategories SET status = 'done' WHERE id = %s", (subcategory_id,))
+
     
-    def insert_products(self, products: List[Dict]):
+    def insert_products(self, products: List[Dict], upsert: bool = False):
         """
         Insert scraped product details into the database.
+
+        Args:
+            products: Product dictionaries as built by fill_product_data
+            upsert: Update the stored row of an already known (item_id, store_id)
+                instead of keeping it as it is
         """
         try:
-            insert_query = """
-                INSERT INTO products (
-                    item_id, upc, product_id, url, name, categories, 
-                    image, store_id, store_location, price, mrp,
-                    discount, availability, keyword, size
-                ) VALUES (
-                    %(item_id)s, %(upc)s, %(product_id)s, %(url)s, %(name)s, 
-                    %(categories)s, %(image)s, %(store_id)s, %(store_location)s, 
-                    %(price)s, %(mrp)s, %(discount)s, %(availability)s, 
-                    %(keyword)s, %(size)s
-                )
-            """
-
-            # Convert `categories` list to JSON string before insert
-            for product in products:
-                product["categories"] = json.dumps(product.get("categories", []))
+            values = f"({', '.join(PRODUCT_COLUMNS)}) VALUES ({', '.join(['%s'] * len(PRODUCT_COLUMNS))})"
+            if upsert:
+                insert_query = f"INSERT INTO products {values}{PRODUCT_UPSERT_CLAUSE}"
+            else:
+                insert_query = f"{PRODUCT_INSERT} {values}"
 
-            self.cursor.executemany(insert_query, products)
+            self.cursor.executemany(insert_query, [product_row(product) for product in products])
             self.connection.commit()
-            print(f"Inserted/updated {len(products)} products")
+            logger.info("%s %d products", 'Upserted' if upsert else 'Inserted', len(products))
 
         except Error as e:
             self.connection.rollback()
-            print(f"Product insertion failed: {e}")
+            logger.error("Product insertion failed: %s", e)
             raise
 
+    def insert_product_rows(self, rows: List[tuple], upsert: bool = False):
+        """
+        Insert already converted product rows with one multi-row INSERT and one commit.
+
+        Args:
+            rows: Tuples built by product_row(), in PRODUCT_COLUMNS order
+            upsert: Use INSERT ... ON DUPLICATE KEY UPDATE on (item_id, store_id),
+                otherwise rows of an already stored (item_id, store_id) are skipped
+        """
+        if not rows:
+            return
+
+        placeholders = f"({', '.join(['%s'] * len(PRODUCT_COLUMNS))})"
+        insert_query = f"""
+            {'INSERT INTO products' if upsert else PRODUCT_INSERT} ({', '.join(PRODUCT_COLUMNS)})
+            VALUES {', '.join([placeholders] * len(rows))}
+        """
+        if upsert:
+            insert_query += PRODUCT_UPSERT_CLAUSE
+        params = [value for row in rows for value in row]
+
+        try:
+            self.cursor.execute(insert_query, params)
+            self.connection.commit()
+        except Error as e:
+            self.connection.rollback()
+            logger.error("Product batch insertion failed: %s", e)
+            raise
+
+    def product_writer(self, batch_size: int = 100, flush_interval: float = 5.0,
+                       handle_signals: bool = True, upsert: bool = False,
+                       price_history=None, retry=None) -> 'BufferedProductWriter':
+        """Create a buffered writer that inserts (or upserts) products in batches"""
+        return BufferedProductWriter(self, batch_size, flush_interval, handle_signals, upsert, price_history, retry)
+
     def check_if_product_exists(self, product_url: str) -> bool:
         """
         Checks if a product with the given URL exists in the 'products' table.
@@ -142,10 +425,471 @@ class DatabaseManager:
             True if the product exists, False otherwise.
         """
         try:
-            query = "SELECT 1 FROM products WHERE url = %s LIMIT 1"
-            self.cursor.execute(query, (product_url,))
+            query = "SELECT 1 FROM products WHERE url_hash = %s LIMIT 1"
+            self.cursor.execute(query, (url_hash(product_url),))
             result = self.cursor.fetchone()
             return result is not None
         except Error as e:
-            print(f"Error checking product existence: {e}")
+            logger.error("Error checking product existence: %s", e)
             raise
+
+    def existing_product_hashes(self, url_hashes: List[str]) -> set:
+        """
+        Look up a batch of URL hashes with a single IN (...) query.
+
+        Args:
+            url_hashes: Hashes built by core.dedup.url_hash
+
+        Returns:
+            The subset of url_hashes already stored in the 'products' table.
+        """
+        if not url_hashes:
+            return set()
+
+        try:
+            query = f"""
+                SELECT DISTINCT url_hash FROM products
+                WHERE url_hash IN ({', '.join(['%s'] * len(url_hashes))})
+            """
+            self.cursor.execute(query, tuple(url_hashes))
+            return {row['url_hash'] for row in self.cursor.fetchall()}
+        except Error as e:
+            logger.error("Error checking product existence: %s", e)
+            raise
+
+    def iter_product_keys(self, chunk_size: int = 10000) -> Iterator[Dict]:
+        """Stream (id, item_id, url) of every stored product in id order, chunk by chunk"""
+        last_id = 0
+        while True:
+            self.cursor.execute("""
+                SELECT id, item_id, url FROM products
+                WHERE id > %s ORDER BY id LIMIT %s
+            """, (last_id, chunk_size))
+            rows = self.cursor.fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1]['id']
+
+    def stream_rows(self, query: str, params: Optional[tuple] = None, chunk_size: int = 10000) -> Iterator[List[tuple]]:
+        """
+        Run a query with an unbuffered cursor and yield its rows as chunks of tuples
+
+        Rows are read off the socket chunk by chunk instead of being fetched
+        into memory at once, so memory stays flat however large the result
+        is. The query runs on a dedicated connection, which stays busy until
+        the result is read; this manager's own connection remains usable.
+        """
+        connection = mysql.connector.connect(**self.db_config)
+        try:
+            cursor = connection.cursor(buffered=False)
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+            cursor.close()
+        finally:
+            # Closing drops an unread rest of the result instead of reading it
+            connection.close()
+
+    def stream_products(self, columns: List[str], after: Optional[tuple] = None, until=None,
+                        chunk_size: int = 10000) -> Iterator[List[tuple]]:
+        """
+        Stream products in (last_scraped_at, id) order, see stream_rows
+
+        Args:
+            columns: products columns selected, in row tuple order
+            after: (last_scraped_at, id) high-water mark; only rows scraped after it are streamed
+            until: Only rows scraped before this time (rows without last_scraped_at included)
+        """
+        conditions, params = [], []
+        if after is not None:
+            # Range on idx_products_last_scraped_at, whose entries are ordered by (last_scraped_at, id)
+            conditions.append("last_scraped_at >= %s AND (last_scraped_at > %s OR id > %s)")
+            params += [after[0], after[0], after[1]]
+        if until is not None:
+            conditions.append("(last_scraped_at IS NULL OR last_scraped_at < %s)")
+            params.append(until)
+
+        query = f"SELECT {', '.join(columns)} FROM products"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        query += " ORDER BY last_scraped_at, id"
+        return self.stream_rows(query, tuple(params), chunk_size)
+
+    def get_server_time(self):
+        """Current time of the database server, the clock last_scraped_at is set by"""
+        self.cursor.execute("SELECT NOW() AS now")
+        return self.cursor.fetchone()['now']
+
+    def get_refresh_candidates(self, max_age_hours: float, volatile_age_hours: float,
+                               volatile_changes: int, limit: int, failed_retry_hours: float = 6) -> List[Dict]:
+        """
+        Products due for a price refresh, most overdue first
+
+        A product is due once its last scrape is older than max_age_hours, or
+        older than volatile_age_hours when its price already changed at least
+        volatile_changes times. Overdue hours are weighted by the price changes
+        seen so far, so volatile products come first. A product whose refresh
+        failed is left out for failed_retry_hours.
+        """
+        self.cursor.execute(f"""
+            SELECT id, item_id, store_id, url, keyword, price_changes, last_scraped_at,
+                {', '.join(REFRESH_COLUMNS)}
+            FROM products
+            WHERE (last_scraped_at IS NULL
+                    OR last_scraped_at < NOW() - INTERVAL %s HOUR
+                    OR (price_changes >= %s AND last_scraped_at < NOW() - INTERVAL %s HOUR))
+                AND (refresh_failed_at IS NULL OR refresh_failed_at < NOW() - INTERVAL %s HOUR)
+            ORDER BY last_scraped_at IS NOT NULL,
+                TIMESTAMPDIFF(MINUTE, last_scraped_at, NOW()) * (1 + price_changes) DESC
+            LIMIT %s
+        """, (max_age_hours, volatile_changes, volatile_age_hours, failed_retry_hours, limit))
+        return self.cursor.fetchall()
+
+    def update_product_columns(self, updates: List[tuple]):
+        """
+        Write only the changed columns of refreshed products
+
+        Args:
+            updates: (products.id, {column: new value}) pairs; rows changing the
+                same set of columns are written with one executemany
+        """
+        groups = {}
+        for row_id, changes in updates:
+            columns = tuple(sorted(changes))
+            groups.setdefault(columns, []).append(tuple(changes[column] for column in columns) + (row_id,))
+
+        try:
+            for columns, params in groups.items():
+                assignments = [f"{column} = %s" for column in columns]
+                if 'price' in columns:
+                    # Must run before price itself is assigned
+                    assignments = [
+                        "price_changed_at = IF(price <=> %s, price_changed_at, NOW())",
+                        "price_changes = price_changes + IF(price <=> %s, 0, 1)",
+                    ] + assignments
+                    price_index = columns.index('price')
+                    params = [(row[price_index], row[price_index]) + row for row in params]
+
+                self.cursor.executemany(f"""
+                    UPDATE products
+                    SET {', '.join(assignments)}, last_scraped_at = NOW()
+                    WHERE id = %s
+                """, params)
+            self.connection.commit()
+        except Error as e:
+            self.connection.rollback()
+            logger.error("Product refresh update failed: %s", e)
+            raise
+
+    def touch_products(self, product_ids: List[int]):
+        """Mark products as freshly scraped without changing any other column"""
+        if not product_ids:
+            return
+        self.execute_query(f"""
+            UPDATE products SET last_scraped_at = NOW()
+            WHERE id IN ({', '.join(['%s'] * len(product_ids))})
+        """, tuple(product_ids))
+
+    def mark_refresh_failed(self, product_ids: List[int]):
+        """Record that refreshing these products failed, so they are not picked again right away"""
+        if not product_ids:
+            return
+        self.execute_query(f"""
+            UPDATE products SET refresh_failed_at = NOW()
+            WHERE id IN ({', '.join(['%s'] * len(product_ids))})
+        """, tuple(product_ids))
+
+    def insert_dead_letter(self, url: str, error_class: str, error: str, attempts: int = 1, source: str = 'scraper'):
+        """Record a URL that failed for good, together with why and where (source)"""
+        self.execute_query("""
+            INSERT INTO dead_letters (url, source, error_class, error, attempts)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (url, source, error_class, str(error)[:2000], attempts))
+
+    def get_latest_price_values(self, keys: List[tuple], chunk_size: int = 500) -> Dict[tuple, tuple]:
+        """
+        Latest (price_cents, mrp_cents, availability_code) of every (item_id, store_id) in keys
+
+        Keys without any history are missing from the result.
+        """
+        latest = {}
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            self.cursor.execute(f"""
+                SELECT h.item_id, h.store_id, h.price_cents, h.mrp_cents, h.availability_code
+                FROM price_history h
+                JOIN (
+                    SELECT item_id, store_id, MAX(ts) AS ts FROM price_history
+                    WHERE (item_id, store_id) IN ({', '.join(['(%s, %s)'] * len(chunk))})
+                    GROUP BY item_id, store_id
+                ) newest USING (item_id, store_id, ts)
+            """, tuple(value for key in chunk for value in key))
+            for row in self.cursor.fetchall():
+                latest[(row['item_id'], row['store_id'])] = (
+                    row['price_cents'], row['mrp_cents'], row['availability_code']
+                )
+        return latest
+
+    def insert_price_observations(self, observations: List[tuple]):
+        """
+        Append price history rows stamped with the current time
+
+        Args:
+            observations: (item_id, store_id, price_cents, mrp_cents, availability_code) tuples
+        """
+        if not observations:
+            return
+
+        # A second observation of the same key within one second replaces the first
+        self.execute_query(f"""
+            INSERT INTO price_history (item_id, store_id, ts, price_cents, mrp_cents, availability_code)
+            VALUES {', '.join(['(%s, %s, NOW(), %s, %s, %s)'] * len(observations))}
+            ON DUPLICATE KEY UPDATE price_cents = VALUES(price_cents), mrp_cents = VALUES(mrp_cents),
+                availability_code = VALUES(availability_code)
+        """, tuple(value for observation in observations for value in observation))
+
+    def get_price_points(self, item_id: str, store_id: Optional[str] = None, at=None) -> List[Dict]:
+        """
+        Latest price_history row of an item per store, or the last one at or before `at`
+
+        Args:
+            item_id: Walmart item id
+            store_id: Only this store (default: one row per store)
+            at: datetime to look the price up at (default: now)
+        """
+        conditions, params = ["h.item_id = %s"], [item_id]
+        if store_id is not None:
+            conditions.append("h.store_id = %s")
+            params.append(store_id)
+        ts_condition = ""
+        if at is not None:
+            ts_condition = "AND ts <= %s"
+            params.append(at)
+
+        # The subquery is a backward scan of the (item_id, store_id, ts) primary key
+        self.cursor.execute(f"""
+            SELECT h.item_id, h.store_id, h.ts, h.price_cents, h.mrp_cents, h.availability_code
+            FROM price_history h
+            WHERE {' AND '.join(conditions)}
+                AND h.ts = (
+                    SELECT MAX(ts) FROM price_history
+                    WHERE item_id = h.item_id AND store_id = h.store_id {ts_condition}
+                )
+            ORDER BY h.store_id
+        """, tuple(params))
+        return self.cursor.fetchall()
+
+    def get_product_urls(self, limit: Optional[int] = None) -> List[str]:
+        """One product page URL per stored item id"""
+        query = "SELECT MIN(url) AS url FROM products WHERE url IS NOT NULL AND url != '' GROUP BY item_id ORDER BY item_id"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        self.cursor.execute(query)
+        return [row['url'] for row in self.cursor.fetchall()]
+
+    def get_listing_urls(self) -> List[str]:
+        """Subcategory listing pages, whose product tiles carry current prices"""
+        self.cursor.execute("SELECT DISTINCT subcategory_url FROM subcategories ORDER BY subcategory_url")
+        return [row['subcategory_url'] for row in self.cursor.fetchall()]
+
+class BufferedProductWriter:
+    def __init__(self, db: DatabaseManager, batch_size: int = 100, flush_interval: float = 5.0,
+                 handle_signals: bool = True, upsert: bool = False, price_history=None, retry=None):
+        """
+        Collect product rows and write them as multi-row INSERTs
+
+        Rows are flushed once batch_size rows are buffered or flush_interval
+        seconds passed since the last flush (checked whenever a row is added),
+        when the context manager exits and on SIGINT / SIGTERM.
+
+        With a retry scheduler, a failed write is a 'db' error: its rows stay
+        buffered and the write is retried after the scheduler's backoff, up to
+        its 'db' attempts. Writes triggered by add() do not wait for the
+        backoff, rows keep being buffered meanwhile; an explicit flush() waits.
+        A batch failing for good on its data (a permanent error such as an
+        IntegrityError or DataError) is not retried but split in halves until
+        only the offending rows are left, which are dead-lettered (or logged
+        and dropped without a scheduler) while the rest is written.
+
+        Args:
+            db: Connected DatabaseManager used for the writes
+            batch_size: Rows per INSERT
+            flush_interval: Max seconds a row waits in the buffer while rows keep coming
+            handle_signals: Flush the buffer before the process is interrupted
+            upsert: Refresh rows of known (item_id, store_id) instead of inserting duplicates
+            price_history: PriceHistory that every flushed batch is also recorded in
+            retry: RetryScheduler deciding whether and when a failed write is retried
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.handle_signals = handle_signals
+        self.upsert = upsert
+        self.price_history = price_history
+        self.retry = retry
+
+        self._buffer: List[tuple] = []
+        self._observations: List[tuple] = []
+        self._lock = threading.RLock()
+        self._previous_handlers = {}
+
+        self.rows_written = 0
+        self.flushes = 0
+        self.failed_writes = 0
+        self.rejected_rows = 0
+        self.started_at = time.monotonic()
+        self.last_flush_at = self.started_at
+        self._write_attempts = 0
+        self._retry_at = 0.0
+
+    def __enter__(self):
+        if self.handle_signals and threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                self._previous_handlers[signum] = signal.signal(signum, self._on_signal)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.flush()
+        finally:
+            for signum, handler in self._previous_handlers.items():
+                signal.signal(signum, handler)
+            self._previous_handlers = {}
+            logger.info("Product writer stats: %s", self.stats())
+
+    def _on_signal(self, signum, frame):
+        logger.warning("Received signal %s, flushing %d buffered products", signum, len(self._buffer))
+        self.flush()
+
+        previous = self._previous_handlers.get(signum)
+        if callable(previous):
+            previous(signum, frame)
+        elif signum == signal.SIGINT:
+            raise KeyboardInterrupt
+        else:
+            raise SystemExit(128 + signum)
+
+    def add(self, product: Dict):
+        """Buffer one product, flushing when the batch size or time limit is reached"""
+        with self._lock:
+            self._buffer.append(product_row(product))
+            if self.price_history is not None:
+                self._observations.append(price_observation(product))
+            now = time.monotonic()
+            if ((len(self._buffer) >= self.batch_size or now - self.last_flush_at >= self.flush_interval)
+                    and now >= self._retry_at):
+                self._flush(wait=False)
+
+    def flush(self):
+        """Write every buffered row in one INSERT, then record the batch's price history"""
+        with self._lock:
+            self._flush(wait=True)
+
+    def _flush(self, wait: bool):
+        while True:
+            try:
+                self._write()
+            except Error as e:
+                if self.retry is None:
+                    raise
+                self.failed_writes += 1
+                self._write_attempts += 1
+                _, delay = self.retry.decide(e, self._write_attempts)
+                if delay is None:
+                    logger.error("Giving up writing %d products after %d attempts: %s",
+                                 len(self._buffer), self._write_attempts, e)
+                    raise
+                logger.warning("Writing %d products failed, retrying in %.1fs: %s", len(self._buffer), delay, e)
+                self._retry_at = time.monotonic() + delay
+                if not wait:
+                    return
+                time.sleep(delay)
+            else:
+                self._write_attempts = 0
+                self._retry_at = 0.0
+                return
+
+    def _write(self):
+        if self._buffer:
+            rows, self._buffer = self._buffer, []
+            try:
+                self._insert(rows)
+            except Error as e:
+                if classify_error(e) != 'permanent':
+                    # Keep the rows so a later flush can retry them
+                    self._buffer = rows + self._buffer
+                    raise
+                # Retrying would fail on the same row again, write around it instead
+                self._write_around(rows, e)
+
+        if self._observations:
+            observations, self._observations = self._observations, []
+            try:
+                with metrics.span('db_write', mode='price_history'):
+                    written = self.price_history.record(observations)
+            except Error:
+                # The product rows are stored, only the history is retried
+                self._observations = observations + self._observations
+                raise
+            metrics.inc('price_changes_total', written)
+
+    def _insert(self, rows: List[tuple]):
+        with metrics.span('db_write', mode='upsert' if self.upsert else 'insert'):
+            self.db.insert_product_rows(rows, upsert=self.upsert)
+
+        self.rows_written += len(rows)
+        self.flushes += 1
+        self.last_flush_at = time.monotonic()
+        metrics.inc('products_written_total', len(rows))
+        logger.debug("%s %d products", 'Upserted' if self.upsert else 'Inserted', len(rows))
+
+    def _write_around(self, rows: List[tuple], error: Error):
+        """Write a batch that failed on its data in halves, rejecting the rows that fail on their own"""
+        failed = [(rows, error)]
+        while failed:
+            batch, error = failed.pop(0)
+            if len(batch) == 1:
+                self._reject(batch[0], error)
+                continue
+
+            middle = len(batch) // 2
+            halves = [batch[:middle], batch[middle:]]
+            while halves:
+                half = halves.pop(0)
+                try:
+                    self._insert(half)
+                except Error as e:
+                    if classify_error(e) != 'permanent':
+                        # The database itself is in trouble: keep everything not written for the retry
+                        unwritten = half + [row for rest in halves for row in rest]
+                        unwritten += [row for rest, _ in failed for row in rest]
+                        self._buffer = unwritten + self._buffer
+                        raise
+                    failed.append((half, e))
+
+    def _reject(self, row: tuple, error: Error):
+        self.rejected_rows += 1
+        url = row[PRODUCT_COLUMNS.index('url')]
+        if self.retry is not None:
+            self.retry.give_up(url, 'permanent', error, 1)
+        else:
+            logger.error("Dropping product %s that cannot be written: %s", url, error)
+
+    def stats(self) -> Dict:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        stats = {
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "failed_writes": self.failed_writes,
+            "rejected_rows": self.rejected_rows,
+            "rows_buffered": len(self._buffer),
+            "rows_per_sec": round(self.rows_written / elapsed, 2),
+            "flushes_per_sec": round(self.flushes / elapsed, 2),
+        }
+        if self.price_history is not None:
+            stats["price_history"] = self.price_history.stats()
+        return stats
@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import math
+import re
+from typing import Iterable, List, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Walmart product URLs end with the item id: /ip/<slug>/<usItemId>
+ITEM_ID_PATTERN = re.compile(r'/ip/(?:[^/?#]+/)?(\d+)(?:[/?#]|$)')
+
+
+def canonical_url(url: str) -> str:
+    """Product URL without query string, fragment and trailing slash"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}".rstrip('/')
+
+
+def url_hash(url: str) -> str:
+    """MD5 hex digest of the canonical URL, as stored in products.url_hash"""
+    return hashlib.md5(canonical_url(url).encode('utf-8')).hexdigest()
+
+
+def item_id_from_url(url: str) -> Optional[str]:
+    """Walmart item id (usItemId) encoded in a product URL, if any"""
+    match = ITEM_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def product_keys(url: Optional[str] = None, item_id: Optional[str] = None) -> List[str]:
+    """Keys a product is known by in the seen index"""
+    keys = []
+    if item_id is None and url:
+        item_id = item_id_from_url(url)
+    if item_id:
+        keys.append(f"item:{item_id}")
+    if url:
+        keys.append(f"url:{url_hash(url)}")
+    return keys
+
+
+def _key_digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+
+class BloomFilter:
+    def __init__(self, expected_items: int = 1_000_000, false_positive_rate: float = 0.001):
+        """
+        Fixed-size Bloom filter over string keys
+
+        Args:
+            expected_items: Number of keys the filter is sized for
+            false_positive_rate: Target false positive rate at expected_items
+        """
+        self.size = max(8, int(-expected_items * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / expected_items * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = _key_digest(key)
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+
+class HashSet:
+    """Exact set storing 8-byte key digests as ints instead of full strings"""
+
+    def __init__(self):
+        self._digests = set()
+
+    @staticmethod
+    def _digest(key: str) -> int:
+        return int.from_bytes(_key_digest(key)[:8], 'little')
+
+    def add(self, key: str):
+        self._digests.add(self._digest(key))
+
+    def __contains__(self, key: str) -> bool:
+        return self._digest(key) in self._digests
+
+    def __len__(self):
+        return len(self._digests)
+
+
+class ProductDeduplicator:
+    def __init__(self, db, use_bloom: bool = False, expected_items: int = 1_000_000,
+                 false_positive_rate: float = 0.001, batch_size: int = 500):
+        """
+        Decide which product URLs still have to be scraped without a query per URL
+
+        Known products are preloaded into memory once. In Bloom filter mode a
+        negative answer is final, while possible hits of a whole results page
+        are confirmed with one batched IN (...) query.
+
+        Args:
+            db: Connected DatabaseManager
+            use_bloom: Use a Bloom filter instead of an exact digest set
+            expected_items: Bloom filter sizing
+            false_positive_rate: Bloom filter sizing
+            batch_size: Max URLs per IN (...) lookup
+        """
+        self.db = db
+        self.use_bloom = use_bloom
+        self.batch_size = batch_size
+        if use_bloom:
+            self.index = BloomFilter(expected_items, false_positive_rate)
+        else:
+            self.index = HashSet()
+
+        # Exact hashes of the URLs handed out during this run, which may not be flushed to the DB yet
+        self.run_hashes = set()
+        self.db_lookups = 0
+
+    def preload(self):
+        """Load the keys of every stored product into the in-memory index"""
+        loaded = 0
+        for row in self.db.iter_product_keys():
+            for key in product_keys(row['url'], row['item_id']):
+                self.index.add(key)
+            loaded += 1
+        logger.info("Preloaded %d known products into the seen index", loaded)
+        return self
+
+    def is_seen(self, url: str) -> bool:
+        return any(key in self.index for key in product_keys(url))
+
+    def mark_seen(self, url: str, item_id: Optional[str] = None):
+        self.run_hashes.add(url_hash(url))
+        for key in product_keys(url, item_id):
+            self.index.add(key)
+
+    def filter_new(self, urls: Iterable[str]) -> List[str]:
+        """
+        Return the URLs that are not stored yet, in order and without duplicates
+
+        Returned URLs are marked as seen, so the same product found again later
+        in the run (e.g. in another subcategory) is not scraped twice.
+        """
+        candidates, maybe_seen = [], []
+        batch_hashes = set()
+        for url in urls:
+            digest = url_hash(url)
+            if digest in batch_hashes:
+                continue
+            batch_hashes.add(digest)
+
+            if self.is_seen(url):
+                maybe_seen.append(digest)
+            candidates.append((url, digest))
+
+        existing = set(maybe_seen)
+        if self.use_bloom and maybe_seen:
+            # Bloom filter hits can be false positives, confirm them in bulk
+            existing = self.run_hashes.intersection(maybe_seen)
+            unconfirmed = [digest for digest in maybe_seen if digest not in existing]
+            for i in range(0, len(unconfirmed), self.batch_size):
+                existing |= self.db.existing_product_hashes(unconfirmed[i:i + self.batch_size])
+                self.db_lookups += 1
+
+        new_urls = [url for url, digest in candidates if digest not in existing]
+        for url in new_urls:
+            self.mark_seen(url)
+
+        return new_urls
@@ -0,0 +1,228 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from queue import Queue, Empty
+from typing import Dict, List, Optional
+
+from core.block_detection import BlockedError, detect_block
+from core.driver_setup import get_driver, wait_for_next_data
+from core.instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+WALMART_ORIGIN = "https://www.walmart.com"
+
+
+class PooledDriver:
+    """A warm Chrome instance together with its usage counters and timings"""
+
+    def __init__(self, driver_id: int, headless: bool = True, rate_limiter=None):
+        self.driver_id = driver_id
+        self.rate_limiter = rate_limiter
+        started = time.perf_counter()
+        with metrics.span('driver_launch'):
+            self.driver = get_driver(headless=headless)
+        self.launch_time = time.perf_counter() - started
+        self.pages_loaded = 0
+        self.page_load_times: List[float] = []
+        self.blocked = False
+
+    def get(self, url: str) -> str:
+        """
+        Load URL in this driver and return the page source
+
+        Raises:
+            BlockedError: If a captcha / robot check was served instead; the
+                driver is then flagged so the pool recycles it
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(url)
+
+        started = time.perf_counter()
+        with metrics.span('page_load', fetcher='browser'):
+            self.driver.get(url)
+            # get() may return before the page is parsed (lean driver, eager load)
+            wait_for_next_data(self.driver)
+            page_source = self.driver.page_source
+        self.page_load_times.append(time.perf_counter() - started)
+        self.pages_loaded += 1
+        metrics.inc('pages_total', fetcher='browser')
+
+        reason = detect_block(page_source, url=self.driver.current_url)
+        if reason is not None:
+            self.blocked = True
+            metrics.inc('captchas_total', fetcher='browser', reason=reason)
+            logger.warning("Bot challenge in browser", extra={"url": url, "driver_id": self.driver_id})
+            if self.rate_limiter is not None:
+                self.rate_limiter.record_block(url, reason)
+            raise BlockedError(f"Bot challenge for {url} ({reason})", reason)
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.record_success(url)
+
+        return page_source
+
+    def set_cookies(self, cookies: Dict):
+        """
+        Replace the cookies of this browser, e.g. to switch its store context
+
+        Cookies can only be set for the domain of the loaded page, so a cheap
+        page of that domain is opened first when the browser is elsewhere.
+        """
+        if not self.driver.current_url.startswith(WALMART_ORIGIN):
+            self.driver.get(f"{WALMART_ORIGIN}/robots.txt")
+        self.driver.delete_all_cookies()
+        for name, value in cookies.items():
+            self.driver.add_cookie({"name": name, "value": value, "domain": ".walmart.com", "path": "/"})
+
+    def mark_blocked(self):
+        """Flag this driver so it is recycled instead of returned to the pool"""
+        self.blocked = True
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict:
+        loads = self.page_load_times
+        return {
+            "driver_id": self.driver_id,
+            "launch_time": round(self.launch_time, 3),
+            "pages_loaded": self.pages_loaded,
+            "avg_page_load": round(sum(loads) / len(loads), 3) if loads else None,
+            "max_page_load": round(max(loads), 3) if loads else None,
+            "blocked": self.blocked,
+        }
+
+
+class DriverPool:
+    def __init__(self, size: int = 2, max_pages: int = 20, headless: bool = True, rate_limiter=None,
+                 borrow_timeout: Optional[float] = 300):
+        """
+        Keep a fixed number of pre-launched Chrome drivers warm
+
+        Every slot of the pool is either a warm driver or empty (None) after
+        its driver was recycled; an empty slot is launched again by the next
+        borrower, so a failing launch costs that borrower a page but never
+        the slot itself.
+
+        Args:
+            size: Number of browsers kept alive at once
+            max_pages: Pages a driver may load before it is recycled
+            headless: Launch browsers in headless mode
+            rate_limiter: Optional AdaptiveRateLimiter gating every page load
+            borrow_timeout: Default seconds driver() waits for a free slot
+        """
+        self.size = size
+        self.max_pages = max_pages
+        self.borrow_timeout = borrow_timeout
+        self.headless = headless
+        self.rate_limiter = rate_limiter
+        self._idle: Queue = Queue()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._all: List[PooledDriver] = []
+        self.retired: List[Dict] = []
+        self.recycled_blocked = 0
+        self.recycled_exhausted = 0
+        self.failed_launches = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _launch(self) -> PooledDriver:
+        with self._lock:
+            self._next_id += 1
+            driver_id = self._next_id
+        pooled = PooledDriver(driver_id, headless=self.headless, rate_limiter=self.rate_limiter)
+        with self._lock:
+            self._all.append(pooled)
+        logger.info("Launched driver", extra={"driver_id": driver_id, "launch_time": round(pooled.launch_time, 2)})
+        return pooled
+
+    def _retire(self, pooled: PooledDriver):
+        pooled.quit()
+        with self._lock:
+            if pooled in self._all:
+                self._all.remove(pooled)
+            self.retired.append(pooled.stats())
+
+    def start(self):
+        """Pre-launch all drivers of the pool"""
+        for _ in range(self.size - self._idle.qsize()):
+            self._idle.put(self._launch())
+
+    def close(self):
+        """Quit every driver still owned by the pool"""
+        while True:
+            try:
+                self._idle.get_nowait()
+            except Empty:
+                break
+        for pooled in list(self._all):
+            self._retire(pooled)
+
+    @contextmanager
+    def driver(self, timeout: Optional[float] = None):
+        """
+        Borrow a warm driver for the duration of the with-block
+
+        The driver is recycled (quit, and replaced by a fresh one on the slot's
+        next borrow) once it has loaded max_pages pages, or when it hit a
+        captcha / blocked page.
+
+        Raises:
+            TimeoutError: If no slot became free within timeout (default: borrow_timeout) seconds
+        """
+        if timeout is None:
+            timeout = self.borrow_timeout
+        try:
+            pooled = self._idle.get(timeout=timeout)
+        except Empty:
+            raise TimeoutError("No driver became available in the pool")
+
+        if pooled is None:
+            try:
+                pooled = self._launch()
+            except Exception:
+                self.failed_launches += 1
+                # Keep the slot, the next borrower launches again
+                self._idle.put(None)
+                raise
+
+        try:
+            yield pooled
+        except Exception:
+            # A failing page leaves the browser in an unknown state
+            pooled.mark_blocked()
+            raise
+        finally:
+            if pooled.blocked or pooled.pages_loaded >= self.max_pages:
+                if pooled.blocked:
+                    self.recycled_blocked += 1
+                else:
+                    self.recycled_exhausted += 1
+                self._retire(pooled)
+                # Launched by the next borrower: a launch failing here would lose the
+                # slot and hide the exception of the with-block
+                pooled = None
+            self._idle.put(pooled)
+
+    def stats(self) -> Dict:
+        """Launch and page-load timings of every driver the pool has owned"""
+        with self._lock:
+            drivers = self.retired + [pooled.stats() for pooled in self._all]
+        return {
+            "drivers_launched": self._next_id,
+            "recycled_blocked": self.recycled_blocked,
+            "recycled_exhausted": self.recycled_exhausted,
+            "failed_launches": self.failed_launches,
+            "drivers": drivers,
+        }
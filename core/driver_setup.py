@@ -1,26 +1,103 @@
 import undetected_chromedriver as uc
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from core.config import DRIVER_CONFIG, USER_AGENT
+
+# Requests a lean driver never sends: images, fonts and media by extension,
+# plus third-party ad and analytics hosts. Only the HTML (with the inline
+# __NEXT_DATA__ script), stylesheets and first-party scripts are loaded.
+LEAN_BLOCKED_URLS = [
+    # Images
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    # Fonts
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    # Media
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3",
+    # Ads and analytics
+    "*doubleclick.net*", "*googlesyndication.com*", "*googletagmanager.com*",
+    "*google-analytics.com*", "*googleadservices.com*", "*facebook.net*",
+    "*adsrvr.org*", "*criteo.com*", "*criteo.net*", "*scorecardresearch.com*",
+    "*quantserve.com*", "*hotjar.com*", "*bing.com/action*", "*pinimg.com*",
+    "*tiktok.com*", "*snapchat.com*", "*adobedtm.com*", "*demdex.net*",
+]
+
+
+def get_driver(headless=True, lean=None):
+    """
+    Initialize and configure undetected Chrome WebDriver
+
+    Args:
+        headless: Run Chrome without a window
+        lean: Block images, fonts, media and trackers and return from get()
+            as soon as the DOM is parsed (DRIVER_CONFIG['lean'] when None).
+            Pages then have to be waited for explicitly, see wait_for_next_data
+    """
+    if lean is None:
+        lean = DRIVER_CONFIG['lean']
 
-def get_driver(headless=True):
-    """Initialize and configure undetected Chrome WebDriver"""
     options = Options()
-    
+
     if headless:
         options.add_argument("--headless")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
     options.add_argument("--start-maximized")
-    options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36")
+    options.add_argument(f"--user-agent={USER_AGENT}")
     options.add_argument("--disable-popup-blocking")
     options.add_argument("--allow-redirects")
     options.add_argument("--incognito")
 
-    
+    if lean:
+        options.page_load_strategy = DRIVER_CONFIG['page_load_strategy']
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_argument("--disable-remote-fonts")
+
     # Initialize undetected-chromedriver
     driver = uc.Chrome(
         options=options,
         headless=headless,
     )
-    
-    driver.implicitly_wait(10)
-    return driver
\ No newline at end of file
+
+    if lean:
+        # Blocked requests fail in the browser before they reach the network
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {
+            "urls": LEAN_BLOCKED_URLS + DRIVER_CONFIG['blocked_urls']
+        })
+
+    if not lean:
+        # A lean driver returns from get() early, its lookups wait explicitly instead
+        driver.implicitly_wait(10)
+    return driver
+
+
+def wait_for_next_data(driver, timeout=None):
+    """
+    Wait until the __NEXT_DATA__ script of the loaded page is in the DOM
+
+    Needed when get() returns early (eager / none page load strategy). Gives
+    up as soon as the document finished loading without it, e.g. on a captcha
+    page, so block detection is not delayed by the full timeout.
+
+    Returns:
+        True if the script is present, False otherwise
+    """
+    if timeout is None:
+        timeout = DRIVER_CONFIG['next_data_timeout']
+
+    def settled(driver):
+        # Looked up in the page rather than with find_elements, which would sit
+        # out the implicit wait of a non-lean driver on every poll of a captcha page
+        found, ready_state = driver.execute_script(
+            "return [document.getElementById('__NEXT_DATA__') !== null, document.readyState]"
+        )
+        if found:
+            return "found"
+        if ready_state == "complete":
+            return "missing"
+        return False
+
+    try:
+        return WebDriverWait(driver, timeout).until(settled) == "found"
+    except Exception:
+        return False
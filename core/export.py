@@ -0,0 +1,283 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from core.extract import price_cents
+from core.instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+# products columns read by an export, in row tuple order
+EXPORT_COLUMNS = [
+    'id', 'item_id', 'upc', 'product_id', 'url', 'name', 'categories', 'image',
+    'store_id', 'store_location', 'price', 'mrp', 'availability', 'keyword',
+    'size', 'size_quantity', 'size_unit', 'last_scraped_at', 'price_changes', 'price_changed_at'
+]
+
+# Low-cardinality strings are dictionary encoded, prices are integer cents
+DICTIONARY = pa.dictionary(pa.int32(), pa.string())
+EXPORT_SCHEMA = pa.schema([
+    ('id', pa.uint64()),
+    ('item_id', pa.string()),
+    ('upc', pa.string()),
+    ('product_id', pa.string()),
+    ('url', pa.string()),
+    ('name', pa.string()),
+    ('categories', pa.list_(DICTIONARY)),
+    ('image', pa.string()),
+    ('store_id', DICTIONARY),
+    ('store_location', DICTIONARY),
+    ('price_cents', pa.int64()),
+    ('mrp_cents', pa.int64()),
+    ('discount_percent', pa.float32()),
+    ('availability', DICTIONARY),
+    ('keyword', DICTIONARY),
+    ('size', pa.string()),
+    ('size_quantity', pa.float64()),
+    ('size_unit', DICTIONARY),
+    ('last_scraped_at', pa.timestamp('s')),
+    ('price_changes', pa.int32()),
+    ('price_changed_at', pa.timestamp('s')),
+])
+
+# Hive's name of the partition of rows without a value
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+# High-water mark of the last completed export, kept in the export directory
+STATE_FILE = '_export_state.json'
+
+# Prices repeat a lot across products and stores, parse every distinct string once
+_cents = lru_cache(maxsize=100000)(price_cents)
+
+
+def dictionary_array(values) -> pa.DictionaryArray:
+    return pa.array(values, pa.string()).dictionary_encode()
+
+
+def categories_array(values) -> pa.ListArray:
+    """list<dictionary<string>> of the JSON category paths of the products table"""
+    offsets, names = [0], []
+    for value in values:
+        names.extend(json.loads(value) if value else [])
+        offsets.append(len(names))
+    return pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), dictionary_array(names))
+
+
+def _discount_percent(price: Optional[int], mrp: Optional[int]) -> Optional[float]:
+    if price is None or not mrp:
+        return None
+    return round(max(mrp - price, 0) * 100 / mrp, 2)
+
+
+def record_batch(rows: List[tuple]) -> pa.RecordBatch:
+    """Typed Arrow record batch (EXPORT_SCHEMA) of product row tuples in EXPORT_COLUMNS order"""
+    columns = dict(zip(EXPORT_COLUMNS, zip(*rows)))
+    price = [_cents(value) for value in columns['price']]
+    mrp = [_cents(value) for value in columns['mrp']]
+
+    arrays = {
+        'id': pa.array(columns['id'], pa.uint64()),
+        'categories': categories_array(columns['categories']),
+        'price_cents': pa.array(price, pa.int64()),
+        'mrp_cents': pa.array(mrp, pa.int64()),
+        'discount_percent': pa.array([_discount_percent(p, m) for p, m in zip(price, mrp)], pa.float32()),
+        'size_quantity': pa.array([None if value is None else float(value) for value in columns['size_quantity']],
+                                  pa.float64()),
+        'last_scraped_at': pa.array(columns['last_scraped_at'], pa.timestamp('s')),
+        'price_changes': pa.array(columns['price_changes'], pa.int32()),
+        'price_changed_at': pa.array(columns['price_changed_at'], pa.timestamp('s')),
+    }
+    for field in EXPORT_SCHEMA:
+        if field.name in arrays:
+            continue
+        if field.type == DICTIONARY:
+            arrays[field.name] = dictionary_array(columns[field.name])
+        else:
+            arrays[field.name] = pa.array(columns[field.name], pa.string())
+
+    return pa.RecordBatch.from_arrays([arrays[field.name] for field in EXPORT_SCHEMA], schema=EXPORT_SCHEMA)
+
+
+def partition_runs(rows: List[tuple]) -> Iterator[Tuple[str, int, int]]:
+    """
+    (partition, start, end) of every run of rows scraped on the same day
+
+    Rows arrive in last_scraped_at order, so each day is one contiguous run.
+    """
+    ts_index = EXPORT_COLUMNS.index('last_scraped_at')
+    start, current = 0, None
+    for index, row in enumerate(rows):
+        ts = row[ts_index]
+        partition = ts.strftime('%Y-%m-%d') if ts is not None else NULL_PARTITION
+        if partition != current:
+            if current is not None:
+                yield current, start, index
+            start, current = index, partition
+    if current is not None:
+        yield current, start, len(rows)
+
+
+class ParquetExporter:
+    def __init__(self, db, directory: str, chunk_size: int = 50000,
+                 max_rows_per_file: int = 1000000, compression: str = 'zstd'):
+        """
+        Stream the products table into Parquet files partitioned by scrape day
+
+        Products are read with an unbuffered cursor in chunk_size chunks, each
+        converted into one typed Arrow record batch and appended to the open
+        Parquet file as a row group. Only one chunk and one file writer are
+        held at a time, so memory stays flat however large the table is.
+
+        Files go to <directory>/scraped_date=YYYY-MM-DD/part-<run>-<n>.parquet
+        (Hive layout, read back with pyarrow.dataset or any Parquet engine).
+        Every completed export records its high-water mark, the
+        (last_scraped_at, id) of its last row, so the next export only writes
+        products scraped since.
+
+        Args:
+            db: Connected DatabaseManager
+            directory: Root directory of the partitioned dataset
+            chunk_size: Rows per record batch / row group
+            max_rows_per_file: A partition's file is rolled over after this many rows
+            compression: Parquet codec
+        """
+        self.db = db
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.max_rows_per_file = max_rows_per_file
+        self.compression = compression
+
+        self._writer = None
+        self._partition = None
+        self._path = None
+        self._file_rows = 0
+        self._file_number = 0
+        self._run_id = None
+        self._run_paths: List[str] = []
+
+        self.rows = 0
+        self.files = 0
+        self.partitions = set()
+        self.bytes_written = 0
+        self.seconds = 0.0
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.directory, STATE_FILE)
+
+    def load_mark(self) -> Optional[tuple]:
+        """(last_scraped_at, id) the previous export stopped at, None before the first one"""
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        return datetime.fromisoformat(state['last_scraped_at']), state['id']
+
+    def save_mark(self, last_scraped_at: datetime, row_id: int):
+        state = {
+            "last_scraped_at": last_scraped_at.isoformat(),
+            "id": row_id,
+            "exported_at": datetime.now().isoformat(timespec='seconds'),
+        }
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def export(self, full: bool = False) -> Dict:
+        """
+        Export the products scraped since the last export (every product when full)
+
+        Rows scraped during the export's first second are left to the next
+        export, so no row committed later with an earlier timestamp is missed.
+        """
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+
+        after = None if full else self.load_mark()
+        until = self.db.get_server_time()
+        self._run_id = until.strftime('%Y%m%dT%H%M%S')
+        self._run_paths = []
+        logger.info("Exporting products scraped %s to %s", f"after {after[0]}" if after else "until now", self.directory)
+
+        ts_index, id_index = EXPORT_COLUMNS.index('last_scraped_at'), EXPORT_COLUMNS.index('id')
+        last_row = None
+        try:
+            for rows in self.db.stream_products(EXPORT_COLUMNS, after, until, self.chunk_size):
+                with metrics.span('export_convert'):
+                    batch = record_batch(rows)
+                with metrics.span('export_write'):
+                    for partition, start, end in partition_runs(rows):
+                        self._write(partition, batch.slice(start, end - start))
+                self.rows += len(rows)
+                last_row = rows[-1]
+            self._close_file()
+        except BaseException:
+            # All or nothing: without a new mark, the next export writes these rows again
+            self._discard_file()
+            for path in self._run_paths:
+                os.remove(path)
+            raise
+
+        if last_row is not None and last_row[ts_index] is not None:
+            self.save_mark(last_row[ts_index], last_row[id_index])
+        self.seconds = time.perf_counter() - started
+        metrics.inc('products_exported_total', self.rows)
+        return self.stats()
+
+    def _write(self, partition: str, batch: pa.RecordBatch):
+        if self._writer is not None and (partition != self._partition or self._file_rows >= self.max_rows_per_file):
+            self._close_file()
+        if self._writer is None:
+            self._open_file(partition)
+        self._writer.write_batch(batch)
+        self._file_rows += batch.num_rows
+
+    def _open_file(self, partition: str):
+        directory = os.path.join(self.directory, f"scraped_date={partition}")
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, f"part-{self._run_id}-{self._file_number:05d}.parquet")
+        self._file_number += 1
+        # Written under a temporary name, so readers never see a half-written file
+        self._writer = pq.ParquetWriter(self._path + '.tmp', EXPORT_SCHEMA, compression=self.compression)
+        self._partition = partition
+        self._file_rows = 0
+        self.partitions.add(partition)
+
+    def _close_file(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        os.replace(self._path + '.tmp', self._path)
+        self._run_paths.append(self._path)
+        self.bytes_written += os.path.getsize(self._path)
+        self.files += 1
+        self._writer = None
+
+    def _discard_file(self):
+        if self._writer is None:
+            return
+        try:
+            self._writer.close()
+        finally:
+            self._writer = None
+            if os.path.exists(self._path + '.tmp'):
+                os.remove(self._path + '.tmp')
+
+    def stats(self) -> Dict:
+        return {
+            "rows": self.rows,
+            "files": self.files,
+            "partitions": len(self.partitions),
+            "mb_written": round(self.bytes_written / 1024 / 1024, 2),
+            "seconds": round(self.seconds, 2),
+            "rows_per_sec": round(self.rows / self.seconds, 2) if self.seconds else 0.0,
+        }
@@ -0,0 +1,302 @@
+import re
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import urljoin
+
+from core.dedup import item_id_from_url
+
+# Units a size can be written in, in priority order: the first unit that occurs
+# anywhere in the title wins, even if another one occurs earlier in the text.
+SIZE_UNIT_PATTERNS = [
+    ('fl_oz', r'fl\.?\s*oz'),            # "17 fl oz", "12 fl. oz"
+    ('oz', r'oz'),                       # "6 oz", "15.8 oz"
+    ('lb', r'lbs?|pounds?'),             # "2 lb", "1.5 lbs"
+    ('g', r'g|grams?'),                  # "500 g"
+    ('ml', r'ml'),                       # "250 ml"
+    ('l', r'l|liters?|litres?'),         # "1 l", "2 liter"
+    ('gal', r'gal|gallons?'),            # "1 gal", "1 gallon"
+    ('ct', r'ct|count'),                 # "12 ct", "24 count"
+]
+
+# One alternation for every format: a number followed by any unit, or "Pack of N".
+# Sharing the number prefix keeps it to a single cheap pass over the title.
+# The number may be a fraction of one digit each ("1/2 gal", "1 1/2 lb"); the
+# lookbehind keeps the denominator of any other n/m ("6/12 oz") from being read
+# as a size of its own.
+SIZE_REGEX = re.compile(
+    r'(?<![\d./])(?P<quantity>(?:\d+\s+)?\d/\d|\d+(?:\.\d+)?)\s*(?:'
+    + '|'.join(f'(?P<{name}>{pattern})' for name, pattern in SIZE_UNIT_PATTERNS)
+    + r')\b|Pack\s+of\s+(?P<pack>\d+)',
+    re.IGNORECASE
+)
+
+SIZE_PRIORITY = {name: priority for priority, (name, _) in enumerate(SIZE_UNIT_PATTERNS + [('pack', '')])}
+
+# Normalized unit stored in products.size_unit
+SIZE_UNITS = {
+    'fl_oz': 'fl oz',
+    'oz': 'oz',
+    'lb': 'lb',
+    'g': 'g',
+    'ml': 'ml',
+    'l': 'l',
+    'gal': 'gal',
+    'ct': 'count',
+    'pack': 'count',
+}
+
+# First number of a price string, e.g. '1,299.00' of '$1,299.00'
+PRICE_NUMBER = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+
+def parse_size(title: str) -> Tuple[str, Optional[float], Optional[str]]:
+    """
+    Find the size of a product in its title with a single regex scan
+
+    Returns:
+        (size text as written in the title, numeric quantity, normalized unit),
+        or ('', None, None) when the title has no recognizable size
+    """
+    best, best_priority, best_quantity = None, len(SIZE_PRIORITY), None
+    for match in SIZE_REGEX.finditer(title or ''):
+        priority = SIZE_PRIORITY[match.lastgroup]
+        if priority < best_priority:
+            quantity = float(match.group('pack')) if match.lastgroup == 'pack' else _quantity(match.group('quantity'))
+            if quantity is None:
+                continue
+            best, best_priority, best_quantity = match, priority, quantity
+            if priority == 0:
+                break
+
+    if best is None:
+        return '', None, None
+
+    return best.group(0), best_quantity, SIZE_UNITS[best.lastgroup]
+
+
+def _quantity(text: str) -> Optional[float]:
+    """Value of a size quantity like '12', '1.5', '1/2' or '1 1/2'; None unless a fraction is below 1"""
+    if '/' not in text:
+        return float(text)
+    *whole, fraction = text.split()
+    numerator, denominator = (int(part) for part in fraction.split('/'))
+    if not 0 < numerator < denominator:
+        return None
+    return int(whole[0]) + numerator / denominator if whole else numerator / denominator
+
+
+def extract_size(title: str) -> str:
+    """Size as written in the title, e.g. '20 oz' ('' when there is none)"""
+    return parse_size(title)[0]
+
+
+def dig(data: Any, *path, default=None):
+    """Follow dict keys / list indexes through data, returning default on any gap"""
+    for key in path:
+        try:
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return default
+        if data is None:
+            return default
+    return data
+
+
+def first_of(*values, default=None):
+    """First value that is not None or empty"""
+    for value in values:
+        if value not in (None, '', []):
+            return value
+    return default
+
+
+def fill_store_data(pd: dict) -> dict:
+    """
+    Store-specific fields of a product payload: store, price and availability
+
+    Everything else on a product page (name, UPC, categories, image, ...) is
+    the same for every store, see fill_product_data.
+    """
+    current_price = first_of(
+        dig(pd, 'priceInfo', 'currentPrice', 'priceString'),
+        _price_string(dig(pd, 'priceInfo', 'currentPrice', 'price')),
+    )
+
+    mrp = first_of(
+        dig(pd, 'priceInfo', 'wasPrice', 'priceString'),
+        _price_string(dig(pd, 'priceInfo', 'wasPrice', 'price')),
+        current_price
+    )
+
+    return {
+        "store_id": dig(pd, 'location', 'storeIds', 0),
+        "store_location": dig(pd, 'location', 'city', default=""),
+        "price": current_price,
+        "mrp": mrp,
+        "discount": discount_percent(current_price, mrp),
+        "availability": first_of(
+            dig(pd, 'shippingOption', 'availabilityStatus'),
+            dig(pd, 'availabilityStatus'),
+            default=""
+        ),
+    }
+
+
+def fill_product_data(pd: dict) -> dict:
+    """
+    Fill product_data dictionary with information from pageContext
+
+    Every field falls back to an alternative location (or an empty value) when
+    it is missing from the payload, so one absent field no longer discards the
+    whole page. Only a payload without any item id is rejected.
+    """
+    item_id = first_of(dig(pd, 'usItemId'), item_id_from_url(dig(pd, 'canonicalUrl', default='')))
+    if item_id is None:
+        raise ValueError("Product payload has no usItemId")
+
+    name = dig(pd, 'name', default='')
+    size, size_quantity, size_unit = parse_size(name)
+
+    return {
+        "item_id": item_id,
+        "upc": dig(pd, 'upc'),
+        "product_id": first_of(dig(pd, 'id'), dig(pd, 'primaryProductId')),
+        "url": "",
+        "name": name,
+        "categories": [
+            category['name'].strip()
+            for category in dig(pd, 'category', 'path', default=[])
+            if dig(category, 'name')
+        ],
+        "image": first_of(
+            dig(pd, 'imageInfo', 'thumbnailUrl'),
+            dig(pd, 'imageInfo', 'allImages', 0, 'url'),
+            default=""
+        ),
+        **fill_store_data(pd),
+        "keyword": "",
+        # Extract size from name since there isn't any specific field for size
+        "size": size,
+        "size_quantity": size_quantity,
+        "size_unit": size_unit,
+    }
+
+
+def listing_items(next_data: dict) -> Iterator[dict]:
+    """Product tiles of a search / browse results page's __NEXT_DATA__"""
+    search_result = dig(next_data, 'props', 'pageProps', 'initialData', 'searchResult', default={})
+    for item_stack in search_result.get('itemStacks') or []:
+        for item in item_stack.get('items') or []:
+            if item.get('__typename') == 'Product' and item.get('canonicalUrl'):
+                yield item
+
+
+def listing_max_page(next_data: dict) -> int:
+    """Last page number of a search / browse results page's __NEXT_DATA__"""
+    return dig(next_data, 'props', 'pageProps', 'initialData', 'searchResult', 'paginationV2', 'maxPage') or 1
+
+
+def fill_listing_data(item: dict) -> dict:
+    """
+    Build a product row out of a product tile of a search / browse results page
+
+    Tiles carry the id, name, price, image and availability of a product but
+    no UPC, store location or category path; those stay empty unless the row
+    is enriched with the product page (see enrich_product).
+    """
+    url = urljoin("https://www.walmart.com", dig(item, 'canonicalUrl', default=''))
+    current_price = first_of(
+        dig(item, 'priceInfo', 'currentPrice', 'priceString'),
+        _price_string(dig(item, 'priceInfo', 'currentPrice', 'price')),
+        dig(item, 'priceInfo', 'linePrice'),
+    )
+    mrp = first_of(
+        dig(item, 'priceInfo', 'wasPrice', 'priceString'),
+        _price_string(dig(item, 'priceInfo', 'wasPrice', 'price')),
+        current_price
+    )
+    name = dig(item, 'name', default='')
+    size, size_quantity, size_unit = parse_size(name)
+
+    return {
+        "item_id": first_of(dig(item, 'usItemId'), item_id_from_url(url)),
+        "upc": dig(item, 'upc'),
+        "product_id": first_of(dig(item, 'id'), dig(item, 'primaryProductId')),
+        "url": url,
+        "name": name,
+        "categories": [
+            category['name'].strip()
+            for category in dig(item, 'category', 'path', default=[])
+            if dig(category, 'name')
+        ],
+        "image": first_of(dig(item, 'imageInfo', 'thumbnailUrl'), dig(item, 'image'), default=""),
+        "store_id": dig(item, 'fulfillmentSummary', 0, 'storeId'),
+        "store_location": "",
+        "price": current_price,
+        "mrp": mrp,
+        "discount": discount_percent(current_price, mrp),
+        "availability": first_of(
+            dig(item, 'availabilityStatusV2', 'value'),
+            dig(item, 'availabilityStatus'),
+            default=""
+        ),
+        "keyword": "",
+        "size": size,
+        "size_quantity": size_quantity,
+        "size_unit": size_unit,
+    }
+
+
+def enrich_product(listing_product: dict, detail_product: dict) -> dict:
+    """Listing row completed with every non-empty field of the product page"""
+    return {
+        **listing_product,
+        **{
+            key: value for key, value in detail_product.items()
+            if value not in (None, '', []) and key not in ('url', 'keyword')
+        },
+    }
+
+
+def price_value(price: Optional[str]) -> Optional[float]:
+    """Numeric value of a price string like '$1,299.00' (None when it has none)"""
+    cents = price_cents(price)
+    return None if cents is None else cents / 100
+
+
+def price_cents(price) -> Optional[int]:
+    """
+    Integer cents of a price string like '$1,299.00' or '88¢' (None when it has none)
+
+    Numeric prices (as in priceInfo.currentPrice.price) are taken as dollars.
+    Of a range like '$1.99 - $3.49' the first price counts.
+    """
+    if price is None or price == '':
+        return None
+    if isinstance(price, (int, float)):
+        amount = Decimal(str(price)) * 100
+    else:
+        match = PRICE_NUMBER.search(price)
+        if match is None:
+            return None
+        try:
+            amount = Decimal(match.group(0).replace(',', ''))
+        except InvalidOperation:
+            return None
+        if not price[match.end():].lstrip().startswith('¢'):
+            amount *= 100
+    return int(amount.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def discount_percent(price, mrp) -> Optional[str]:
+    """Discount of price off mrp as a whole percentage like '15%' (None without a discount)"""
+    price, mrp = price_cents(price), price_cents(mrp)
+    if price is None or not mrp or price >= mrp:
+        return None
+    return f"{round((mrp - price) * 100 / mrp)}%"
+
+
+def _price_string(price) -> Optional[str]:
+    if price is None:
+        return None
+    return f"${float(price):.2f}"
@@ -0,0 +1,202 @@
+import logging
+import os
+import socket
+from typing import Dict, Iterable, List, Optional
+
+from mysql.connector import Error
+
+from core.dedup import url_hash
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Frontier:
+    def __init__(self, db, lease_seconds: int = 600, max_retries: int = 3,
+                 worker_id: Optional[str] = None, batch_size: int = 500):
+        """
+        Persistent, resumable queue of product URLs kept in the crawl_frontier table
+
+        Several crawler processes (or machines) can share one frontier: work is
+        claimed in batches with SELECT ... FOR UPDATE SKIP LOCKED and leased for
+        lease_seconds. A lease that expires (crashed worker) makes the URL
+        claimable again.
+
+        Args:
+            db: Connected DatabaseManager
+            lease_seconds: How long a claimed URL stays reserved for this worker
+            max_retries: Failures after which a URL is marked 'failed' for good
+            worker_id: Lease owner name, defaults to hostname:pid
+            batch_size: Max rows per bulk INSERT when enqueueing
+        """
+        self.db = db
+        self.lease_seconds = lease_seconds
+        self.max_retries = max_retries
+        self.worker_id = worker_id or default_worker_id()
+        self.batch_size = batch_size
+
+    def enqueue(self, urls: Iterable[str], subcategory_id: Optional[int] = None,
+                keyword: Optional[str] = None, priority: int = 0, requeue_done: bool = False) -> int:
+        """
+        Add discovered product URLs to the frontier in bulk
+
+        URLs already in the frontier are left as they are, unless requeue_done
+        is set, in which case finished ones are made pending again (re-crawls).
+
+        Returns:
+            Number of rows inserted or requeued
+        """
+        rows = [(url, url_hash(url), subcategory_id, keyword, priority) for url in urls]
+        if not rows:
+            return 0
+
+        on_duplicate = "id = id"
+        if requeue_done:
+            on_duplicate = """
+                retries = IF(status = 'done', 0, retries),
+                status = IF(status = 'done', 'pending', status)
+            """
+
+        affected = 0
+        try:
+            for i in range(0, len(rows), self.batch_size):
+                batch = rows[i:i + self.batch_size]
+                query = f"""
+                    INSERT INTO crawl_frontier (url, url_hash, subcategory_id, keyword, priority)
+                    VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(batch))}
+                    ON DUPLICATE KEY UPDATE {on_duplicate}
+                """
+                self.db.cursor.execute(query, [value for row in batch for value in row])
+                affected += self.db.cursor.rowcount
+            self.db.connection.commit()
+        except Error as e:
+            self.db.connection.rollback()
+            logger.error("Frontier enqueue failed: %s", e)
+            raise
+
+        logger.info("Enqueued %d URLs into the frontier", len(rows))
+        return affected
+
+    def claim(self, limit: int = 20) -> List[Dict]:
+        """
+        Atomically lease up to limit pending (or lease-expired) URLs to this worker
+
+        Returns:
+            Rows with id, url, subcategory_id, keyword and retries
+        """
+        try:
+            # Each expired lease counts as a failed attempt (the worker holding it died)
+            self.db.cursor.execute("""
+                UPDATE crawl_frontier
+                SET status = 'failed', lease_owner = NULL, last_error = 'lease expired too often'
+                WHERE status = 'leased' AND lease_expires_at < NOW() AND retries + 1 >= %s
+            """, (self.max_retries,))
+
+            self.db.cursor.execute("""
+                SELECT id, url, subcategory_id, keyword, retries
+                FROM crawl_frontier
+                WHERE (status = 'pending' AND (available_at IS NULL OR available_at <= NOW()))
+                    OR (status = 'leased' AND lease_expires_at < NOW())
+                ORDER BY priority DESC, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (limit,))
+            rows = self.db.cursor.fetchall()
+
+            if rows:
+                ids = [row['id'] for row in rows]
+                self.db.cursor.execute(f"""
+                    UPDATE crawl_frontier
+                    SET retries = retries + IF(status = 'leased', 1, 0),
+                        status = 'leased',
+                        lease_owner = %s,
+                        lease_expires_at = NOW() + INTERVAL %s SECOND
+                    WHERE id IN ({', '.join(['%s'] * len(ids))})
+                """, (self.worker_id, self.lease_seconds, *ids))
+
+            self.db.connection.commit()
+            return rows
+        except Error as e:
+            self.db.connection.rollback()
+            logger.error("Frontier claim failed: %s", e)
+            raise
+
+    def renew(self, ids: List[int]):
+        """Extend the lease of URLs this worker is still working on"""
+        self._update(ids, """
+            lease_expires_at = NOW() + INTERVAL %s SECOND
+        """, (self.lease_seconds,), only_own=True)
+
+    def complete(self, ids: List[int]):
+        """
+        Mark URLs still leased to this worker as done
+
+        A URL whose lease expired and was claimed by another worker meanwhile
+        is left to that worker.
+        """
+        self._update(ids, """
+            status = 'done', lease_owner = NULL, lease_expires_at = NULL, last_error = NULL
+        """, only_own=True)
+
+    def fail(self, frontier_id: int, error: str, delay: float = 0, permanent: bool = False):
+        """
+        Count a failed attempt; give the URL back once delay seconds passed, or
+        mark it failed after max_retries or when the error is permanent
+
+        Like complete(), this only touches the URL while it is still leased to
+        this worker.
+        """
+        self._update([frontier_id], """
+            retries = retries + 1,
+            status = IF(%s OR retries >= %s, 'failed', 'pending'),
+            lease_owner = NULL,
+            lease_expires_at = NULL,
+            available_at = IF(%s > 0, NOW() + INTERVAL %s SECOND, NULL),
+            last_error = %s
+        """, (permanent, self.max_retries, delay, int(delay), str(error)[:2000]), only_own=True)
+
+    def release(self, ids: List[int]):
+        """Give leased URLs back without counting a retry (e.g. on shutdown)"""
+        self._update(ids, """
+            status = 'pending', lease_owner = NULL, lease_expires_at = NULL
+        """, only_own=True)
+
+    def _update(self, ids: List[int], assignments: str, params: tuple = (), only_own: bool = False):
+        if not ids:
+            return
+
+        query = f"""
+            UPDATE crawl_frontier SET {assignments}
+            WHERE id IN ({', '.join(['%s'] * len(ids))})
+        """
+        params = (*params, *ids)
+        if only_own:
+            query += " AND lease_owner = %s"
+            params = (*params, self.worker_id)
+
+        try:
+            self.db.cursor.execute(query, params)
+            self.db.connection.commit()
+        except Error as e:
+            self.db.connection.rollback()
+            logger.error("Frontier update failed: %s", e)
+            raise
+
+    def outstanding(self, subcategory_ids: List[int]) -> int:
+        """Number of URLs of the subcategories still pending (e.g. waiting out a retry backoff) or leased"""
+        if not subcategory_ids:
+            return 0
+        self.db.cursor.execute(f"""
+            SELECT COUNT(*) AS total FROM crawl_frontier
+            WHERE subcategory_id IN ({', '.join(['%s'] * len(subcategory_ids))})
+                AND status IN ('pending', 'leased')
+        """, tuple(subcategory_ids))
+        return self.db.cursor.fetchone()['total']
+
+    def stats(self) -> Dict:
+        """Number of frontier URLs per status"""
+        self.db.cursor.execute("SELECT status, COUNT(*) AS total FROM crawl_frontier GROUP BY status")
+        return {row['status']: row['total'] for row in self.db.cursor.fetchall()}
@@ -0,0 +1,135 @@
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.block_detection import BlockedError, detect_block
+from core.config import USER_AGENT
+from core.instrumentation import metrics
+from core.next_data import find_next_data, loads
+
+DEFAULT_HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+
+class BotChallengeError(BlockedError):
+    """Raised when a response is a bot challenge instead of the real page"""
+
+
+class HttpFetcher:
+    def __init__(self, pool_size: int = 10, timeout: float = 15, headers: Optional[Dict] = None,
+                 cache=None, rate_limiter=None, cookies: Optional[Dict] = None):
+        """
+        Browserless page fetcher using pooled keep-alive connections
+
+        Args:
+            pool_size: Max connections kept alive per host
+            timeout: Request timeout in seconds
+            headers: Extra headers sent along with the default browser-like ones
+            cache: Optional ResponseCache; fresh pages are served from it and
+                stale ones are revalidated with a conditional request
+            rate_limiter: Optional AdaptiveRateLimiter every request waits for,
+                told about every clean and blocked response
+            cookies: Cookies sent with every request, e.g. a store context
+                (see core/store_context.py)
+        """
+        self.timeout = timeout
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+        if cookies:
+            for name, value in cookies.items():
+                self.session.cookies.set(name, value, domain='.walmart.com')
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.fetched = 0
+        self.challenged = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def get(self, url: str, headers: Optional[Dict] = None) -> requests.Response:
+        """GET a URL and raise BotChallengeError if it looks like a bot challenge"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(url)
+
+        with metrics.span('page_load', fetcher='http'):
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        self.fetched += 1
+        metrics.inc('pages_total', fetcher='http')
+
+        reason = detect_block(response.content, response.status_code, response.url)
+        if reason is not None:
+            self._blocked(url, reason)
+            raise BotChallengeError(f"Bot challenge for {url} (HTTP {response.status_code}, {reason})", reason)
+
+        response.raise_for_status()
+        if self.rate_limiter is not None:
+            self.rate_limiter.record_success(url)
+        return response
+
+    def _blocked(self, url: str, reason: str):
+        self.challenged += 1
+        metrics.inc('captchas_total', fetcher='http', reason=reason)
+        if self.rate_limiter is not None:
+            self.rate_limiter.record_block(url, reason)
+
+    def get_page(self, url: str) -> bytes:
+        """Fetch a page that must carry a __NEXT_DATA__ script and return its raw bytes"""
+        cached = self.cache.lookup(url) if self.cache is not None else None
+        if cached is not None and cached['fresh']:
+            return cached['body']
+
+        conditional = {}
+        if cached is not None:
+            if cached['etag']:
+                conditional['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                conditional['If-Modified-Since'] = cached['last_modified']
+
+        response = self.get(url, headers=conditional or None)
+        if response.status_code == 304 and cached is not None:
+            self.cache.refresh(url)
+            return cached['body']
+
+        page = response.content
+
+        # A page rendered without __NEXT_DATA__ is a challenge / interstitial page
+        if find_next_data(page) is None:
+            self._blocked(url, 'interstitial')
+            raise BotChallengeError(f"No __NEXT_DATA__ found on {url}", 'interstitial')
+
+        if self.cache is not None:
+            self.cache.put(url, page, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+        return page
+
+    def get_next_data(self, url: str) -> Dict:
+        """Fetch a page and return its __NEXT_DATA__ payload"""
+        return loads(find_next_data(self.get_page(url)))
+
+    def stats(self) -> Dict:
+        stats = {
+            "fetched": self.fetched,
+            "challenged": self.challenged,
+        }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
@@ -0,0 +1,281 @@
+import bisect
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRIC_PREFIX = 'walmart_'
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+def _label_key(labels: Dict) -> Tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: Tuple, extra: Optional[Tuple] = None) -> str:
+    pairs = list(key) + list(extra or ())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Metrics:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, keep_samples: bool = False):
+        """
+        In-process registry of counters and latency histograms
+
+        Counters and histograms are keyed by name and label set. A snapshot can
+        be exported as Prometheus text or as one JSON line. With keep_samples
+        (benchmarks), every observation is also kept for exact percentiles.
+        """
+        self.buckets = buckets
+        self.keep_samples = keep_samples
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._histograms: Dict[str, Dict[Tuple, Dict]] = {}
+        self._samples: Dict[str, Dict[Tuple, List[float]]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add value to a counter"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record one observation (e.g. a duration in seconds) in a histogram"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            if self.keep_samples:
+                self._samples.setdefault(name, {}).setdefault(key, []).append(value)
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """
+        Time a pipeline stage into stage_duration_seconds{stage=...}
+
+        An exception escaping the block is also counted in failures_total (see
+        count_failure) before it propagates.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.count_failure(e, stage)
+            raise
+        finally:
+            self.observe('stage_duration_seconds', time.perf_counter() - started, stage=stage, **labels)
+
+    def count_failure(self, error: BaseException, stage: str):
+        """
+        Count an error in failures_total{stage=..., error=<exception class>}, once
+
+        An error is counted in the stage it happened in: one that a span (or an
+        earlier call) already counted in this process is not counted again by
+        the caller further up that handles it.
+        """
+        if getattr(error, '_failure_counted_in', None) == os.getpid():
+            return
+        error._failure_counted_in = os.getpid()
+        self.inc('failures_total', stage=stage, error=type(error).__name__)
+
+    def counter_total(self, name: str, **labels) -> float:
+        """Sum of a counter over every series matching the given labels"""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(value for key, value in self._counters.get(name, {}).items() if wanted <= set(key))
+
+    def samples(self, name: str, **labels) -> List[float]:
+        """Observations of a histogram over every series matching the given labels (needs keep_samples)"""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return [
+                value
+                for key, values in self._samples.get(name, {}).items() if wanted <= set(key)
+                for value in values
+            ]
+
+    def percentiles(self, name: str, quantiles: Tuple[float, ...] = (0.5, 0.99), **labels) -> Dict[float, Optional[float]]:
+        """Exact quantiles (nearest rank) of the observations matching the given labels"""
+        values = sorted(self.samples(name, **labels))
+        if not values:
+            return {q: None for q in quantiles}
+        return {q: values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))] for q in quantiles}
+
+    def snapshot(self) -> Dict:
+        """Current values, plus pages/sec and captcha rate derived from them"""
+        uptime = time.time() - self.started_at
+        pages = self.counter_total('pages_total')
+        captchas = self.counter_total('captchas_total')
+
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {}
+            for name, series in self._histograms.items():
+                histograms[name] = [
+                    {
+                        "labels": dict(key),
+                        "count": histogram["count"],
+                        "sum": round(histogram["sum"], 6),
+                        "avg": round(histogram["sum"] / histogram["count"], 6) if histogram["count"] else None,
+                        "buckets": dict(zip(map(str, self.buckets), histogram["buckets"])),
+                    }
+                    for key, histogram in series.items()
+                ]
+
+        return {
+            "ts": round(time.time(), 3),
+            "uptime_seconds": round(uptime, 3),
+            "pages_per_second": round(pages / uptime, 3) if uptime else None,
+            "captcha_rate": round(captchas / pages, 4) if pages else None,
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def to_prometheus(self) -> str:
+        """Snapshot in the Prometheus text exposition format"""
+        lines = [
+            f"# TYPE {METRIC_PREFIX}uptime_seconds gauge",
+            f"{METRIC_PREFIX}uptime_seconds {time.time() - self.started_at:.3f}",
+        ]
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{METRIC_PREFIX}{name}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram["buckets"]):
+                        cumulative += count
+                        lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(key, (('le', bound),))} {cumulative}")
+                    lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {histogram['count']}")
+                    lines.append(f"{METRIC_PREFIX}{name}_sum{_format_labels(key)} {histogram['sum']:.6f}")
+                    lines.append(f"{METRIC_PREFIX}{name}_count{_format_labels(key)} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """
+        Export to path: Prometheus text when it ends in .prom (file replaced on
+        every write, e.g. for the node_exporter textfile collector), otherwise
+        one JSON snapshot line appended per write
+        """
+        if path.endswith('.prom'):
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(temporary, path)
+        else:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(self.snapshot()) + "\n")
+
+
+# Process-wide registry used by the scrapers and core modules
+metrics = Metrics()
+
+
+class MetricsExporter(threading.Thread):
+    def __init__(self, path: str, interval: float = 30, registry: Metrics = metrics):
+        """Background thread writing the registry to path every interval seconds and on stop"""
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.registry.write(self.path)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        self.registry.write(self.path)
+
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, json_output: bool = False):
+        """
+        Log lines with the fields passed via extra={...}: appended as key=value
+        pairs to the message, or as keys of one JSON object per line
+        """
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+        if self.json_output:
+            entry = {
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+                **fields,
+            }
+            if record.exc_info:
+                entry["exception"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+
+        line = super().format(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def setup_logging(level: str = 'INFO', format: str = 'text'):
+    """Configure the root logger once per process; format is 'text' or 'json'"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_output=format == 'json'))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+
+
+def start_instrumentation(log_config: Dict, metrics_config: Dict,
+                          worker_id: Optional[str] = None) -> Optional[MetricsExporter]:
+    """
+    Set up logging and, when a metrics path is configured, start exporting metrics
+
+    Args:
+        worker_id: Set in worker processes, which export to their own file
+            (metrics.prom -> metrics-<worker_id>.prom)
+    """
+    setup_logging(**log_config)
+    path = metrics_config['path']
+    if not path:
+        return None
+
+    if worker_id is not None:
+        base, extension = os.path.splitext(path)
+        path = f"{base}-{''.join(c if c.isalnum() else '_' for c in worker_id)}{extension}"
+
+    exporter = MetricsExporter(path, metrics_config['interval'])
+    exporter.start()
+    return exporter
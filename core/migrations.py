@@ -0,0 +1,228 @@
+import logging
+from typing import List, Tuple
+
+from mysql.connector import Error, errorcode
+
+logger = logging.getLogger(__name__)
+
+# Errors of schema changes whose table, column or index is already there. MySQL
+# commits every DDL statement on its own, so a migration that stopped halfway
+# cannot be rolled back; these mark the statements it already got through.
+ALREADY_APPLIED_ERRORS = (
+    errorcode.ER_TABLE_EXISTS_ERROR,
+    errorcode.ER_DUP_FIELDNAME,
+    errorcode.ER_DUP_KEYNAME,
+)
+
+# Ordered schema changes applied on top of the README schema. Each migration runs
+# once and is recorded in the schema_migrations table.
+MIGRATIONS: List[Tuple[str, List[str]]] = [
+    ("001_products_url_hash", [
+        "ALTER TABLE products ADD COLUMN url_hash CHAR(32) NULL AFTER url",
+        # Same canonical form as core.dedup.canonical_url: no query string, fragment or trailing slash
+        """
+        UPDATE products
+        SET url_hash = MD5(TRIM(TRAILING '/' FROM SUBSTRING_INDEX(SUBSTRING_INDEX(url, '#', 1), '?', 1)))
+        WHERE url IS NOT NULL
+        """,
+        "CREATE INDEX idx_products_url_hash ON products (url_hash)",
+        "CREATE INDEX idx_products_item_id ON products (item_id)",
+    ]),
+    ("002_products_item_store_unique", [
+        # Keep only the latest row of every (item_id, store_id) before enforcing uniqueness
+        """
+        DELETE older FROM products older
+        JOIN products newer
+            ON older.item_id = newer.item_id
+            AND older.store_id <=> newer.store_id
+            AND older.id < newer.id
+        """,
+        "ALTER TABLE products ADD UNIQUE INDEX uq_products_item_store (item_id, store_id)",
+    ]),
+    ("003_crawl_frontier", [
+        """
+        CREATE TABLE IF NOT EXISTS crawl_frontier (
+            id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            url TEXT NOT NULL,
+            url_hash CHAR(32) NOT NULL,
+            subcategory_id BIGINT UNSIGNED NULL,
+            keyword VARCHAR(255) NULL,
+            status ENUM('pending', 'leased', 'done', 'failed') NOT NULL DEFAULT 'pending',
+            priority INT NOT NULL DEFAULT 0,
+            retries INT NOT NULL DEFAULT 0,
+            lease_owner VARCHAR(255) NULL,
+            lease_expires_at DATETIME NULL,
+            last_error TEXT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE INDEX uq_frontier_url_hash (url_hash),
+            INDEX idx_frontier_claim (status, priority, id),
+            INDEX idx_frontier_lease (status, lease_expires_at),
+            INDEX idx_frontier_subcategory (subcategory_id, status)
+        )
+        """,
+    ]),
+    ("004_subcategory_leases", [
+        """
+        ALTER TABLE subcategories
+            ADD COLUMN lease_owner VARCHAR(255) NULL,
+            ADD COLUMN lease_expires_at DATETIME NULL,
+            ADD COLUMN heartbeat_at DATETIME NULL,
+            ADD COLUMN attempts INT NOT NULL DEFAULT 0
+        """,
+        "CREATE INDEX idx_subcategories_lease ON subcategories (status, lease_expires_at)",
+    ]),
+    ("005_products_size_columns", [
+        """
+        ALTER TABLE products
+            ADD COLUMN size_quantity DECIMAL(12, 3) NULL AFTER size,
+            ADD COLUMN size_unit VARCHAR(16) NULL AFTER size_quantity
+        """,
+    ]),
+    ("006_products_refresh_tracking", [
+        """
+        ALTER TABLE products
+            ADD COLUMN last_scraped_at DATETIME NULL DEFAULT CURRENT_TIMESTAMP,
+            ADD COLUMN price_changes INT NOT NULL DEFAULT 0,
+            ADD COLUMN price_changed_at DATETIME NULL
+        """,
+        "CREATE INDEX idx_products_last_scraped_at ON products (last_scraped_at)",
+    ]),
+    ("007_dead_letters", [
+        """
+        CREATE TABLE IF NOT EXISTS dead_letters (
+            id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            url TEXT NOT NULL,
+            source VARCHAR(64) NOT NULL,
+            error_class VARCHAR(32) NOT NULL,
+            error TEXT NULL,
+            attempts INT NOT NULL DEFAULT 1,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_dead_letters_error_class (error_class, created_at)
+        )
+        """,
+        # Frontier URLs that failed are not claimable again before their backoff passed
+        "ALTER TABLE crawl_frontier ADD COLUMN available_at DATETIME NULL AFTER lease_expires_at",
+    ]),
+    ("008_price_history", [
+        # One row per change of price, mrp or availability of an item in a store. The
+        # primary key clusters every item's history by store and time, so the latest
+        # price and the price at a given time are both a short index range scan.
+        """
+        CREATE TABLE IF NOT EXISTS price_history (
+            item_id BIGINT UNSIGNED NOT NULL,
+            store_id INT UNSIGNED NOT NULL,
+            ts DATETIME NOT NULL,
+            price_cents INT UNSIGNED NULL,
+            mrp_cents INT UNSIGNED NULL,
+            availability_code TINYINT UNSIGNED NOT NULL DEFAULT 0,
+            PRIMARY KEY (item_id, store_id, ts)
+        )
+        """,
+        # Seed with the current state of every product (store 0 = unknown store)
+        """
+        INSERT IGNORE INTO price_history (item_id, store_id, ts, price_cents, mrp_cents, availability_code)
+        SELECT
+            CAST(item_id AS UNSIGNED),
+            CAST(COALESCE(store_id, '0') AS UNSIGNED),
+            COALESCE(price_changed_at, last_scraped_at, NOW()),
+            ROUND(CAST(REPLACE(SUBSTRING(price, 2), ',', '') AS DECIMAL(12, 2)) * 100),
+            ROUND(CAST(REPLACE(SUBSTRING(mrp, 2), ',', '') AS DECIMAL(12, 2)) * 100),
+            CASE UPPER(availability)
+                WHEN 'IN_STOCK' THEN 1
+                WHEN 'OUT_OF_STOCK' THEN 2
+                WHEN 'LIMITED_STOCK' THEN 3
+                WHEN 'NOT_AVAILABLE' THEN 4
+                WHEN 'RETIRED' THEN 5
+                WHEN '' THEN 0
+                ELSE 255
+            END
+        FROM products
+        WHERE item_id REGEXP '^[0-9]+$'
+            AND COALESCE(store_id, '0') REGEXP '^[0-9]+$'
+            AND price LIKE '$%'
+            AND (mrp IS NULL OR mrp LIKE '$%')
+        """,
+    ]),
+    ("009_subcategories_url_hash", [
+        "ALTER TABLE subcategories ADD COLUMN url_hash CHAR(32) NULL AFTER subcategory_url",
+        # Same canonical form as core.dedup.canonical_url, see 001_products_url_hash
+        """
+        UPDATE subcategories
+        SET url_hash = MD5(TRIM(TRAILING '/' FROM
+            SUBSTRING_INDEX(SUBSTRING_INDEX(subcategory_url, '#', 1), '?', 1)))
+        """,
+        # Every earlier discovery run inserted all subcategories again: keep the oldest
+        # row of each URL, done if any of its copies is done
+        """
+        UPDATE subcategories older
+        JOIN subcategories newer ON older.url_hash = newer.url_hash AND older.id < newer.id
+        SET older.status = 'done'
+        WHERE newer.status = 'done'
+        """,
+        """
+        DELETE newer FROM subcategories newer
+        JOIN subcategories older ON older.url_hash = newer.url_hash AND older.id < newer.id
+        """,
+        "ALTER TABLE subcategories ADD UNIQUE INDEX uq_subcategories_url_hash (url_hash)",
+    ]),
+    ("010_products_refresh_failures", [
+        # Products whose refresh failed sit out a while instead of coming back in every batch
+        "ALTER TABLE products ADD COLUMN refresh_failed_at DATETIME NULL AFTER price_changed_at",
+    ]),
+]
+
+
+def apply_migrations(db) -> List[str]:
+    """
+    Apply every migration not yet recorded in schema_migrations
+
+    Re-running a migration that failed halfway is safe: statements whose
+    table, column or index already exists are skipped, and the data
+    statements give the same result when run twice.
+
+    Args:
+        db: Connected DatabaseManager
+
+    Returns:
+        Names of the migrations applied by this call
+    """
+    db.execute_query("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name VARCHAR(255) PRIMARY KEY,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    applied = {row['name'] for row in db.execute_query("SELECT name FROM schema_migrations").fetchall()}
+
+    newly_applied = []
+    for name, statements in MIGRATIONS:
+        if name in applied:
+            continue
+
+        logger.info("Applying migration %s", name)
+        for statement in statements:
+            try:
+                db.cursor.execute(statement)
+                db.connection.commit()
+            except Error as e:
+                db.connection.rollback()
+                if e.errno not in ALREADY_APPLIED_ERRORS:
+                    logger.error("Migration %s failed, fix the cause and run it again: %s", name, e)
+                    raise
+                logger.warning("Skipping statement of migration %s that is already applied: %s", name, e.msg)
+        db.execute_query("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+        newly_applied.append(name)
+
+    return newly_applied
+
+
+if __name__ == "__main__":
+    from core.config import DB_CONFIG, LOG_CONFIG
+    from core.database import DatabaseManager
+    from core.instrumentation import setup_logging
+
+    setup_logging(**LOG_CONFIG)
+    with DatabaseManager(DB_CONFIG) as db:
+        applied = apply_migrations(db)
+        logger.info("Applied %d migrations", len(applied))
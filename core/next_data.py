@@ -0,0 +1,91 @@
+import json
+from typing import Any, Dict, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+NEXT_DATA_MARKER = b'id="__NEXT_DATA__"'
+SCRIPT_END = b'</script>'
+
+PRODUCT_PATH = ('props', 'pageProps', 'initialData', 'data', 'product')
+
+
+class NextDataNotFound(ValueError):
+    """Raised when a page has no __NEXT_DATA__ script"""
+
+
+def find_next_data(page: Union[str, bytes]) -> Optional[bytes]:
+    """
+    Return the raw JSON text of the __NEXT_DATA__ script, or None if missing
+
+    Instead of parsing the whole (multi-megabyte) page into a DOM, this scans
+    the bytes for the script's id attribute and slices up to its closing tag.
+    """
+    if isinstance(page, str):
+        page = page.encode('utf-8')
+
+    marker = page.find(NEXT_DATA_MARKER)
+    if marker == -1:
+        # Fall back to single quotes around the id
+        marker = page.find(NEXT_DATA_MARKER.replace(b'"', b"'"))
+        if marker == -1:
+            return None
+
+    start = page.find(b'>', marker)
+    if start == -1:
+        return None
+    end = page.find(SCRIPT_END, start)
+    if end == -1:
+        return None
+
+    return page[start + 1:end]
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Decode JSON with orjson when it is installed, json otherwise"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def extract_next_data(page: Union[str, bytes]) -> Optional[Dict]:
+    """Return the parsed __NEXT_DATA__ payload of a page, or None if missing"""
+    raw = find_next_data(page)
+    if raw is None:
+        return None
+    return loads(raw)
+
+
+def extract_product(page: Union[str, bytes], stream: bool = False) -> Dict:
+    """
+    Return props.pageProps.initialData.data.product of a product page
+
+    Args:
+        page: Page source (str or bytes)
+        stream: Stream-parse only the product subtree with ijson (when installed)
+            instead of decoding the whole payload
+
+    Raises:
+        NextDataNotFound: If the page has no __NEXT_DATA__ script
+        KeyError: If the payload has no product
+    """
+    raw = find_next_data(page)
+    if raw is None:
+        raise NextDataNotFound("No __NEXT_DATA__ script found on page")
+
+    if stream and ijson is not None:
+        for product in ijson.items(raw, '.'.join(PRODUCT_PATH), use_float=True):
+            return product
+        raise KeyError('product')
+
+    payload = loads(raw)
+    for key in PRODUCT_PATH:
+        payload = payload[key]
+    return payload
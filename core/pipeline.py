@@ -0,0 +1,261 @@
+import logging
+import time
+from contextlib import nullcontext
+from functools import partial
+
+from core.config import DEDUP_CONFIG, DRIVER_POOL_CONFIG, PRICE_HISTORY_CONFIG, RETRY_CONFIG, SCRAPER_CONFIG
+from core.dedup import ProductDeduplicator
+from core.driver_setup import get_driver, wait_for_next_data
+from core.extract import fill_product_data
+from core.http_fetcher import BotChallengeError
+from core.instrumentation import metrics
+from core.next_data import extract_product, find_next_data
+from core.price_history import PriceHistory
+from core.retry import RetryScheduler
+from core.workers import ConcurrentScraper
+
+logger = logging.getLogger(__name__)
+
+
+def parse_product_page(page_source, product_url, archive=None):
+    """Parse product details out of a product page's source"""
+    with metrics.span('parse'):
+        product = extract_product(page_source)
+    with metrics.span('extract'):
+        product_data = fill_product_data(product)
+    product_data['url'] = product_url
+
+    # Keep the raw payload so later extractor changes can be replayed offline
+    if archive is not None:
+        archive.append(product_url, find_next_data(page_source), product_data['item_id'])
+
+    return product_data
+
+
+def scrape_product_details(product_url, pool=None, fetcher=None, archive=None):
+    # Fast path: fetch raw HTML without a browser, fall back to Chrome on bot challenges
+    if fetcher is not None:
+        try:
+            logger.debug("Fetching %s", product_url)
+            product_data = parse_product_page(fetcher.get_page(product_url), product_url, archive)
+            logger.debug("Scraped product", extra={"item_id": product_data['item_id'], "url": product_url})
+            return product_data
+        except BotChallengeError as e:
+            logger.warning("%s, falling back to browser", e)
+
+    if pool is not None:
+        logger.debug("Opening %s", product_url)
+        with pool.driver() as pooled:
+            page_source = pooled.get(product_url)
+            product_data = parse_product_page(page_source, product_url, archive)
+
+        logger.debug("Scraped product", extra={"item_id": product_data['item_id'], "url": product_url})
+        return product_data
+
+    driver = get_driver(headless=True)
+
+    try:
+        logger.debug("Opening %s", product_url)
+        driver.get(product_url)
+        wait_for_next_data(driver)
+
+        page_source = driver.page_source
+
+        product_data = parse_product_page(page_source, product_url, archive)
+
+        logger.debug("Scraped product", extra={"item_id": product_data['item_id'], "url": product_url})
+
+        driver.close()
+        del driver
+
+        return product_data
+    except Exception as e:
+        logger.error("Error occured while scraping product details: %s", e)
+
+        driver.close()
+        del driver
+
+        raise e
+
+
+def scrape_all(product_urls, pool, scraper=None, fetcher=None, archive=None):
+    """Yield (product_url, product_details, error) for every URL, in input order"""
+    if scraper is not None:
+        # Workers scrape in parallel, results come back one by one in input order
+        yield from scraper.map(partial(scrape_product_details, fetcher=fetcher, archive=archive), product_urls)
+        return
+
+    for product_url in product_urls:
+        try:
+            yield product_url, scrape_product_details(product_url, pool=pool, fetcher=fetcher, archive=archive), None
+        except Exception as e:
+            yield product_url, None, e
+
+
+def scrape_and_store(writer, product_urls, pool, scraper=None, fetcher=None, archive=None, retry=None):
+    """
+    Scrape product URLs (concurrently when a scraper is given) and store the results
+
+    With a retry scheduler (one per run), failed URLs are queued again with a
+    backoff, and retries of earlier calls that are due by now are scraped along
+    with product_urls. Retries still waiting out their backoff are left queued
+    for later calls or drain_retries, so a blocked URL never holds up fresh
+    work. Without a scheduler failures are only logged.
+    """
+    if retry is None:
+        for product_url, product_details, error in scrape_all(product_urls, pool, scraper, fetcher, archive):
+            if error is not None:
+                logger.error("Failed to scrape %s: %s", product_url, error)
+                metrics.count_failure(error, 'scrape')
+                continue
+            writer.add(product_details)
+        return
+
+    retry.add(product_urls)
+    _scrape_queued(writer, pool, scraper, fetcher, archive, retry, wait=False)
+
+
+def drain_retries(writer, pool, scraper=None, fetcher=None, archive=None, retry=None):
+    """Wait out the backoff of every retry still queued and scrape them, at the end of a run"""
+    if retry is None or not len(retry):
+        return
+    logger.info("Draining %d queued retries", len(retry))
+    _scrape_queued(writer, pool, scraper, fetcher, archive, retry, wait=True)
+
+
+def _scrape_queued(writer, pool, scraper, fetcher, archive, retry, wait):
+    while True:
+        batch = retry.next_batch(wait=wait)
+        if not batch:
+            return
+
+        for product_url, product_details, error in scrape_all(batch, pool, scraper, fetcher, archive):
+            if error is not None:
+                metrics.count_failure(error, 'scrape')
+                retry.fail(product_url, error)
+                continue
+            retry.succeed(product_url)
+            writer.add(product_details)
+
+
+def fail_frontier_url(frontier, row, error, retry=None):
+    """Give a failed frontier URL back (after its backoff) or fail it for good"""
+    if retry is None:
+        logger.error("Failed to scrape %s: %s", row['url'], error)
+        frontier.fail(row['id'], error)
+        return
+
+    attempts = row['retries'] + 1
+    error_class, delay = retry.decide(error, attempts)
+    if delay is None or attempts >= frontier.max_retries:
+        frontier.fail(row['id'], error, permanent=True)
+        retry.give_up(row['url'], error_class, error, attempts)
+    else:
+        logger.info("Retrying %s in %.1fs after %s error: %s", row['url'], delay, error_class, error)
+        frontier.fail(row['id'], error, delay=delay)
+
+
+def drain_frontier(frontier, writer, pool, scraper=None, fetcher=None, claim_size=20, archive=None, retry=None,
+                   wait_for=None, poll_interval=5.0):
+    """
+    Claim frontier URLs batch by batch, scrape and store them until no work is left
+
+    With a retry scheduler, a failed URL becomes claimable again only after its
+    backoff, and is failed at once (and dead-lettered) when its error is permanent.
+    Without wait_for this returns as soon as nothing is claimable; with a list
+    of subcategory ids it polls every poll_interval seconds until none of their
+    URLs is pending or leased any more, i.e. until their retries are through.
+
+    The leases of a batch are renewed whenever half of the lease time passed
+    while it is being scraped, and given back (without counting a retry) when
+    the batch is interrupted by an exception or Ctrl-C.
+    """
+    while True:
+        claimed = frontier.claim(claim_size)
+        if not claimed:
+            if not wait_for or not frontier.outstanding(wait_for):
+                return
+            time.sleep(poll_interval)
+            continue
+
+        frontier_rows = {row['url']: row for row in claimed}
+        leased_ids = {row['id'] for row in claimed}
+        done_ids = []
+        renewed_at = time.monotonic()
+
+        try:
+            for product_url, product_details, error in scrape_all(list(frontier_rows), pool, scraper, fetcher, archive):
+                row = frontier_rows[product_url]
+                if error is not None:
+                    metrics.count_failure(error, 'scrape')
+                    fail_frontier_url(frontier, row, error, retry)
+                    leased_ids.discard(row['id'])
+                else:
+                    writer.add(product_details)
+                    done_ids.append(row['id'])
+
+                # Keep a slow batch's leases from running out under it
+                if time.monotonic() - renewed_at >= frontier.lease_seconds / 2:
+                    frontier.renew(sorted(leased_ids))
+                    renewed_at = time.monotonic()
+
+            # Only mark URLs done once their rows are actually in the database
+            writer.flush()
+            frontier.complete(done_ids)
+            leased_ids.clear()
+        finally:
+            if leased_ids:
+                _release_frontier_urls(frontier, leased_ids)
+
+
+def _release_frontier_urls(frontier, ids):
+    logger.warning("Giving %d frontier URLs back", len(ids))
+    try:
+        frontier.release(sorted(ids))
+    except Exception as e:
+        # Their leases expire on their own; keep the original error
+        logger.error("Failed to release frontier URLs: %s", e)
+
+
+def create_deduplicator(db, upsert=False):
+    """Seen index for a run; in upsert mode known products are refreshed, not skipped"""
+    if upsert:
+        # Only skip URLs repeated within this run
+        return ProductDeduplicator(db)
+    return ProductDeduplicator(db, **DEDUP_CONFIG).preload()
+
+
+def create_retry_scheduler(db, source):
+    """Retry scheduler dead-lettering into db, None when retries are disabled"""
+    if not RETRY_CONFIG['enabled']:
+        return None
+    return RetryScheduler(
+        RETRY_CONFIG['max_attempts'],
+        base_delay=RETRY_CONFIG['base_delay'],
+        max_delay=RETRY_CONFIG['max_delay'],
+        dead_letter=partial(db.insert_dead_letter, source=source)
+    )
+
+
+def create_price_history(db):
+    """Price history recorded by the product writer, None when disabled"""
+    if not PRICE_HISTORY_CONFIG['enabled']:
+        return None
+    return PriceHistory(db, cache_size=PRICE_HISTORY_CONFIG['cache_size'])
+
+
+def create_scraper(pool, rate_limiter=None):
+    """
+    Concurrent scraper for a run, entered as a context manager
+
+    Thread workers borrow browsers from the run's own driver pool, process
+    workers keep one driver each. With a single worker this is a no-op
+    context giving None, i.e. the sequential mode.
+    """
+    if SCRAPER_CONFIG['workers'] <= 1:
+        return nullcontext()
+    return ConcurrentScraper(
+        **SCRAPER_CONFIG,
+        pool_config={**DRIVER_POOL_CONFIG, 'rate_limiter': rate_limiter},
+        driver_pool=pool
+    )
@@ -0,0 +1,179 @@
+import argparse
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.extract import price_cents
+
+logger = logging.getLogger(__name__)
+
+# Availability strings are stored as a TINYINT code in price_history.availability_code.
+# Keep in sync with the backfill of migration 008_price_history.
+AVAILABILITY_CODES = {
+    '': 0,
+    'IN_STOCK': 1,
+    'OUT_OF_STOCK': 2,
+    'LIMITED_STOCK': 3,
+    'NOT_AVAILABLE': 4,
+    'RETIRED': 5,
+}
+OTHER_AVAILABILITY = 255
+AVAILABILITY_NAMES = {code: name for name, code in AVAILABILITY_CODES.items()}
+
+# (item_id, store_id) a history row is keyed by, and the values compared on every observation
+PriceKey = Tuple[int, int]
+PriceValues = Tuple[Optional[int], Optional[int], int]
+
+
+def availability_code(availability: Optional[str]) -> int:
+    """TINYINT code of an availability string like 'IN_STOCK' (OTHER_AVAILABILITY if unknown)"""
+    return AVAILABILITY_CODES.get((availability or '').strip().upper().replace(' ', '_'), OTHER_AVAILABILITY)
+
+
+def price_observation(product: Dict) -> Optional[tuple]:
+    """
+    History row of a product dict: (item_id, store_id, price_cents, mrp_cents, availability_code)
+
+    A product without a store is recorded for store 0. Returns None when the
+    item or store id is not numeric, since the history table keys on integers.
+    """
+    item_id = str(product.get('item_id') or '')
+    store_id = str(product.get('store_id') or 0)
+    if not item_id.isdigit() or not store_id.isdigit():
+        return None
+    return (
+        int(item_id),
+        int(store_id),
+        price_cents(product.get('price')),
+        price_cents(product.get('mrp')),
+        availability_code(product.get('availability')),
+    )
+
+
+def price_point(row: Dict) -> Dict:
+    """Decode a price_history row, with the discount computed from price and mrp"""
+    price, mrp = row['price_cents'], row['mrp_cents']
+    discount = mrp - price if price is not None and mrp is not None and mrp > price else 0
+    return {
+        "item_id": str(row['item_id']),
+        "store_id": str(row['store_id']),
+        "ts": row['ts'],
+        "price_cents": price,
+        "mrp_cents": mrp,
+        "discount_cents": discount,
+        "discount_percent": round(discount * 100 / mrp, 1) if discount else 0.0,
+        "availability": AVAILABILITY_NAMES.get(row['availability_code'], 'OTHER'),
+    }
+
+
+class PriceHistory:
+    def __init__(self, db, cache_size: int = 100000):
+        """
+        Change-only price history of products per store (table price_history)
+
+        Every scraped product is turned into a narrow observation (see
+        price_observation), but a row is written only when price, mrp or
+        availability differ from the item's latest stored row in that store.
+        Daily re-crawls of unchanged products therefore cost no storage.
+
+        Args:
+            db: Connected DatabaseManager
+            cache_size: Latest values kept in memory per (item_id, store_id), so
+                repeated observations need no lookup query. The cache assumes one
+                process writes the history of a given item and store; 0 disables it.
+        """
+        self.db = db
+        self.cache_size = cache_size
+
+        self._latest: 'OrderedDict[PriceKey, PriceValues]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.observed = 0
+        self.written = 0
+        self.lookups = 0
+
+    def record(self, observations: Iterable[Optional[tuple]]) -> int:
+        """
+        Write the observations that changed since the latest stored row
+
+        Args:
+            observations: Rows built by price_observation (None entries are skipped);
+                of several observations of one key only the last one counts
+
+        Returns:
+            Number of history rows written
+        """
+        batch: Dict[PriceKey, PriceValues] = {}
+        for observation in observations:
+            if observation is not None:
+                batch[observation[:2]] = observation[2:]
+        if not batch:
+            return 0
+
+        with self._lock:
+            known = {key: self._latest[key] for key in batch if key in self._latest}
+            missing = [key for key in batch if key not in known]
+            if missing:
+                self.lookups += 1
+                known.update(self.db.get_latest_price_values(missing))
+
+            changed = [key + values for key, values in batch.items() if known.get(key) != values]
+            self.db.insert_price_observations(changed)
+
+            for key, values in batch.items():
+                self._remember(key, values)
+            self.observed += len(batch)
+            self.written += len(changed)
+
+        return len(changed)
+
+    def _remember(self, key: PriceKey, values: PriceValues):
+        if not self.cache_size:
+            return
+        self._latest[key] = values
+        self._latest.move_to_end(key)
+        while len(self._latest) > self.cache_size:
+            self._latest.popitem(last=False)
+
+    def latest(self, item_id: str, store_id: Optional[str] = None) -> List[Dict]:
+        """Current price of an item, in one store or (store_id None) in every store"""
+        return [price_point(row) for row in self.db.get_price_points(item_id, store_id)]
+
+    def at(self, item_id: str, ts: datetime, store_id: Optional[str] = None) -> List[Dict]:
+        """Price an item had at time ts, in one store or (store_id None) in every store"""
+        return [price_point(row) for row in self.db.get_price_points(item_id, store_id, at=ts)]
+
+    def stats(self) -> Dict:
+        return {
+            "observed": self.observed,
+            "written": self.written,
+            "unchanged": self.observed - self.written,
+            "lookups": self.lookups,
+            "cached": len(self._latest),
+        }
+
+
+if __name__ == "__main__":
+    from core.config import DB_CONFIG, LOG_CONFIG
+    from core.database import DatabaseManager
+    from core.instrumentation import setup_logging
+
+    parser = argparse.ArgumentParser(description="Show the stored price of a product")
+    parser.add_argument("item_id")
+    parser.add_argument("--store", help="store id (default: every store)")
+    parser.add_argument("--at", type=datetime.fromisoformat,
+                        help="price at this time, e.g. 2024-05-01T12:00 (default: latest)")
+    args = parser.parse_args()
+
+    setup_logging(**LOG_CONFIG)
+    with DatabaseManager(DB_CONFIG) as db:
+        history = PriceHistory(db)
+        points = history.at(args.item_id, args.at, args.store) if args.at else history.latest(args.item_id, args.store)
+
+    for point in points:
+        print(f"store {point['store_id']:>6}  {point['ts']}  price {point['price_cents']}  mrp {point['mrp_cents']}  "
+              f"discount {point['discount_percent']}%  {point['availability']}")
+    if not points:
+        print(f"No price history for item {args.item_id}")
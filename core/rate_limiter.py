@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from core.instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Bucket:
+    """Token bucket state of one domain"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.successes = 0
+        self.blocks = 0
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, initial_rate: float = 1.0, min_rate: float = 0.05, max_rate: float = 5.0,
+                 increase: float = 0.05, decrease: float = 0.5, burst: float = 1.0, cooldown: float = 30.0):
+        """
+        Per-domain token bucket whose rate adapts to blocks (AIMD)
+
+        Every clean response raises the domain's rate by `increase` requests
+        per second, up to max_rate. A block (captcha, robot check, challenge
+        status) multiplies it by `decrease`, down to min_rate, empties the
+        bucket and pauses the domain for `cooldown` seconds. The crawl so
+        settles just below the rate at which blocks start.
+
+        Args:
+            initial_rate: Requests per second a domain starts with
+            min_rate: Lowest rate backoff goes down to
+            max_rate: Highest rate clean responses ramp up to
+            increase: Additive increase per clean response
+            decrease: Multiplicative decrease per block
+            burst: Tokens a bucket holds at most
+            cooldown: Seconds no request is sent to a domain after a block
+        """
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.cooldown = cooldown
+
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # A copy sent to a worker process starts with fresh buckets of its own
+        return self.__class__, (self.initial_rate, self.min_rate, self.max_rate, self.increase,
+                                self.decrease, self.burst, self.cooldown)
+
+    def _bucket(self, domain: str) -> _Bucket:
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            bucket = self._buckets[domain] = _Bucket(self.initial_rate, self.burst)
+        return bucket
+
+    def wait(self, url: str):
+        """Block until the domain of url has a token, then take it"""
+        domain = urlparse(url).netloc
+        while True:
+            with self._lock:
+                bucket = self._bucket(domain)
+                now = time.monotonic()
+                if now >= bucket.paused_until:
+                    bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * bucket.rate)
+                    bucket.updated_at = now
+                    if bucket.tokens >= 1:
+                        bucket.tokens -= 1
+                        return
+                    delay = (1 - bucket.tokens) / bucket.rate
+                else:
+                    delay = bucket.paused_until - now
+            time.sleep(delay)
+
+    def record_success(self, url: str):
+        """Additive increase after a clean response"""
+        with self._lock:
+            bucket = self._bucket(urlparse(url).netloc)
+            bucket.successes += 1
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+    def record_block(self, url: str, reason: Optional[str] = None):
+        """Multiplicative decrease and a cooldown pause after a blocked response"""
+        domain = urlparse(url).netloc
+        with self._lock:
+            bucket = self._bucket(domain)
+            bucket.blocks += 1
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+            bucket.tokens = 0
+            bucket.updated_at = time.monotonic()
+            bucket.paused_until = bucket.updated_at + self.cooldown
+            rate = bucket.rate
+
+        metrics.inc('rate_limit_backoffs_total', domain=domain)
+        logger.warning("Blocked, backing off", extra={"domain": domain, "reason": reason, "rate": round(rate, 3)})
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                domain: {
+                    "rate": round(bucket.rate, 3),
+                    "successes": bucket.successes,
+                    "blocks": bucket.blocks,
+                }
+                for domain, bucket in self._buckets.items()
+            }
@@ -0,0 +1,198 @@
+import logging
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+
+from core.database import REFRESH_COLUMNS
+from core.extract import fill_listing_data, listing_items, listing_max_page, price_value
+from core.price_history import price_observation
+
+logger = logging.getLogger(__name__)
+
+
+def listing_page_url(url: str, page: int) -> str:
+    """URL of page number `page` of a search / browse results page"""
+    parts = urlparse(url)
+    query = parse_qs(parts.query)
+    query['page'] = [str(page)]
+    return urlunparse(parts._replace(query=urlencode(query, doseq=True)))
+
+
+def rendered_for(store_id: Optional[str], product: Dict) -> bool:
+    """Whether a tile or product page shows the prices of store_id (any store does for None)"""
+    return store_id is None or product.get('store_id') is None or str(product['store_id']) == str(store_id)
+
+
+def tile_differs(stored: Dict, tile: Dict) -> bool:
+    """Whether a results page tile shows another price or availability than the stored row"""
+    if price_value(tile['price']) != price_value(stored['price']):
+        return True
+    return bool(tile['availability']) and tile['availability'] != stored['availability']
+
+
+def changed_columns(stored: Dict, product: Dict) -> Dict:
+    """Refreshable columns of a freshly scraped product that differ from the stored row"""
+    return {
+        column: product.get(column)
+        for column in REFRESH_COLUMNS
+        if product.get(column) != stored.get(column)
+    }
+
+
+class PriceRefresher:
+    def __init__(self, db, list_page: Callable[[str, Optional[str]], Dict],
+                 fetch_detail: Callable[[str, Optional[str]], Dict],
+                 max_listing_pages: int = 50, listing_page_budget: int = 200, price_history=None):
+        """
+        Keep prices of stored products fresh with as few page loads as possible
+
+        Products due for a refresh are looked up on listing pages first: a tile
+        showing the stored price and availability only marks the row as freshly
+        scraped. The product page is opened only when the tile differs (or the
+        product was not found on any listing page), and then only the columns
+        that actually changed are written. Products whose page fails are marked
+        with refresh_failed_at, so they do not come back in every batch.
+
+        Every (item_id, store_id) row is refreshed from pages rendered for its
+        own store: listing pages are walked once per store of the candidates,
+        and a tile or product page showing another store's prices (the store
+        context did not stick) is never written to the row; such a row is
+        marked as failed instead.
+
+        Args:
+            db: Connected DatabaseManager
+            list_page: Returns the __NEXT_DATA__ payload of a listing page URL as
+                rendered for a store: list_page(url, store_id), None for the default store
+            fetch_detail: Scrapes a product URL into a product dict as rendered
+                for a store: fetch_detail(url, store_id)
+            max_listing_pages: Pages walked per listing URL at most
+            listing_page_budget: Listing pages loaded per refresh() call at most
+            price_history: PriceHistory the changed prices are recorded in
+        """
+        self.db = db
+        self.list_page = list_page
+        self.fetch_detail = fetch_detail
+        self.max_listing_pages = max_listing_pages
+        self.listing_page_budget = listing_page_budget
+        self.price_history = price_history
+
+        self.listing_pages = 0
+        self.unchanged = 0
+        self.detail_pages = 0
+        self.updated = 0
+        self.failed = 0
+        self.store_mismatches = 0
+
+    def match_tiles(self, candidates: Dict[str, Dict], listing_urls: Iterable[str],
+                    store_id: Optional[str] = None, budget: Optional[int] = None) -> Dict[str, Dict]:
+        """
+        Walk listing pages of a store and return the tile of every candidate item id found
+
+        Stops as soon as every candidate was found or budget (default:
+        listing_page_budget) pages were loaded; the candidates not found by
+        then get their product page. Tiles of another store are ignored.
+        """
+        tiles = {}
+        if budget is None:
+            budget = self.listing_page_budget
+        for listing_url in listing_urls:
+            page, last_page = 1, 1
+            while page <= min(last_page, self.max_listing_pages):
+                if budget <= 0:
+                    logger.info("Listing page budget spent, %d of %d products not found on listing pages",
+                                len(candidates) - len(tiles), len(candidates))
+                    return tiles
+                budget -= 1
+
+                url = listing_url if page == 1 else listing_page_url(listing_url, page)
+                try:
+                    next_data = self.list_page(url, store_id)
+                except Exception as e:
+                    logger.error("Failed to list %s: %s", url, e)
+                    break
+                self.listing_pages += 1
+
+                if page == 1:
+                    last_page = listing_max_page(next_data)
+                for item in listing_items(next_data):
+                    tile = fill_listing_data(item)
+                    if tile['item_id'] in candidates and rendered_for(store_id, tile):
+                        tiles[tile['item_id']] = tile
+
+                if len(tiles) == len(candidates):
+                    return tiles
+                page += 1
+
+        return tiles
+
+    def refresh(self, candidates: List[Dict], listing_urls: Iterable[str]) -> Dict:
+        """Refresh the given candidate rows (as returned by get_refresh_candidates)"""
+        listing_urls = list(listing_urls)
+        # (item_id, store_id) is unique, so every store holds one row per item id
+        by_store: Dict[Optional[str], Dict[str, Dict]] = {}
+        for row in candidates:
+            by_store.setdefault(row['store_id'], {})[row['item_id']] = row
+
+        unchanged_ids, updates, changed_rows, failed_ids = [], [], [], []
+        listing_pages = self.listing_pages
+        for store_id, rows in by_store.items():
+            budget = self.listing_page_budget - (self.listing_pages - listing_pages)
+            tiles = self.match_tiles(rows, listing_urls, store_id, budget) if budget > 0 else {}
+
+            for item_id, row in rows.items():
+                tile = tiles.get(item_id)
+                if tile is not None and not tile_differs(row, tile):
+                    unchanged_ids.append(row['id'])
+                    continue
+
+                product = self._fetch(row['url'] or (tile and tile['url']), store_id)
+                if product is None:
+                    failed_ids.append(row['id'])
+                    continue
+                if not rendered_for(store_id, product):
+                    logger.warning("Page rendered for another store, not refreshing the row", extra={
+                        "url": row['url'], "store_id": store_id, "rendered_store_id": product['store_id']
+                    })
+                    self.store_mismatches += 1
+                    failed_ids.append(row['id'])
+                    continue
+
+                changes = changed_columns(row, product)
+                if changes:
+                    updates.append((row['id'], changes))
+                    changed_rows.append((row, changes))
+                else:
+                    unchanged_ids.append(row['id'])
+
+        self.db.touch_products(unchanged_ids)
+        self.db.update_product_columns(updates)
+        self.db.mark_refresh_failed(failed_ids)
+        if self.price_history is not None:
+            self.price_history.record(
+                price_observation({**row, **changes}) for row, changes in changed_rows
+            )
+        self.unchanged += len(unchanged_ids)
+        self.updated += len(updates)
+
+        return self.stats()
+
+    def _fetch(self, url: Optional[str], store_id: Optional[str]) -> Optional[Dict]:
+        if not url:
+            self.failed += 1
+            return None
+        try:
+            self.detail_pages += 1
+            return self.fetch_detail(url, store_id)
+        except Exception as e:
+            logger.error("Failed to refresh %s: %s", url, e)
+            self.failed += 1
+            return None
+
+    def stats(self) -> Dict:
+        return {
+            "listing_pages": self.listing_pages,
+            "detail_pages": self.detail_pages,
+            "unchanged": self.unchanged,
+            "updated": self.updated,
+            "failed": self.failed,
+            "store_mismatches": self.store_mismatches,
+        }
@@ -0,0 +1,202 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+# URL class -> TTL in seconds used when none is configured; 0 means never cached
+DEFAULT_TTLS = {
+    'category': 3 * 24 * 3600,
+    'search': 6 * 3600,
+    'product': 0,
+    'other': 0,
+}
+
+
+def classify_url(url: str) -> str:
+    """Class of a Walmart URL, which decides how long its response stays fresh"""
+    path = urlparse(url).path
+    if path.startswith('/ip/'):
+        return 'product'
+    if path.startswith('/search'):
+        return 'search'
+    if path.startswith(('/cp/', '/browse/')):
+        return 'category'
+    return 'other'
+
+
+class ResponseCache:
+    def __init__(self, directory: str, ttls: Optional[Dict[str, int]] = None,
+                 max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Disk-backed cache of page responses keyed by URL
+
+        Entries live in a SQLite file inside directory, compressed with zlib.
+        An entry is fresh for the TTL of its URL class (see classify_url); a
+        stale entry keeps its ETag / Last-Modified so the page can be revalidated
+        with a conditional request. Once the cache grows past max_bytes, least
+        recently used entries are evicted.
+
+        Args:
+            directory: Where the cache file is kept
+            ttls: TTL in seconds per URL class, merged over DEFAULT_TTLS
+            max_bytes: Size (of compressed bodies) the cache is trimmed to
+        """
+        self.directory = directory
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stored = 0
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Shared by the threads of this process; SQLite serializes other processes
+        self._conn = sqlite3.connect(os.path.join(directory, 'responses.db'), timeout=30,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                url_class TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)")
+
+    def __reduce__(self):
+        # A copy sent to a worker process opens its own connection to the same file
+        return self.__class__, (self.directory, self.ttls, self.max_bytes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def ttl(self, url: str) -> int:
+        return self.ttls.get(classify_url(url), 0)
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """
+        Cached entry of a URL, fresh or stale, or None when nothing is stored
+
+        The entry dict has body, etag, last_modified, stored_at and fresh. Only
+        a fresh entry counts as a hit.
+        """
+        ttl = self.ttl(url)
+        if ttl <= 0:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            body, etag, last_modified, stored_at = row
+            fresh = time.time() - stored_at < ttl
+            if fresh:
+                self.hits += 1
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            else:
+                self.misses += 1
+
+        return {
+            "body": zlib.decompress(body),
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": stored_at,
+            "fresh": fresh,
+        }
+
+    def get(self, url: str) -> Optional[bytes]:
+        """Body of a fresh cached response, None if there is none"""
+        entry = self.lookup(url)
+        if entry is None or not entry['fresh']:
+            return None
+        return entry['body']
+
+    def put(self, url: str, body: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Store a response body; URLs of a class with TTL 0 are not stored"""
+        if self.ttl(url) <= 0:
+            return
+
+        compressed = zlib.compress(body, 1)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO responses
+                    (url, url_class, body, etag, last_modified, stored_at, accessed_at, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (url, classify_url(url), compressed, etag, last_modified, now, now, len(compressed)))
+            self.stored += 1
+            self._evict()
+
+    def refresh(self, url: str):
+        """Mark a stale entry fresh again after the server answered 304 Not Modified"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+            self.revalidated += 1
+
+    def get_json(self, url: str, name: str) -> Any:
+        """Fresh value stored for a URL with put_json, None if there is none"""
+        body = self.get(f"{url}#{name}")
+        return json.loads(body) if body is not None else None
+
+    def put_json(self, url: str, name: str, value: Any):
+        """
+        Store a named value extracted from a page instead of the page itself
+
+        Used for pages loaded in a browser, whose DOM cannot be rebuilt from a
+        cached response. The value shares the TTL of the page's URL class.
+        """
+        self.put(f"{url}#{name}", json.dumps(value).encode('utf-8'))
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Drop least recently used entries until the cache fits again
+        rows = self._conn.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+        evict = []
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            evict.append((url,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE url = ?", evict)
+        self.evicted += len(evict)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "revalidated": self.revalidated,
+            "stored": self.stored,
+            "evicted": self.evicted,
+            "entries": entries,
+            "size_bytes": size,
+        }
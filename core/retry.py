@@ -0,0 +1,191 @@
+import heapq
+import itertools
+import logging
+import random
+import socket
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+from mysql.connector import Error as DatabaseError
+from mysql.connector.errors import DataError, IntegrityError
+from requests.exceptions import ConnectionError as RequestsConnectionError, HTTPError, Timeout as RequestsTimeout
+from selenium.common.exceptions import TimeoutException
+
+from core.block_detection import BlockedError
+from core.instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+# Attempts (including the first) an item gets per error class before it is
+# dead-lettered; a page that does not parse will not parse on the next try
+# either, a page that is gone stays gone and a row the database refuses stays refused
+DEFAULT_MAX_ATTEMPTS = {
+    'timeout': 4,
+    'block': 5,
+    'db': 3,
+    'parse': 1,
+    'permanent': 1,
+    'unknown': 3,
+}
+
+# HTTP statuses of pages that no longer exist
+GONE_STATUS_CODES = (404, 410)
+
+
+def classify_error(error: BaseException) -> str:
+    """Error class deciding whether and how often a failed item is retried"""
+    if isinstance(error, BlockedError):
+        return 'block'
+    # A row breaking a constraint or not fitting its column fails the same way every time
+    if isinstance(error, (IntegrityError, DataError)):
+        return 'permanent'
+    if isinstance(error, DatabaseError):
+        return 'db'
+    if isinstance(error, HTTPError) and error.response is not None:
+        if error.response.status_code in GONE_STATUS_CODES:
+            return 'permanent'
+        # Server side trouble passes like a timeout does
+        if error.response.status_code >= 500:
+            return 'timeout'
+    if isinstance(error, (TimeoutError, socket.timeout, TimeoutException, RequestsTimeout,
+                          RequestsConnectionError, ConnectionError)):
+        return 'timeout'
+    # NextDataNotFound and JSON decoding errors are ValueErrors
+    if isinstance(error, (ValueError, KeyError, TypeError, IndexError)):
+        return 'parse'
+    return 'unknown'
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with jitter: between half and all of base * 2^(attempt - 1), capped"""
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class RetryScheduler:
+    def __init__(self, max_attempts: Optional[Dict[str, int]] = None, base_delay: float = 5.0,
+                 max_delay: float = 300.0, dead_letter: Optional[Callable] = None):
+        """
+        Priority queue of work items that requeues failed ones with backoff
+
+        Items are handed out by due time, then priority: fresh items are due at
+        once, a failed item is due again after an exponential backoff with
+        jitter. An item that failed max_attempts times for its error class
+        (see classify_error) is dropped and passed to dead_letter.
+
+        Args:
+            max_attempts: Attempts per error class, merged over DEFAULT_MAX_ATTEMPTS
+            base_delay: Seconds before the first retry
+            max_delay: Longest backoff between two attempts
+            dead_letter: Called as dead_letter(item, error_class, error, attempts)
+        """
+        self.max_attempts = {**DEFAULT_MAX_ATTEMPTS, **(max_attempts or {})}
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.dead_letter = dead_letter
+
+        self._queue: List[tuple] = []
+        self._sequence = itertools.count()
+        self._attempts: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+        self.retried = 0
+        self.dead_lettered = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def add(self, items: Iterable[Hashable], priority: int = 0):
+        """Queue fresh items, due at once; higher priority goes first"""
+        with self._lock:
+            for item in items:
+                heapq.heappush(self._queue, (0.0, -priority, next(self._sequence), item))
+
+    def next_batch(self, limit: Optional[int] = None, wait: bool = False) -> List[Hashable]:
+        """
+        Up to limit (default: all) items that are due now, without waiting
+
+        Items still in their backoff stay queued, so callers can go on with
+        other work and pick them up with a later call. With wait (e.g. to
+        drain the queue at shutdown), sleep until the earliest backoff passed
+        when nothing is due yet; the batch is then empty only when the queue is.
+        """
+        if wait:
+            with self._lock:
+                if not self._queue:
+                    return []
+                delay = self._queue[0][0] - time.monotonic()
+            if delay > 0:
+                logger.debug("Waiting %.1fs for the next retry", delay)
+                time.sleep(delay)
+
+        batch = []
+        with self._lock:
+            now = time.monotonic()
+            while self._queue and (limit is None or len(batch) < limit) and self._queue[0][0] <= now:
+                batch.append(heapq.heappop(self._queue)[3])
+        return batch
+
+    def decide(self, error: BaseException, attempts: int) -> tuple:
+        """
+        (error class, backoff delay) after the attempts-th failed attempt; the
+        delay is None when the item should not be retried any more
+        """
+        error_class = classify_error(error)
+        metrics.inc('retry_failures_total', error_class=error_class)
+        if attempts >= self.max_attempts.get(error_class, 1):
+            return error_class, None
+        return error_class, backoff_delay(attempts, self.base_delay, self.max_delay)
+
+    def fail(self, item: Hashable, error: BaseException, priority: int = 0) -> str:
+        """
+        Record a failed attempt: requeue the item with backoff, or dead-letter it
+
+        Returns:
+            The error class of error
+        """
+        with self._lock:
+            attempts = self._attempts[item] = self._attempts.get(item, 0) + 1
+        error_class, delay = self.decide(error, attempts)
+
+        if delay is None:
+            with self._lock:
+                self._attempts.pop(item, None)
+            self.give_up(item, error_class, error, attempts)
+            return error_class
+
+        with self._lock:
+            heapq.heappush(self._queue, (time.monotonic() + delay, -priority, next(self._sequence), item))
+            self.retried += 1
+        logger.info("Retrying %s in %.1fs after %s error: %s", item, delay, error_class, error)
+        return error_class
+
+    def give_up(self, item: Hashable, error_class: str, error: BaseException, attempts: int):
+        """Count an item as failed for good and hand it to dead_letter"""
+        with self._lock:
+            self.dead_lettered += 1
+        metrics.inc('dead_letters_total', error_class=error_class)
+        logger.error("Giving up on %s after %d attempts (%s): %s", item, attempts, error_class, error)
+        if self.dead_letter is not None:
+            try:
+                self.dead_letter(item, error_class, error, attempts)
+            except Exception as e:
+                logger.error("Failed to dead-letter %s: %s", item, e)
+
+    def retrying(self, item: Hashable) -> bool:
+        """Whether a failed item is still queued for (or handed out for) another attempt"""
+        with self._lock:
+            return item in self._attempts
+
+    def succeed(self, item: Hashable):
+        """Forget the attempts of an item that finally went through"""
+        with self._lock:
+            self._attempts.pop(item, None)
+
+    def stats(self) -> Dict:
+        return {
+            "queued": len(self._queue),
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+        }
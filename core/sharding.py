@@ -0,0 +1,161 @@
+import logging
+import threading
+from typing import Dict, List
+
+from mysql.connector import Error
+
+from core.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+class SubcategoryShards:
+    def __init__(self, db, worker_id: str, shard_size: int = 5,
+                 lease_seconds: int = 900, max_attempts: int = 3):
+        """
+        Hand out pending subcategories to crawler workers in leased shards
+
+        The subcategories table itself acts as the coordinator: a worker claims
+        a shard with SELECT ... FOR UPDATE SKIP LOCKED, keeps its lease alive
+        with heartbeats and gives the shard back when it fails. Shards of a
+        worker that stopped heartbeating become claimable once the lease expires.
+
+        Args:
+            db: Connected DatabaseManager
+            worker_id: Lease owner name of this worker
+            shard_size: Subcategories claimed at once
+            lease_seconds: Lease length, renewed by every heartbeat
+            max_attempts: Claims after which a subcategory is no longer handed out
+        """
+        self.db = db
+        self.worker_id = worker_id
+        self.shard_size = shard_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def claim(self) -> List[Dict]:
+        """Lease the next shard of pending subcategories to this worker"""
+        try:
+            self.db.cursor.execute("""
+                SELECT id, category_name, category_url, subcategory_name, subcategory_url
+                FROM subcategories
+                WHERE (status IS NULL OR status != 'done')
+                    AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+                    AND attempts < %s
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (self.max_attempts, self.shard_size))
+            shard = self.db.cursor.fetchall()
+
+            if shard:
+                ids = [subcat['id'] for subcat in shard]
+                self.db.cursor.execute(f"""
+                    UPDATE subcategories
+                    SET lease_owner = %s,
+                        lease_expires_at = NOW() + INTERVAL %s SECOND,
+                        heartbeat_at = NOW(),
+                        attempts = attempts + 1
+                    WHERE id IN ({', '.join(['%s'] * len(ids))})
+                """, (self.worker_id, self.lease_seconds, *ids))
+
+            self.db.connection.commit()
+            return shard
+        except Error as e:
+            self.db.connection.rollback()
+            logger.error("Shard claim failed: %s", e)
+            raise
+
+    def complete(self, subcategory_id: int):
+        """Mark a subcategory of the shard done and drop its lease"""
+        self.db.execute_query("""
+            UPDATE subcategories
+            SET status = 'done', lease_owner = NULL, lease_expires_at = NULL
+            WHERE id = %s AND lease_owner = %s
+        """, (subcategory_id, self.worker_id))
+
+    def renew(self, subcategory_ids: List[int]):
+        """Extend the lease of the unfinished subcategories this worker still holds"""
+        if not subcategory_ids:
+            return
+        # Same notion of unfinished as claim(): a NULL status is not done either
+        self.db.execute_query(f"""
+            UPDATE subcategories
+            SET lease_expires_at = NOW() + INTERVAL %s SECOND, heartbeat_at = NOW()
+            WHERE id IN ({', '.join(['%s'] * len(subcategory_ids))})
+                AND lease_owner = %s AND (status IS NULL OR status != 'done')
+        """, (self.lease_seconds, *subcategory_ids, self.worker_id))
+
+    def release(self, subcategory_ids: List[int]):
+        """Give unfinished subcategories back so another worker can claim them"""
+        if not subcategory_ids:
+            return
+        self.db.execute_query(f"""
+            UPDATE subcategories
+            SET lease_owner = NULL, lease_expires_at = NULL
+            WHERE id IN ({', '.join(['%s'] * len(subcategory_ids))}) AND lease_owner = %s
+        """, (*subcategory_ids, self.worker_id))
+
+
+class Heartbeat(threading.Thread):
+    def __init__(self, db_config: Dict, worker_id: str, subcategory_ids: List[int],
+                 lease_seconds: int = 900, interval: float = 60):
+        """
+        Background thread renewing the lease of a shard while it is being crawled
+
+        It works on its own database connection, since the worker's connection
+        is busy with (and not safe to share during) the crawl itself.
+        """
+        super().__init__(daemon=True)
+        self.db_config = db_config
+        self.worker_id = worker_id
+        self.subcategory_ids = list(subcategory_ids)
+        self.lease_seconds = lease_seconds
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        with DatabaseManager(self.db_config) as db:
+            shards = SubcategoryShards(db, self.worker_id, lease_seconds=self.lease_seconds)
+            while not self._stopped.wait(self.interval):
+                try:
+                    shards.renew(self.subcategory_ids)
+                except Error as e:
+                    logger.warning("Heartbeat of %s failed: %s", self.worker_id, e)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def shard_progress(db, max_attempts: int = 3) -> Dict:
+    """
+    Subcategory counts per state and the active leases per worker
+
+    A subcategory that is not leased and used up max_attempts claims is
+    'failed': SubcategoryShards.claim no longer hands it out.
+    """
+    db.cursor.execute("""
+        SELECT
+            CASE
+                WHEN status = 'done' THEN 'done'
+                WHEN lease_expires_at > NOW() THEN 'leased'
+                WHEN attempts >= %s THEN 'failed'
+                ELSE 'pending'
+            END AS state,
+            COUNT(*) AS total
+        FROM subcategories
+        GROUP BY state
+    """, (max_attempts,))
+    states = {row['state']: row['total'] for row in db.cursor.fetchall()}
+
+    db.cursor.execute("""
+        SELECT lease_owner, COUNT(*) AS subcategories, MAX(heartbeat_at) AS last_heartbeat
+        FROM subcategories
+        WHERE lease_expires_at > NOW() AND (status IS NULL OR status != 'done')
+        GROUP BY lease_owner
+        ORDER BY lease_owner
+    """)
+    workers = db.cursor.fetchall()
+
+    return {"states": states, "workers": workers}
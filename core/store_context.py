@@ -0,0 +1,183 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Union
+
+from core.extract import fill_product_data, fill_store_data
+from core.http_fetcher import BotChallengeError
+from core.instrumentation import metrics
+from core.next_data import extract_product
+
+logger = logging.getLogger(__name__)
+
+
+def parse_stores(spec: str) -> List[Dict]:
+    """
+    Store contexts out of a comma-separated list of store_id[:zip_code]
+
+    e.g. "3081:72712,5260" -> [{store_id: '3081', zip_code: '72712'}, {store_id: '5260', zip_code: None}]
+    """
+    stores = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        store_id, _, zip_code = entry.partition(':')
+        stores.append({"store_id": store_id.strip(), "zip_code": zip_code.strip() or None})
+    return stores
+
+
+def store_cookies(store: Dict) -> Dict[str, str]:
+    """Cookies making walmart.com render prices and availability of one store"""
+    cookies = {
+        "assortmentStoreId": store['store_id'],
+        "hasLocData": "1",
+    }
+    if store.get('zip_code'):
+        cookies["locGuestData"] = f"intent:PICKUP:storeId:{store['store_id']}:zip:{store['zip_code']}"
+    return cookies
+
+
+class StorePriceMatrix:
+    def __init__(self, stores: List[Dict], fetch_page: Callable[[Dict, str], Union[str, bytes]],
+                 write: Callable[[Dict], None], concurrency: int = 4):
+        """
+        Crawl a list of product pages once per store context
+
+        Every store is crawled by its own worker thread with its own warm
+        session (see fetch_page), so the store is set once per session instead
+        of once per page. The static fields of a product (name, UPC,
+        categories, image, ...) are filled from the first store's page only;
+        pages of the other stores only get their store, price and availability
+        filled and reuse the rest.
+
+        Args:
+            stores: Store contexts as returned by parse_stores
+            fetch_page: Returns the raw page of a URL as seen from a store
+                context: fetch_page(store, url)
+            write: Stores one (item_id, store_id) product row, e.g. a
+                BufferedProductWriter's add, which writes rows in bulk
+            concurrency: Stores crawled at the same time
+        """
+        self.stores = stores
+        self.fetch_page = fetch_page
+        self.write = write
+        self.concurrency = concurrency
+
+        self._static: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        self.rows_written = 0
+        self.full_extractions = 0
+        self.store_mismatches = 0
+        self.failed = 0
+
+    def product_row(self, store: Dict, url: str, page: Union[str, bytes]) -> Dict:
+        """Product row of one store, extracting the static fields only once per URL"""
+        with metrics.span('parse'):
+            product = extract_product(page)
+
+        with self._lock:
+            static = self._static.get(url)
+
+        with metrics.span('extract'):
+            if static is None:
+                product_data = fill_product_data(product)
+                product_data['url'] = url
+                with self._lock:
+                    self._static[url] = product_data
+                    self.full_extractions += 1
+            else:
+                product_data = {**static, **fill_store_data(product)}
+
+        if product_data['store_id'] is None:
+            product_data['store_id'] = store['store_id']
+        elif str(product_data['store_id']) != store['store_id']:
+            # The store context did not stick; keep the store the price belongs to
+            with self._lock:
+                self.store_mismatches += 1
+            logger.warning("Page rendered for another store", extra={
+                "url": url, "store_id": store['store_id'], "rendered_store_id": product_data['store_id']
+            })
+
+        return product_data
+
+    def crawl_store(self, store: Dict, product_urls: List[str]):
+        """Scrape every product URL from one store context and write its rows"""
+        logger.info("Crawling %d products for store %s", len(product_urls), store['store_id'])
+        for url in product_urls:
+            try:
+                product_data = self.product_row(store, url, self.fetch_page(store, url))
+            except Exception as e:
+                logger.error("Failed to scrape %s for store %s: %s", url, store['store_id'], e)
+                metrics.count_failure(e, 'scrape')
+                with self._lock:
+                    self.failed += 1
+                continue
+
+            self.write(product_data)
+            with self._lock:
+                self.rows_written += 1
+
+    def run(self, product_urls: List[str]) -> Dict:
+        """Crawl product_urls for every store, concurrency stores at a time"""
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='store') as executor:
+            futures = [executor.submit(self.crawl_store, store, product_urls) for store in self.stores]
+            for future in futures:
+                future.result()
+        return self.stats()
+
+    def stats(self) -> Dict:
+        return {
+            "stores": len(self.stores),
+            "rows_written": self.rows_written,
+            "full_extractions": self.full_extractions,
+            "store_mismatches": self.store_mismatches,
+            "failed": self.failed,
+        }
+
+
+class StoreSessions:
+    def __init__(self, create_fetcher: Callable[[Dict], object], pool=None):
+        """
+        One warm HttpFetcher per store context, created on first use
+
+        Args:
+            create_fetcher: Returns an HttpFetcher sending a store's cookies
+            pool: Optional DriverPool; when a store's HTTP session hits a bot
+                challenge, the page is loaded in a browser switched to that store
+        """
+        self.create_fetcher = create_fetcher
+        self.pool = pool
+        self._fetchers: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def fetcher(self, store: Dict):
+        with self._lock:
+            fetcher = self._fetchers.get(store['store_id'])
+            if fetcher is None:
+                fetcher = self._fetchers[store['store_id']] = self.create_fetcher(store)
+        return fetcher
+
+    def fetch_page(self, store: Dict, url: str) -> Union[str, bytes]:
+        """Raw product page as seen from a store context"""
+        try:
+            return self.fetcher(store).get_page(url)
+        except BotChallengeError as e:
+            if self.pool is None:
+                raise
+            logger.warning("%s, falling back to browser", e)
+
+        with self.pool.driver() as pooled:
+            pooled.set_cookies(store_cookies(store))
+            return pooled.get(url)
+
+    def close(self):
+        with self._lock:
+            for fetcher in self._fetchers.values():
+                fetcher.close()
+            self._fetchers = {}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {store_id: fetcher.stats() for store_id, fetcher in self._fetchers.items()}
@@ -0,0 +1,165 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+from core.driver_pool import DriverPool
+
+logger = logging.getLogger(__name__)
+
+
+class DomainRateLimiter:
+    def __init__(self, requests_per_second: float = 1.0):
+        """
+        Space out requests to the same domain
+
+        Args:
+            requests_per_second: Maximum request rate allowed per domain
+        """
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        """Block until a request to the domain of url is allowed"""
+        if not self.interval:
+            return
+
+        domain = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(domain, now))
+            self._next_slot[domain] = slot + self.interval
+
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Driver pool owned by a worker process when running in process mode
+_worker_driver_pool: Optional[DriverPool] = None
+
+
+def _init_worker_process(pool_config: Optional[Dict]):
+    global _worker_driver_pool
+    if pool_config:
+        _worker_driver_pool = DriverPool(**{**pool_config, 'size': 1})
+        _worker_driver_pool.start()
+        atexit.register(_worker_driver_pool.close)
+
+
+def _call_in_worker_process(func: Callable, url: str):
+    if _worker_driver_pool is not None:
+        return func(url, pool=_worker_driver_pool)
+    return func(url)
+
+
+class ConcurrentScraper:
+    def __init__(
+        self,
+        workers: int = 4,
+        mode: str = 'thread',
+        max_in_flight: Optional[int] = None,
+        domain_rate: float = 1.0,
+        pool_config: Optional[Dict] = None,
+        driver_pool: Optional[DriverPool] = None
+    ):
+        """
+        Run a scrape function over many URLs with bounded parallelism
+
+        Args:
+            workers: Number of worker threads / processes
+            mode: 'thread' or 'process'
+            max_in_flight: Global cap on submitted but not yet consumed URLs
+                (defaults to twice the number of workers)
+            domain_rate: Maximum requests per second sent to a single domain
+            pool_config: DriverPool settings; in thread mode one pool of `workers`
+                drivers is shared, in process mode each process keeps one driver
+            driver_pool: Started DriverPool the threads borrow drivers from in
+                thread mode instead of launching their own; it is left open on close()
+        """
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown worker mode: {mode}")
+
+        self.workers = workers
+        self.mode = mode
+        self.max_in_flight = max_in_flight or workers * 2
+        self.rate_limiter = DomainRateLimiter(domain_rate)
+        self.pool_config = pool_config
+        self.executor = None
+        self.driver_pool: Optional[DriverPool] = driver_pool
+        self._owns_pool = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        """Start the worker executor (and the shared driver pool in thread mode)"""
+        if self.mode == 'thread':
+            if self.driver_pool is None and self.pool_config:
+                self.driver_pool = DriverPool(**{**self.pool_config, 'size': self.workers})
+                self.driver_pool.start()
+                self._owns_pool = True
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        else:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker_process,
+                initargs=(self.pool_config,)
+            )
+
+    def close(self):
+        """Shut the workers down and quit their drivers"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if self._owns_pool:
+            logger.info("Driver pool stats: %s", self.driver_pool.stats())
+            self.driver_pool.close()
+            self.driver_pool = None
+            self._owns_pool = False
+
+    def map(self, func: Callable, urls: Iterable[str]) -> Iterator[Tuple[str, Optional[Dict], Optional[Exception]]]:
+        """
+        Scrape urls concurrently and yield (url, result, error) in input order
+
+        Results are handed back in the order the URLs were given, so a single
+        consumer (e.g. the DB writer) can process them sequentially.
+        """
+        if self.executor is None:
+            raise RuntimeError("ConcurrentScraper must be started before calling map()")
+
+        in_flight = deque()
+
+        for url in urls:
+            # Hand finished results over before going past the in-flight cap
+            while len(in_flight) >= self.max_in_flight:
+                yield self._collect(*in_flight.popleft())
+
+            self.rate_limiter.wait(url)
+            in_flight.append((url, self._submit(func, url)))
+
+        while in_flight:
+            yield self._collect(*in_flight.popleft())
+
+    def _submit(self, func, url):
+        if self.mode == 'process':
+            return self.executor.submit(_call_in_worker_process, func, url)
+        if self.driver_pool is not None:
+            return self.executor.submit(func, url, pool=self.driver_pool)
+        return self.executor.submit(func, url)
+
+    @staticmethod
+    def _collect(url, future):
+        try:
+            return url, future.result(), None
+        except Exception as e:
+            return url, None, e
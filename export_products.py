@@ -0,0 +1,30 @@
+import argparse
+import logging
+
+from core.config import DB_CONFIG, EXPORT_CONFIG, LOG_CONFIG
+from core.database import DatabaseManager
+from core.export import ParquetExporter
+from core.instrumentation import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export scraped products to partitioned Parquet files")
+    parser.add_argument("--output", default=EXPORT_CONFIG['directory'], help="dataset directory (default: EXPORT_DIR)")
+    parser.add_argument("--full", action="store_true",
+                        help="export every product, ignoring the high-water mark (use an empty --output)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CONFIG['chunk_size'], help="rows per record batch")
+    args = parser.parse_args()
+
+    setup_logging(**LOG_CONFIG)
+
+    with DatabaseManager(DB_CONFIG) as db:
+        exporter = ParquetExporter(
+            db,
+            args.output,
+            chunk_size=args.chunk_size,
+            max_rows_per_file=EXPORT_CONFIG['max_rows_per_file'],
+            compression=EXPORT_CONFIG['compression']
+        )
+        logger.info("Export stats: %s", exporter.export(full=args.full))
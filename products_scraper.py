@@ -2,114 +2,23 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from core.database import DatabaseManager
-from core.config import DB_CONFIG
+from core.config import DB_CONFIG, DB_POOL_CONFIG, DB_WRITER_CONFIG, FRONTIER_CONFIG, DRIVER_POOL_CONFIG, HTTP_FETCHER_CONFIG, ARCHIVE_CONFIG, RESPONSE_CACHE_CONFIG, LOG_CONFIG, METRICS_CONFIG, RATE_LIMIT_CONFIG
 from core.driver_setup import get_driver
-from bs4 import BeautifulSoup
-import json
-import re
-
-
-def extract_size(title):
-    # Patterns to match common size formats (oz, fl oz, lb, etc.)
-    patterns = [
-        r'(\d+\.?\d*)\s*(?:fl\s*)?oz',  # matches "6 oz", "15.8 oz", "17 fl oz"
-        r'(\d+)\s*lb',                   # matches "2 lb"
-        r'(\d+)\s*g',                    # matches "500 g"
-        r'(\d+)\s*ml',                   # matches "250 ml"
-        r'(\d+)\s*l',                    # matches "1 l"
-        r'Pack of (\d+)',                # matches "Pack of 4"
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, title, re.IGNORECASE)
-        if match:
-            return match.group(0)
-    
-    return ''
-
-def fill_product_data(pd: dict) -> dict:
-    """Fill product_data dictionary with information from pageContext"""
-    product_data = {
-        "item_id": None,
-        "upc": None,
-        "product_id": None,
-        "url": "",
-        "name": "",
-        "categories": [],
-        "image": "",
-        "store_id": None,
-        "store_location": "",
-        "price": None,
-        "mrp": None,
-        "discount": None,
-        "availability": "",
-        "keyword": "",
-        "size": ""
-    }
-    
-    # Fill in the fields
-    product_data["item_id"] = pd['usItemId']
-    product_data["upc"] = pd["upc"]
-    product_data["product_id"] = pd["id"]
-    product_data["name"] = pd["name"]    
-
-    for category in pd['category']['path']:
-        product_data["categories"].append(category['name'].strip())
-    
-    product_data['image'] = pd['imageInfo']['thumbnailUrl']
-    product_data['store_id'] = pd['location']['storeIds'][0]
-    product_data['store_location'] = pd['location']['city']
-    product_data['price'] = pd['priceInfo']['currentPrice']['priceString']
-    try:
-        product_data['mrp'] = pd['priceInfo']['wasPrice']['priceString']
-    except:
-        product_data['mrp'] = pd['priceInfo']['currentPrice']['priceString']
-
-    product_data['availability'] = pd['shippingOption']['availabilityStatus']
-    # Extract name from size since there isn't any specific field for size
-    product_data['size'] = extract_size(pd['name'])
-    
-    return product_data
-
-def scrape_product_details(product_url):
-    try:
-        driver = get_driver(headless=True)
-        print("Opening: ", product_url)
-        driver.get(product_url)
-
-        page_source = driver.page_source
-
-        soup = BeautifulSoup(page_source, 'html.parser')
+from core.driver_pool import DriverPool
+from core.frontier import Frontier
+from core.http_fetcher import HttpFetcher
+from core.archive import PageArchiveWriter
+from core.response_cache import ResponseCache
+from core.rate_limiter import AdaptiveRateLimiter
+from core.pipeline import create_deduplicator, create_price_history, create_retry_scheduler, create_scraper, drain_frontier, drain_retries, scrape_and_store
+from core.instrumentation import start_instrumentation
+import logging
 
-        next_data_script = json.loads(soup.find('script', {'id': '__NEXT_DATA__'}).text)
+logger = logging.getLogger(__name__)
 
-        product_source_data = next_data_script['props']['pageProps']['initialData']['data']['product']
-
-        product_data = fill_product_data(product_source_data)
-        product_data['url'] = product_url
-
-        print(product_data)
-
-        driver.close()
-        del driver
-
-        return product_data
-    except Exception as e:
-        print("Error occured while scraping product details")
-        print(e)
-
-        driver.close()
-        del driver
-
-        raise e
-
-
-def scrape_products(subcategory):
-    """Scrapes subcategory for each given category page URL."""
-    driver = get_driver(headless=True)
-    print("Opening: ", subcategory['subcategory_url'])
-    driver.get(subcategory['subcategory_url'])
 
+def collect_product_links(driver):
+    """Collect product names and URLs from the item stack of a listing page"""
     wait = WebDriverWait(driver, 10)
 
     # Get all the products anchor tags
@@ -117,7 +26,7 @@ def scrape_products(subcategory):
         EC.visibility_of_element_located((By.CSS_SELECTOR, "[data-testid='item-stack']"))
     ).find_elements(By.TAG_NAME, "a")
 
-    print("Total products found: ", len(product_elements))
+    logger.info("Total products found: %d", len(product_elements))
 
     products = []
 
@@ -126,6 +35,23 @@ def scrape_products(subcategory):
             "product_name": product.text,
             "product_url": product.get_attribute('href')
         })
+
+    return products
+
+
+def scrape_products(subcategory, pool=None):
+    """Scrapes subcategory for each given category page URL."""
+    if pool is not None:
+        logger.debug("Opening %s", subcategory['subcategory_url'])
+        with pool.driver() as pooled:
+            pooled.get(subcategory['subcategory_url'])
+            return collect_product_links(pooled.driver)
+
+    driver = get_driver(headless=True)
+    logger.debug("Opening %s", subcategory['subcategory_url'])
+    driver.get(subcategory['subcategory_url'])
+
+    products = collect_product_links(driver)
     
     driver.close()
     del driver
@@ -133,25 +59,135 @@ def scrape_products(subcategory):
     return products
 
 
+def process_subcategory(subcat, mark_done, writer, dedup, pool, scraper=None, fetcher=None, frontier=None, archive=None,
+                        retry=None):
+    """
+    List a subcategory's products, scrape the new ones and mark the subcategory done
+
+    mark_done(subcategory_id) marks it, e.g. DatabaseManager.mark_subcategory_done,
+    or SubcategoryShards.complete, which only does so while the shard is leased.
+
+    Returns:
+        False when frontier URLs of the subcategory are still waiting for a
+        retry, the subcategory is then left pending for a later pass
+    """
+    products = scrape_products(subcat, pool=pool)
+
+    product_urls = dedup.filter_new([product['product_url'] for product in products])
+    logger.info("Skipping %d products already scraped", len(products) - len(product_urls))
+
+    if frontier is not None:
+        frontier.enqueue(product_urls, subcategory_id=subcat['id'], requeue_done=writer.upsert)
+        drain_frontier(frontier, writer, pool, scraper, fetcher, FRONTIER_CONFIG['claim_size'], archive, retry)
+    else:
+        scrape_and_store(writer, product_urls, pool, scraper, fetcher, archive, retry)
+
+    writer.flush()
+    if frontier is not None:
+        outstanding = frontier.outstanding([subcat['id']])
+        if outstanding:
+            # Finished by finish_subcategories, meanwhile the crawl goes on with other work
+            logger.info("Leaving subcategory %s pending, %d of its URLs wait for a retry", subcat['id'], outstanding)
+            return False
+
+    mark_done(subcat['id'])
+    return True
+
+
+def finish_subcategories(subcategory_ids, mark_done, frontier, writer, pool, scraper=None, fetcher=None, archive=None,
+                         retry=None):
+    """Wait out the retries of subcategories process_subcategory left pending, then mark them done"""
+    if not subcategory_ids:
+        return
+    logger.info("Waiting for the retries of %d subcategories", len(subcategory_ids))
+    drain_frontier(frontier, writer, pool, scraper, fetcher, FRONTIER_CONFIG['claim_size'], archive, retry,
+                   wait_for=subcategory_ids)
+    writer.flush()
+    for subcategory_id in subcategory_ids:
+        mark_done(subcategory_id)
+
+
 if __name__ == "__main__":
-    # PS: Opening URLs in current window's tab yields captcha, to deal with it, we'll open URLs in whole new chrome instance repteadly
-    with DatabaseManager(DB_CONFIG) as db:
-        subcategories = db.get_pending_subcategories()
-        
-        for subcat in subcategories:
-            products = scrape_products(subcat)
-
-            for product in products:
-                if db.check_if_product_exists(product['product_url']):
-                    print(f"Product with URL: {product['product_url']} exists in database, hence skipping.")
-                    continue
-                
-                try:
-                    product_details = scrape_product_details(product['product_url'])
-
-                    # Insert each product individually -> REMOVE LATER
-                    db.insert_products([product_details])
-                except Exception:
-                    pass
-
-        print("Total subcategories scraped: ", len(subcategories))
\ No newline at end of file
+    # PS: Opening URLs in current window's tab yields captcha, to deal with it, drivers are
+    # kept warm in a pool and recycled after a few pages or as soon as a captcha shows up
+    exporter = start_instrumentation(LOG_CONFIG, METRICS_CONFIG)
+
+    rate_limiter = None
+    if RATE_LIMIT_CONFIG['enabled']:
+        rate_limiter = AdaptiveRateLimiter(**RATE_LIMIT_CONFIG['limits'])
+
+    cache = None
+    if RESPONSE_CACHE_CONFIG['enabled']:
+        cache = ResponseCache(
+            RESPONSE_CACHE_CONFIG['directory'],
+            ttls=RESPONSE_CACHE_CONFIG['ttls'],
+            max_bytes=RESPONSE_CACHE_CONFIG['max_bytes']
+        )
+
+    fetcher = None
+    if HTTP_FETCHER_CONFIG['enabled']:
+        fetcher = HttpFetcher(
+            pool_size=HTTP_FETCHER_CONFIG['pool_size'],
+            timeout=HTTP_FETCHER_CONFIG['timeout'],
+            cache=cache,
+            rate_limiter=rate_limiter
+        )
+
+    archive = None
+    if ARCHIVE_CONFIG['enabled']:
+        archive = PageArchiveWriter(
+            ARCHIVE_CONFIG['directory'],
+            segment_size=ARCHIVE_CONFIG['segment_size'],
+            level=ARCHIVE_CONFIG['level']
+        )
+
+    try:
+        with DatabaseManager(DB_CONFIG, **DB_POOL_CONFIG) as db, DriverPool(**DRIVER_POOL_CONFIG, rate_limiter=rate_limiter) as pool, \
+                db.product_writer(**DB_WRITER_CONFIG, price_history=create_price_history(db),
+                                  retry=create_retry_scheduler(db, 'products_scraper')) as writer, \
+                create_scraper(pool, rate_limiter) as scraper:
+            dedup = create_deduplicator(db, DB_WRITER_CONFIG['upsert'])
+            # Failed pages and failed DB writes share the run's retry policy
+            retry = writer.retry
+
+            frontier = None
+            if FRONTIER_CONFIG['enabled']:
+                frontier = Frontier(
+                    db,
+                    lease_seconds=FRONTIER_CONFIG['lease_seconds'],
+                    max_retries=FRONTIER_CONFIG['max_retries']
+                )
+                # Resume work an earlier (crashed) run left in the frontier
+                drain_frontier(frontier, writer, pool, scraper, fetcher, FRONTIER_CONFIG['claim_size'], archive, retry)
+
+            subcategories = db.get_pending_subcategories()
+
+            unfinished = [
+                subcat['id'] for subcat in subcategories
+                if not process_subcategory(subcat, db.mark_subcategory_done, writer, dedup, pool, scraper, fetcher, frontier,
+                                           archive, retry)
+            ]
+            finish_subcategories(unfinished, db.mark_subcategory_done, frontier, writer, pool, scraper, fetcher,
+                                 archive, retry)
+            drain_retries(writer, pool, scraper, fetcher, archive, retry)
+
+            logger.info("Total subcategories scraped: %d", len(subcategories))
+            logger.info("Driver pool stats: %s", pool.stats())
+            if frontier is not None:
+                logger.info("Frontier stats: %s", frontier.stats())
+            if retry is not None:
+                logger.info("Retry stats: %s", retry.stats())
+    finally:
+        if fetcher is not None:
+            logger.info("HTTP fetcher stats: %s", fetcher.stats())
+            fetcher.close()
+        if rate_limiter is not None:
+            logger.info("Rate limiter stats: %s", rate_limiter.stats())
+        if archive is not None:
+            logger.info("Page archive stats: %s", archive.stats())
+            archive.close()
+        if cache is not None:
+            logger.info("Response cache stats: %s", cache.stats())
+            cache.close()
+        if exporter is not None:
+            exporter.stop()
@@ -0,0 +1,74 @@
+import argparse
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+from core.archive import PageArchiveReader, iter_segment
+from core.extract import fill_product_data
+from core.config import LOG_CONFIG
+from core.instrumentation import setup_logging
+from core.next_data import PRODUCT_PATH, loads
+
+logger = logging.getLogger(__name__)
+
+
+def reextract_segment(segment_path):
+    """Re-run fill_product_data over every record of one archive segment"""
+    products, failed = [], 0
+    for entry, raw in iter_segment(segment_path):
+        try:
+            payload = loads(raw)
+            for key in PRODUCT_PATH:
+                payload = payload[key]
+            product_data = fill_product_data(payload)
+            product_data['url'] = entry['url']
+            products.append(product_data)
+        except Exception as e:
+            failed += 1
+            logger.warning("Failed to re-extract %s: %s", entry['url'], e)
+    return segment_path, products, failed
+
+
+def reextract(archive_dir, workers=4):
+    """Yield (segment_path, products, failed) for every segment, segments processed in parallel"""
+    segments = PageArchiveReader(archive_dir).segments()
+    logger.info("Re-extracting %d archive segments with %d workers", len(segments), workers)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(reextract_segment, segments)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run product extraction over the raw page archive")
+    parser.add_argument("--archive-dir", default="archive")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", help="write products as JSON lines to this file")
+    parser.add_argument("--to-db", action="store_true", help="upsert products into the products table")
+    args = parser.parse_args()
+
+    setup_logging(**LOG_CONFIG)
+
+    total, total_failed = 0, 0
+    with ExitStack() as stack:
+        output = stack.enter_context(open(args.output, 'w', encoding='utf-8')) if args.output else None
+        writer = None
+        if args.to_db:
+            from core.config import DB_CONFIG, DB_WRITER_CONFIG
+            from core.database import DatabaseManager
+
+            db = stack.enter_context(DatabaseManager(DB_CONFIG))
+            # Re-extracted products replace the rows stored by the original run
+            writer = stack.enter_context(db.product_writer(**{**DB_WRITER_CONFIG, 'upsert': True}))
+
+        for segment_path, products, failed in reextract(args.archive_dir, args.workers):
+            total += len(products)
+            total_failed += failed
+            for product_data in products:
+                if output is not None:
+                    output.write(json.dumps(product_data) + "\n")
+                if writer is not None:
+                    writer.add(product_data)
+            logger.info("%s: %d products, %d failed", segment_path, len(products), failed)
+
+    logger.info("Re-extracted %d products (%d failed)", total, total_failed)
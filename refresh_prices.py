@@ -0,0 +1,117 @@
+import argparse
+import logging
+from functools import partial
+
+from core.config import (DB_CONFIG, DRIVER_POOL_CONFIG, HTTP_FETCHER_CONFIG, LOG_CONFIG, METRICS_CONFIG,
+                         RATE_LIMIT_CONFIG, REFRESH_CONFIG)
+from core.database import DatabaseManager
+from core.driver_pool import DriverPool
+from core.http_fetcher import HttpFetcher
+from core.instrumentation import start_instrumentation
+from core.next_data import NextDataNotFound, extract_next_data
+from core.pipeline import create_price_history, parse_product_page, scrape_product_details
+from core.rate_limiter import AdaptiveRateLimiter
+from core.refresh import PriceRefresher
+from core.store_context import StoreSessions, store_cookies
+from search_results_scraper import fetch_listing_next_data, generate_search_url
+
+logger = logging.getLogger(__name__)
+
+
+def listing_urls_for(db, candidates, keywords):
+    """Search pages of the given and the candidates' keywords, then all subcategory pages"""
+    keywords = list(keywords) + sorted({row['keyword'] for row in candidates if row['keyword']} - set(keywords))
+    return [generate_search_url(keyword) for keyword in keywords] + db.get_listing_urls()
+
+
+def list_in_store(listing_url, store_id, pool, fetcher, sessions):
+    """__NEXT_DATA__ of a listing page as rendered for store_id, the default session's store when None"""
+    if store_id is None:
+        return fetch_listing_next_data(listing_url, pool, fetcher)
+    next_data = extract_next_data(sessions.fetch_page({"store_id": store_id}, listing_url))
+    if next_data is None:
+        raise NextDataNotFound(f"No __NEXT_DATA__ found on {listing_url}")
+    return next_data
+
+
+def scrape_in_store(product_url, store_id, pool, fetcher, sessions):
+    """Product details as rendered for store_id, the default session's store when None"""
+    if store_id is None:
+        return scrape_product_details(product_url, pool=pool, fetcher=fetcher)
+    return parse_product_page(sessions.fetch_page({"store_id": store_id}, product_url), product_url)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh prices of stored products that are due")
+    parser.add_argument("--keyword", action="append", default=[], help="search keyword whose listing pages are checked first")
+    parser.add_argument("--batches", type=int, default=0, help="stop after this many batches (0: until nothing is due)")
+    args = parser.parse_args()
+
+    exporter = start_instrumentation(LOG_CONFIG, METRICS_CONFIG)
+
+    rate_limiter = None
+    if RATE_LIMIT_CONFIG['enabled']:
+        rate_limiter = AdaptiveRateLimiter(**RATE_LIMIT_CONFIG['limits'])
+
+    # No response cache here: listing tiles are only useful with current prices
+    fetcher = None
+    if HTTP_FETCHER_CONFIG['enabled']:
+        fetcher = HttpFetcher(
+            pool_size=HTTP_FETCHER_CONFIG['pool_size'],
+            timeout=HTTP_FETCHER_CONFIG['timeout'],
+            rate_limiter=rate_limiter
+        )
+
+    def create_fetcher(store):
+        return HttpFetcher(
+            pool_size=HTTP_FETCHER_CONFIG['pool_size'],
+            timeout=HTTP_FETCHER_CONFIG['timeout'],
+            rate_limiter=rate_limiter,
+            cookies=store_cookies(store)
+        )
+
+    sessions = None
+    try:
+        with DatabaseManager(DB_CONFIG) as db, DriverPool(**DRIVER_POOL_CONFIG, rate_limiter=rate_limiter) as pool:
+            # Rows of a store are refreshed from that store's own warm session
+            sessions = StoreSessions(create_fetcher, pool)
+            refresher = PriceRefresher(
+                db,
+                list_page=partial(list_in_store, pool=pool, fetcher=fetcher, sessions=sessions),
+                fetch_detail=partial(scrape_in_store, pool=pool, fetcher=fetcher, sessions=sessions),
+                max_listing_pages=REFRESH_CONFIG['max_listing_pages'],
+                listing_page_budget=REFRESH_CONFIG['listing_page_budget'],
+                price_history=create_price_history(db)
+            )
+
+            batches = 0
+            while not args.batches or batches < args.batches:
+                candidates = db.get_refresh_candidates(
+                    REFRESH_CONFIG['max_age_hours'],
+                    REFRESH_CONFIG['volatile_age_hours'],
+                    REFRESH_CONFIG['volatile_changes'],
+                    REFRESH_CONFIG['batch_size'],
+                    REFRESH_CONFIG['failed_retry_hours']
+                )
+                if not candidates:
+                    logger.info("No products due for a refresh")
+                    break
+
+                logger.info("Refreshing %d products", len(candidates))
+                refreshed = refresher.unchanged + refresher.updated
+                stats = refresher.refresh(candidates, listing_urls_for(db, candidates, args.keyword))
+                logger.info("Refresh stats: %s", stats)
+                batches += 1
+
+                # Nothing in the batch went through (failed products sit out REFRESH_FAILED_RETRY_HOURS)
+                if refresher.unchanged + refresher.updated == refreshed:
+                    break
+    finally:
+        if sessions is not None:
+            logger.info("Store session stats: %s", sessions.stats())
+            sessions.close()
+        if fetcher is not None:
+            logger.info("HTTP fetcher stats: %s", fetcher.stats())
+            fetcher.close()
+        if exporter is not None:
+            exporter.stop()
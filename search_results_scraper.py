@@ -2,155 +2,105 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from core.database import DatabaseManager
-from core.config import DB_CONFIG
+from core.config import DB_CONFIG, DB_POOL_CONFIG, DB_WRITER_CONFIG, FRONTIER_CONFIG, DRIVER_POOL_CONFIG, HTTP_FETCHER_CONFIG, ARCHIVE_CONFIG, RESPONSE_CACHE_CONFIG, LOG_CONFIG, METRICS_CONFIG, RATE_LIMIT_CONFIG, CRAWL_ENGINE_CONFIG, SEARCH_LISTING_CONFIG
 from core.driver_setup import get_driver
-from bs4 import BeautifulSoup
-import json
-import re
+from core.driver_pool import DriverPool
+from core.frontier import Frontier
+from core.http_fetcher import HttpFetcher, BotChallengeError
+from core.next_data import NextDataNotFound, extract_next_data
+from core.archive import PageArchiveWriter
+from core.response_cache import ResponseCache
+from core.extract import enrich_product, fill_listing_data, listing_items, listing_max_page
+from core.rate_limiter import AdaptiveRateLimiter
+from core.pipeline import (create_deduplicator, create_price_history, create_retry_scheduler, create_scraper,
+                           drain_frontier, drain_retries, scrape_all, scrape_and_store, scrape_product_details)
+from core.instrumentation import metrics, start_instrumentation
+from core.crawl_engine import CrawlEngine
+from functools import partial
+from collections import deque
 import urllib
+import asyncio
+import logging
 
+logger = logging.getLogger(__name__)
 
-def extract_size(title):
-    # Patterns to match common size formats (oz, fl oz, lb, etc.)
-    patterns = [
-        r'(\d+\.?\d*)\s*(?:fl\s*)?oz',  # matches "6 oz", "15.8 oz", "17 fl oz"
-        r'(\d+)\s*lb',                   # matches "2 lb"
-        r'(\d+)\s*g',                    # matches "500 g"
-        r'(\d+)\s*ml',                   # matches "250 ml"
-        r'(\d+)\s*l',                    # matches "1 l"
-        r'Pack of (\d+)',                # matches "Pack of 4"
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, title, re.IGNORECASE)
-        if match:
-            return match.group(0)
-
-    return ''
-
-
-def fill_product_data(pd: dict) -> dict:
-    """Fill product_data dictionary with information from pageContext"""
-    product_data = {
-        "item_id": None,
-        "upc": None,
-        "product_id": None,
-        "url": "",
-        "name": "",
-        "categories": [],
-        "image": "",
-        "store_id": None,
-        "store_location": "",
-        "price": None,
-        "mrp": None,
-        "discount": None,
-        "availability": "",
-        "keyword": "",
-        "size": ""
-    }
-
-    # Fill in the fields
-    product_data["item_id"] = pd['usItemId']
-    product_data["upc"] = pd["upc"]
-    product_data["product_id"] = pd["id"]
-    product_data["name"] = pd["name"]    
-
-    for category in pd['category']['path']:
-        product_data["categories"].append(category['name'].strip())
-
-    product_data['image'] = pd['imageInfo']['thumbnailUrl']
-    product_data['store_id'] = pd['location']['storeIds'][0]
-    product_data['store_location'] = pd['location']['city']
-    product_data['price'] = pd['priceInfo']['currentPrice']['priceString']
-    try:
-        product_data['mrp'] = pd['priceInfo']['wasPrice']['priceString']
-    except:
-        product_data['mrp'] = pd['priceInfo']['currentPrice']['priceString']
-
-    product_data['availability'] = pd['shippingOption']['availabilityStatus']
-    # Extract name from size since there isn't any specific field for size
-    product_data['size'] = extract_size(pd['name'])
 
-    return product_data
-
-
-def scrape_product_details(product_url):
-    driver = get_driver(headless=True)
-
-    try:
-        print("Opening: ", product_url)
-        driver.get(product_url)
+def collect_product_links(driver):
+    """Collect product names and URLs from the item stack of a search results page"""
+    wait = WebDriverWait(driver, 10)
 
-        page_source = driver.page_source
+    # Get all the products anchor tags
+    product_elements = wait.until(
+        EC.visibility_of_element_located((By.CSS_SELECTOR, "[data-testid='item-stack']"))
+    ).find_elements(By.TAG_NAME, "a")
 
-        soup = BeautifulSoup(page_source, 'html.parser')
-
-        next_data_script = json.loads(soup.find('script', {'id': '__NEXT_DATA__'}).text)
-
-        product_source_data = next_data_script['props']['pageProps']['initialData']['data']['product']
-
-        product_data = fill_product_data(product_source_data)
-        product_data['url'] = product_url
-
-        print(product_data)
-
-        driver.close()
-        del driver
-
-        return product_data
-    except Exception as e:
-        print("Error occured while scraping product details")
-        print(e)
+    products = []
 
-        driver.close()
-        del driver
+    for product in product_elements:
+        products.append({
+            "product_name": product.text,
+            "product_url": product.get_attribute('href')
+        })
 
-        raise e
+    return products
 
 
-def scrape_products(search_keyword):
+def scrape_products(search_keyword, pool=None, cache=None):
     """Scrapes subcategory for each given category page URL."""
     search_url = generate_search_url(search_keyword)
 
     # --- Open URL and look for last page number ---
-    driver = get_driver(headless=True)
-    print("Opening: ", search_url)
-    driver.get(search_url)
-
-    last_page_number = get_last_page_number(driver)
-
-    print("Total pages available: ", last_page_number)
-
-    driver.close()
-    del driver
+    last_page_number = cache.get_json(search_url, 'last_page_number') if cache is not None else None
+    if last_page_number is None:
+        logger.debug("Opening %s", search_url)
+        if pool is not None:
+            with pool.driver() as pooled:
+                pooled.get(search_url)
+                last_page_number = get_last_page_number(pooled.driver)
+        else:
+            driver = get_driver(headless=True)
+            driver.get(search_url)
+
+            last_page_number = get_last_page_number(driver)
+
+            driver.close()
+            del driver
+
+        if cache is not None:
+            cache.put_json(search_url, 'last_page_number', last_page_number)
+
+    logger.info("Total pages available: %s", last_page_number)
     # -----
 
     products = []
 
-    for page_nu in range(1, last_page_number):
+    for page_nu in range(1, last_page_number + 1):
         search_url = generate_search_url(search_keyword) + "&page=" + str(page_nu)
 
-        # There's a reason mentioned below why we've to create new window always for a URL
-        driver = get_driver(headless=True)
-        print("Opening: ", search_url)
-        driver.get(search_url)
-        wait = WebDriverWait(driver, 10)
+        page_products = cache.get_json(search_url, 'products') if cache is not None else None
+        if page_products is not None:
+            logger.debug("Cached %s", search_url)
+        else:
+            logger.debug("Opening %s", search_url)
+            if pool is not None:
+                with pool.driver() as pooled:
+                    pooled.get(search_url)
+                    page_products = collect_product_links(pooled.driver)
+            else:
+                # There's a reason mentioned below why we've to create new window always for a URL
+                driver = get_driver(headless=True)
+                driver.get(search_url)
 
-        # Get all the products anchor tags
-        product_elements = wait.until(
-            EC.visibility_of_element_located((By.CSS_SELECTOR, "[data-testid='item-stack']"))
-        ).find_elements(By.TAG_NAME, "a")
+                page_products = collect_product_links(driver)
 
-        print(f"Total products found on page {page_nu}: {len(product_elements)}")
+                driver.close()
+                del driver
 
-        for product in product_elements:
-            products.append({
-                "product_name": product.text,
-                "product_url": product.get_attribute('href')
-            })
-        
-        driver.close()
-        del driver
+            if cache is not None:
+                cache.put_json(search_url, 'products', page_products)
+
+        logger.info("Total products found on page %d: %d", page_nu, len(page_products))
+        products.extend(page_products)
 
     return products
 
@@ -166,6 +116,9 @@ def generate_search_url(query):
 def get_last_page_number(driver):
     """
     Get last page number from pagination elements.
+
+    Results that fit on one page have no pagination, so 1 is returned when it
+    cannot be found.
     """
     try:
         # Wait for the pagination element to be present
@@ -184,27 +137,250 @@ def get_last_page_number(driver):
                 break
         return last_page
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.warning("No pagination found, assuming a single results page: %s", e)
+        return 1
+
+
+def parse_search_next_data(next_data_script):
+    """Get product URLs and the last page number out of a search page's __NEXT_DATA__"""
+    product_urls = [
+        urllib.parse.urljoin("https://www.walmart.com", item['canonicalUrl'])
+        for item in listing_items(next_data_script)
+    ]
+    return product_urls, listing_max_page(next_data_script)
+
+
+def fetch_listing_next_data(listing_url, pool, fetcher=None):
+    """__NEXT_DATA__ of a search / browse results page, fetched without a browser when possible"""
+    if fetcher is not None:
+        try:
+            logger.debug("Fetching %s", listing_url)
+            return fetcher.get_next_data(listing_url)
+        except BotChallengeError as e:
+            logger.warning("%s, falling back to browser", e)
+
+    logger.debug("Opening %s", listing_url)
+    with pool.driver() as pooled:
+        next_data = extract_next_data(pooled.get(listing_url))
+    if next_data is None:
+        raise NextDataNotFound(f"No __NEXT_DATA__ found on {listing_url}")
+    return next_data
+
+
+def scrape_search_listing(search_keyword, pool, fetcher=None, retry=None):
+    """
+    Build product rows straight from the tiles of every search results page
+
+    One page load per results page instead of one per product; fields only
+    found on product pages (UPC, store location, ...) are left empty.
+
+    With a retry scheduler, a results page that fails to load is loaded again
+    after its backoff, once the other pages are through, and dead-lettered
+    when it runs out of attempts. Without one the first failure is raised.
+    """
+    search_url = generate_search_url(search_keyword)
+    pending = deque([search_url])
+
+    products = []
+    while True:
+        while pending:
+            page_url = pending.popleft()
+            try:
+                next_data = fetch_listing_next_data(page_url, pool, fetcher)
+            except Exception as e:
+                if retry is None:
+                    raise
+                metrics.count_failure(e, 'listing')
+                retry.fail(page_url, e)
+                continue
+            if retry is not None:
+                retry.succeed(page_url)
+
+            if page_url == search_url:
+                last_page_number = listing_max_page(next_data)
+                logger.info("Total pages available: %s", last_page_number)
+                pending.extend(f"{search_url}&page={page_nu}" for page_nu in range(2, last_page_number + 1))
+
+            page_products = [fill_listing_data(item) for item in listing_items(next_data)]
+            for product_data in page_products:
+                product_data['keyword'] = search_keyword
+
+            logger.info("Total products found on %s: %d", page_url, len(page_products))
+            products.extend(page_products)
+
+        if retry is None or not len(retry):
+            return products
+        # Every page was tried once, wait for the backoff of the failed ones
+        pending.extend(retry.next_batch(wait=True))
+
+
+def enrich_products(products, pool, scraper=None, fetcher=None, archive=None):
+    """Yield listing products completed with their product pages; a failed page keeps the listing row"""
+    listed = {product_data['url']: product_data for product_data in products}
+    for product_url, product_details, error in scrape_all(list(listed), pool, scraper, fetcher, archive):
+        if error is not None:
+            logger.warning("Failed to enrich %s, keeping listing data: %s", product_url, error)
+            yield listed[product_url]
+        else:
+            yield enrich_product(listed[product_url], product_details)
+
+
+def list_search_page(search_url, pool=None, fetcher=None, cache=None):
+    """
+    Listing stage of the crawl engine for search pages
+
+    Returns the product URLs found on search_url and, when search_url is the
+    first page, the URLs of all the following result pages.
+    """
+    product_urls = None
+
+    if fetcher is not None:
+        try:
+            logger.debug("Fetching %s", search_url)
+            product_urls, last_page_number = parse_search_next_data(fetcher.get_next_data(search_url))
+        except BotChallengeError as e:
+            logger.warning("%s, falling back to browser", e)
+
+    if product_urls is None and cache is not None:
+        cached = cache.get_json(search_url, 'listing')
+        if cached is not None:
+            product_urls, last_page_number = cached
+
+    if product_urls is None:
+        logger.debug("Opening %s", search_url)
+        with pool.driver() as pooled:
+            pooled.get(search_url)
+            product_urls = [product['product_url'] for product in collect_product_links(pooled.driver)]
+            last_page_number = get_last_page_number(pooled.driver)
+
+        if cache is not None:
+            cache.put_json(search_url, 'listing', [product_urls, last_page_number])
+
+    logger.info("Total products found on %s: %d", search_url, len(product_urls))
+
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(search_url).query)
+    if 'page' in query:
+        return product_urls, []
+
+    more_search_urls = [f"{search_url}&page={page_nu}" for page_nu in range(2, last_page_number + 1)]
+    return product_urls, more_search_urls
+
+
+def crawl_with_engine(dedup, writer, search_keyword, pool, fetcher=None, archive=None, cache=None, retry=None):
+    """Run search listing, product scraping and DB writes as one concurrent pipeline"""
+    engine = CrawlEngine(
+        list_page=partial(list_search_page, pool=pool, fetcher=fetcher, cache=cache),
+        fetch_detail=partial(scrape_product_details, pool=pool, fetcher=fetcher, archive=archive),
+        write=writer.add,
+        url_filter=dedup.filter_new,
+        listing_concurrency=CRAWL_ENGINE_CONFIG['listing_concurrency'],
+        detail_concurrency=CRAWL_ENGINE_CONFIG['detail_concurrency'],
+        queue_size=CRAWL_ENGINE_CONFIG['queue_size'],
+        retry=retry
+    )
+    stats = asyncio.run(engine.run([generate_search_url(search_keyword)]))
+    logger.info("Crawl engine stats: %s", stats)
 
 
 if __name__ == "__main__":
     keyword_to_search = "bread italian"
 
-    # PS: Opening URLs in current window's tab yields captcha, to deal with it, we'll open URLs in whole new chrome instance repteadly
-    with DatabaseManager(DB_CONFIG) as db:
-        products = scrape_products(keyword_to_search)
+    # PS: Opening URLs in current window's tab yields captcha, to deal with it, drivers are
+    # kept warm in a pool and recycled after a few pages or as soon as a captcha shows up
+    exporter = start_instrumentation(LOG_CONFIG, METRICS_CONFIG)
 
-        print(f"Total products to scrape: {len(products)}")
+    rate_limiter = None
+    if RATE_LIMIT_CONFIG['enabled']:
+        rate_limiter = AdaptiveRateLimiter(**RATE_LIMIT_CONFIG['limits'])
 
-        for product in products:
-            if db.check_if_product_exists(product['product_url']):
-                print(f"Product with URL: {product['product_url']} exists in database, hence skipping.")
-                continue
+    cache = None
+    if RESPONSE_CACHE_CONFIG['enabled']:
+        cache = ResponseCache(
+            RESPONSE_CACHE_CONFIG['directory'],
+            ttls=RESPONSE_CACHE_CONFIG['ttls'],
+            max_bytes=RESPONSE_CACHE_CONFIG['max_bytes']
+        )
 
-            try:
-                product_details = scrape_product_details(product['product_url'])
+    fetcher = None
+    if HTTP_FETCHER_CONFIG['enabled']:
+        fetcher = HttpFetcher(
+            pool_size=HTTP_FETCHER_CONFIG['pool_size'],
+            timeout=HTTP_FETCHER_CONFIG['timeout'],
+            cache=cache,
+            rate_limiter=rate_limiter
+        )
 
-                # Insert each product individually -> REMOVE LATER
-                db.insert_products([product_details])
-            except Exception:
-                pass
+    archive = None
+    if ARCHIVE_CONFIG['enabled']:
+        archive = PageArchiveWriter(
+            ARCHIVE_CONFIG['directory'],
+            segment_size=ARCHIVE_CONFIG['segment_size'],
+            level=ARCHIVE_CONFIG['level']
+        )
+
+    try:
+        with DatabaseManager(DB_CONFIG, **DB_POOL_CONFIG) as db, DriverPool(**DRIVER_POOL_CONFIG, rate_limiter=rate_limiter) as pool, \
+                db.product_writer(**DB_WRITER_CONFIG, price_history=create_price_history(db),
+                                  retry=create_retry_scheduler(db, 'search_results_scraper')) as writer, \
+                create_scraper(pool, rate_limiter) as scraper:
+            dedup = create_deduplicator(db, DB_WRITER_CONFIG['upsert'])
+            # Failed pages and failed DB writes share the run's retry policy
+            retry = writer.retry
+
+            if SEARCH_LISTING_CONFIG['enabled']:
+                products = scrape_search_listing(keyword_to_search, pool, fetcher, retry)
+
+                new_urls = set(dedup.filter_new([product['url'] for product in products]))
+                products = [product for product in products if product['url'] in new_urls]
+                logger.info("Storing %d new products from search listing", len(products))
+
+                if SEARCH_LISTING_CONFIG['enrich']:
+                    products = enrich_products(products, pool, scraper, fetcher, archive)
+                for product_data in products:
+                    writer.add(product_data)
+            elif CRAWL_ENGINE_CONFIG['enabled']:
+                crawl_with_engine(dedup, writer, keyword_to_search, pool, fetcher, archive, cache, retry)
+            else:
+                frontier = None
+                if FRONTIER_CONFIG['enabled']:
+                    frontier = Frontier(
+                        db,
+                        lease_seconds=FRONTIER_CONFIG['lease_seconds'],
+                        max_retries=FRONTIER_CONFIG['max_retries']
+                    )
+                    # Resume work an earlier (crashed) run left in the frontier
+                    drain_frontier(frontier, writer, pool, scraper, fetcher, FRONTIER_CONFIG['claim_size'], archive, retry)
+
+                products = scrape_products(keyword_to_search, pool=pool, cache=cache)
+
+                logger.info("Total products to scrape: %d", len(products))
+
+                product_urls = dedup.filter_new([product['product_url'] for product in products])
+                logger.info("Skipping %d products already scraped", len(products) - len(product_urls))
+
+                if frontier is not None:
+                    frontier.enqueue(product_urls, keyword=keyword_to_search, requeue_done=DB_WRITER_CONFIG['upsert'])
+                    drain_frontier(frontier, writer, pool, scraper, fetcher, FRONTIER_CONFIG['claim_size'], archive, retry)
+                    logger.info("Frontier stats: %s", frontier.stats())
+                else:
+                    scrape_and_store(writer, product_urls, pool, scraper, fetcher, archive, retry)
+                    drain_retries(writer, pool, scraper, fetcher, archive, retry)
+
+            if retry is not None:
+                logger.info("Retry stats: %s", retry.stats())
+
+            logger.info("Driver pool stats: %s", pool.stats())
+    finally:
+        if fetcher is not None:
+            logger.info("HTTP fetcher stats: %s", fetcher.stats())
+            fetcher.close()
+        if rate_limiter is not None:
+            logger.info("Rate limiter stats: %s", rate_limiter.stats())
+        if archive is not None:
+            logger.info("Page archive stats: %s", archive.stats())
+            archive.close()
+        if cache is not None:
+            logger.info("Response cache stats: %s", cache.stats())
+            cache.close()
+        if exporter is not None:
+            exporter.stop()
@@ -0,0 +1,178 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import time
+
+from core.archive import PageArchiveWriter
+from core.config import (ARCHIVE_CONFIG, DB_CONFIG, DB_WRITER_CONFIG, DRIVER_POOL_CONFIG, FRONTIER_CONFIG,
+                         HTTP_FETCHER_CONFIG, LOG_CONFIG, METRICS_CONFIG, RATE_LIMIT_CONFIG,
+                         RESPONSE_CACHE_CONFIG, SHARD_CONFIG)
+from core.database import DatabaseManager
+from core.driver_pool import DriverPool
+from core.frontier import Frontier
+from core.http_fetcher import HttpFetcher
+from core.instrumentation import start_instrumentation
+from core.pipeline import create_deduplicator, create_price_history, create_retry_scheduler, drain_retries
+from core.rate_limiter import AdaptiveRateLimiter
+from core.response_cache import ResponseCache
+from core.sharding import SubcategoryShards, Heartbeat, shard_progress
+from products_scraper import finish_subcategories, process_subcategory
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker(worker_id):
+    """Claim shards of pending subcategories and crawl them until none are left"""
+    exporter = start_instrumentation(LOG_CONFIG, METRICS_CONFIG, worker_id)
+
+    rate_limiter = None
+    if RATE_LIMIT_CONFIG['enabled']:
+        rate_limiter = AdaptiveRateLimiter(**RATE_LIMIT_CONFIG['limits'])
+
+    cache = None
+    if RESPONSE_CACHE_CONFIG['enabled']:
+        cache = ResponseCache(
+            RESPONSE_CACHE_CONFIG['directory'],
+            ttls=RESPONSE_CACHE_CONFIG['ttls'],
+            max_bytes=RESPONSE_CACHE_CONFIG['max_bytes']
+        )
+
+    fetcher = None
+    if HTTP_FETCHER_CONFIG['enabled']:
+        fetcher = HttpFetcher(
+            pool_size=HTTP_FETCHER_CONFIG['pool_size'],
+            timeout=HTTP_FETCHER_CONFIG['timeout'],
+            cache=cache,
+            rate_limiter=rate_limiter
+        )
+
+    archive = None
+    if ARCHIVE_CONFIG['enabled']:
+        archive = PageArchiveWriter(
+            ARCHIVE_CONFIG['directory'],
+            segment_size=ARCHIVE_CONFIG['segment_size'],
+            level=ARCHIVE_CONFIG['level']
+        )
+
+    try:
+        with DatabaseManager(DB_CONFIG) as db, DriverPool(**DRIVER_POOL_CONFIG, rate_limiter=rate_limiter) as pool, \
+                db.product_writer(**DB_WRITER_CONFIG, price_history=create_price_history(db),
+                                  retry=create_retry_scheduler(db, 'shard_crawler')) as writer:
+            dedup = create_deduplicator(db, DB_WRITER_CONFIG['upsert'])
+            # Failed pages and failed DB writes share the run's retry policy
+            retry = writer.retry
+            shards = SubcategoryShards(
+                db,
+                worker_id,
+                shard_size=SHARD_CONFIG['shard_size'],
+                lease_seconds=SHARD_CONFIG['lease_seconds'],
+                max_attempts=SHARD_CONFIG['max_attempts']
+            )
+
+            frontier = None
+            if FRONTIER_CONFIG['enabled']:
+                frontier = Frontier(
+                    db,
+                    lease_seconds=FRONTIER_CONFIG['lease_seconds'],
+                    max_retries=FRONTIER_CONFIG['max_retries'],
+                    worker_id=worker_id
+                )
+
+            while True:
+                shard = shards.claim()
+                if not shard:
+                    logger.info("No pending subcategories left", extra={"worker_id": worker_id})
+                    drain_retries(writer, pool, fetcher=fetcher, archive=archive, retry=retry)
+                    return
+
+                logger.info("Claimed shard of %d subcategories", len(shard), extra={"worker_id": worker_id})
+                heartbeat = Heartbeat(
+                    DB_CONFIG,
+                    worker_id,
+                    [subcat['id'] for subcat in shard],
+                    lease_seconds=SHARD_CONFIG['lease_seconds'],
+                    interval=SHARD_CONFIG['heartbeat_interval']
+                )
+                heartbeat.start()
+
+                remaining = [subcat['id'] for subcat in shard]
+                try:
+                    unfinished = []
+                    for subcat in shard:
+                        # Marked done only while this worker still holds the shard's lease
+                        if process_subcategory(subcat, shards.complete, writer, dedup, pool, fetcher=fetcher,
+                                               frontier=frontier, archive=archive, retry=retry):
+                            remaining.remove(subcat['id'])
+                        else:
+                            unfinished.append(subcat['id'])
+                    # The heartbeat keeps the lease of subcategories still waiting for retries
+                    finish_subcategories(unfinished, shards.complete, frontier, writer, pool, fetcher=fetcher,
+                                         archive=archive, retry=retry)
+                except Exception as e:
+                    logger.error("Shard failed, giving back %d subcategories: %s", len(remaining), e,
+                                 extra={"worker_id": worker_id})
+                    shards.release(remaining)
+                finally:
+                    heartbeat.stop()
+    finally:
+        if fetcher is not None:
+            fetcher.close()
+        if archive is not None:
+            archive.close()
+        if cache is not None:
+            cache.close()
+        if exporter is not None:
+            exporter.stop()
+
+
+def start_workers(count):
+    """Start count local workers, each in its own process, and wait for them"""
+    host = socket.gethostname()
+    workers = []
+    for i in range(count):
+        worker_id = f"{host}:{os.getpid()}:{i + 1}"
+        process = multiprocessing.Process(target=run_worker, args=(worker_id,), name=worker_id)
+        process.start()
+        workers.append(process)
+
+    for process in workers:
+        process.join()
+
+
+def show_progress(watch=0):
+    """Print subcategory shard progress, repeatedly every `watch` seconds if set"""
+    with DatabaseManager(DB_CONFIG) as db:
+        while True:
+            progress = shard_progress(db, SHARD_CONFIG['max_attempts'])
+            states = progress['states']
+            total = sum(states.values())
+            print(f"Subcategories: {total} total, {states.get('done', 0)} done, "
+                  f"{states.get('leased', 0)} leased, {states.get('pending', 0)} pending, "
+                  f"{states.get('failed', 0)} failed")
+            for worker in progress['workers']:
+                print(f"  {worker['lease_owner']}: {worker['subcategories']} subcategories, "
+                      f"last heartbeat {worker['last_heartbeat']}")
+
+            if not watch:
+                return
+            time.sleep(watch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl pending subcategories with sharded workers")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    start_parser = subparsers.add_parser("start", help="start N workers on this machine")
+    start_parser.add_argument("--workers", type=int, default=1)
+
+    status_parser = subparsers.add_parser("status", help="show shard progress")
+    status_parser.add_argument("--watch", type=float, default=0, help="refresh every N seconds")
+
+    args = parser.parse_args()
+
+    if args.command == "start":
+        start_workers(args.workers)
+    else:
+        show_progress(args.watch)
@@ -0,0 +1,71 @@
+import argparse
+import logging
+
+from core.config import (DB_CONFIG, DB_WRITER_CONFIG, DRIVER_POOL_CONFIG, HTTP_FETCHER_CONFIG, LOG_CONFIG,
+                         METRICS_CONFIG, RATE_LIMIT_CONFIG, STORE_MATRIX_CONFIG)
+from core.database import DatabaseManager
+from core.driver_pool import DriverPool
+from core.http_fetcher import HttpFetcher
+from core.instrumentation import start_instrumentation
+from core.pipeline import create_price_history
+from core.rate_limiter import AdaptiveRateLimiter
+from core.store_context import StorePriceMatrix, StoreSessions, parse_stores, store_cookies
+
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape prices of stored products across many stores")
+    parser.add_argument("--stores", default=STORE_MATRIX_CONFIG['stores'],
+                        help="comma-separated store_id[:zip_code] list (default: STORE_MATRIX_STORES)")
+    parser.add_argument("--limit", type=int, default=0, help="only the first N stored products (0: all)")
+    args = parser.parse_args()
+
+    stores = parse_stores(args.stores)
+    if not stores:
+        parser.error("no stores given, pass --stores or set STORE_MATRIX_STORES")
+
+    exporter = start_instrumentation(LOG_CONFIG, METRICS_CONFIG)
+
+    rate_limiter = None
+    if RATE_LIMIT_CONFIG['enabled']:
+        rate_limiter = AdaptiveRateLimiter(**RATE_LIMIT_CONFIG['limits'])
+
+    def create_fetcher(store):
+        # No response cache: cached pages carry the price of whichever store they were fetched for
+        return HttpFetcher(
+            pool_size=HTTP_FETCHER_CONFIG['pool_size'],
+            timeout=HTTP_FETCHER_CONFIG['timeout'],
+            rate_limiter=rate_limiter,
+            cookies=store_cookies(store)
+        )
+
+    sessions = None
+    try:
+        # Rows are keyed by (item_id, store_id), so a re-run refreshes them in place
+        with DatabaseManager(DB_CONFIG) as db, DriverPool(**DRIVER_POOL_CONFIG, rate_limiter=rate_limiter) as pool, \
+                db.product_writer(
+                    **{**DB_WRITER_CONFIG, 'upsert': True},
+                    price_history=create_price_history(db)
+                ) as writer:
+            # One warm session per store, the store cookies are set once when it is created
+            sessions = StoreSessions(create_fetcher, pool)
+            product_urls = db.get_product_urls(args.limit)
+            logger.info("Scraping %d products for %d stores", len(product_urls), len(stores))
+
+            matrix = StorePriceMatrix(
+                stores,
+                fetch_page=sessions.fetch_page,
+                write=writer.add,
+                concurrency=STORE_MATRIX_CONFIG['concurrency']
+            )
+            logger.info("Store matrix stats: %s", matrix.run(product_urls))
+            logger.info("Driver pool stats: %s", pool.stats())
+    finally:
+        if sessions is not None:
+            logger.info("Store session stats: %s", sessions.stats())
+            sessions.close()
+        if rate_limiter is not None:
+            logger.info("Rate limiter stats: %s", rate_limiter.stats())
+        if exporter is not None:
+            exporter.stop()
@@ -0,0 +1,30 @@
+import pytest
+
+from benchmark.mock_server import MockCatalog, MockWalmartServer
+from core.http_fetcher import HttpFetcher
+from tests.sqlite_db import SqliteDatabase
+
+
+@pytest.fixture
+def catalog():
+    return MockCatalog(products=30, page_size=8)
+
+
+@pytest.fixture
+def mock_server(catalog):
+    """Mock Walmart serving the catalog, without latency or challenges"""
+    with MockWalmartServer(catalog, latency=0, jitter=0) as server:
+        yield server
+
+
+@pytest.fixture
+def fetcher():
+    with HttpFetcher(pool_size=4, timeout=10) as fetcher:
+        yield fetcher
+
+
+@pytest.fixture
+def db():
+    db = SqliteDatabase()
+    yield db
+    db.close()
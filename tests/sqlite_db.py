@@ -0,0 +1,121 @@
+import re
+import sqlite3
+from typing import Dict, List, Optional
+
+# MySQL constructs of the coordination queries and their SQLite equivalents,
+# applied in order (%s placeholders last, the interval one needs them)
+MYSQL_TO_SQLITE = [
+    (re.compile(r'NOW\(\) \+ INTERVAL %s SECOND'), "datetime('now', printf('%+d seconds', %s))"),
+    (re.compile(r'NOW\(\)'), "datetime('now')"),
+    (re.compile(r'FOR UPDATE SKIP LOCKED'), ''),
+    (re.compile(r'ON DUPLICATE KEY UPDATE'), 'ON CONFLICT DO UPDATE SET'),
+    (re.compile(r'%s'), '?'),
+]
+
+SUBCATEGORIES_TABLE = """
+    CREATE TABLE subcategories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category_name TEXT,
+        category_url TEXT,
+        subcategory_name TEXT,
+        subcategory_url TEXT,
+        status TEXT DEFAULT 'pending',
+        lease_owner TEXT,
+        lease_expires_at TEXT,
+        heartbeat_at TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+CRAWL_FRONTIER_TABLE = """
+    CREATE TABLE crawl_frontier (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        url TEXT NOT NULL,
+        url_hash TEXT NOT NULL UNIQUE,
+        subcategory_id INTEGER,
+        keyword TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        priority INTEGER NOT NULL DEFAULT 0,
+        retries INTEGER NOT NULL DEFAULT 0,
+        lease_owner TEXT,
+        lease_expires_at TEXT,
+        available_at TEXT,
+        last_error TEXT
+    )
+"""
+
+
+def translate(query: str) -> str:
+    for pattern, replacement in MYSQL_TO_SQLITE:
+        query = pattern.sub(lambda _: replacement, query)
+    return query
+
+
+class _Cursor:
+    def __init__(self, connection: sqlite3.Connection):
+        self._cursor = connection.cursor()
+
+    def execute(self, query: str, params: tuple = ()):
+        self._cursor.execute(translate(query), params)
+
+    def fetchall(self) -> List[Dict]:
+        return [dict(row) for row in self._cursor.fetchall()]
+
+    def fetchone(self) -> Optional[Dict]:
+        row = self._cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+
+class SqliteDatabase:
+    def __init__(self, path: str = ':memory:'):
+        """
+        Stand-in for a connected DatabaseManager, for tests without a MySQL server
+
+        Offers the cursor / connection / execute_query surface the coordination
+        code uses, with dict rows, and rewrites the few MySQL-only constructs of
+        its queries (NOW() + INTERVAL, FOR UPDATE SKIP LOCKED, ON DUPLICATE KEY,
+        IF(), %s) for SQLite. Unlike MySQL, SQLite evaluates every assignment
+        of an UPDATE against the old row, so tests must not depend on the order.
+        """
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.create_function('IF', 3, lambda condition, then, otherwise: then if condition else otherwise)
+        self.connection.execute(SUBCATEGORIES_TABLE)
+        self.connection.execute(CRAWL_FRONTIER_TABLE)
+        self.cursor = _Cursor(self.connection)
+
+    def execute_query(self, query: str, params: tuple = ()):
+        self.cursor.execute(query, params)
+        self.connection.commit()
+
+    def fetch(self, query: str, params: tuple = ()) -> List[Dict]:
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
+
+    def add_subcategories(self, count: int, status: Optional[str] = 'pending') -> List[int]:
+        ids = []
+        for index in range(count):
+            self.connection.execute(
+                "INSERT INTO subcategories (category_name, category_url, subcategory_name, subcategory_url, status)"
+                " VALUES (?, ?, ?, ?, ?)",
+                ('Food', 'https://www.walmart.com/cp/food/976759', f'Subcategory {index}',
+                 f'https://www.walmart.com/browse/food/subcategory-{index}/976759_{index}', status)
+            )
+            ids.append(self.connection.execute("SELECT last_insert_rowid()").fetchone()[0])
+        self.connection.commit()
+        return ids
+
+    def expire_leases(self, ids: List[int], table: str = 'subcategories'):
+        """Move the leases of the given rows into the past, like a worker that stopped heartbeating"""
+        self.execute_query(
+            f"UPDATE {table} SET lease_expires_at = datetime('now', '-1 minutes')"
+            f" WHERE id IN ({', '.join(['%s'] * len(ids))})",
+            tuple(ids)
+        )
+
+    def close(self):
+        self.connection.close()
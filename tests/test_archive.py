@@ -0,0 +1,57 @@
+import os
+
+from core.archive import PageArchiveReader, PageArchiveWriter, iter_segment
+from core.next_data import find_next_data
+from reextract_archive import reextract_segment
+
+
+def archive_catalog(catalog, directory, **kwargs):
+    with PageArchiveWriter(str(directory), **kwargs) as writer:
+        for item in catalog.items:
+            writer.append(catalog.product_url(item), find_next_data(catalog.product_page(item['item_id'])))
+    return writer
+
+
+def test_records_round_trip(catalog, tmp_path):
+    writer = archive_catalog(catalog, tmp_path)
+
+    records = list(PageArchiveReader(str(tmp_path)))
+
+    assert writer.stats()['records_written'] == len(catalog.items)
+    assert [entry['url'] for entry, _ in records] == [catalog.product_url(item) for item in catalog.items]
+    assert [entry['item_id'] for entry, _ in records] == [item['item_id'] for item in catalog.items]
+    assert [raw for _, raw in records] == [find_next_data(catalog.product_page(item['item_id']))
+                                           for item in catalog.items]
+
+
+def test_segments_roll_over_at_their_size(catalog, tmp_path):
+    archive_catalog(catalog, tmp_path, segment_size=4096)
+
+    segments = PageArchiveReader(str(tmp_path)).segments()
+
+    assert len(segments) > 1
+    assert sum(len(list(iter_segment(segment))) for segment in segments) == len(catalog.items)
+
+
+def test_torn_record_at_the_end_is_skipped(catalog, tmp_path):
+    archive_catalog(catalog, tmp_path)
+    segment = PageArchiveReader(str(tmp_path)).segments()[0]
+    # A crash after the index entry was written but before all of the record made it to disk
+    with open(segment, 'rb+') as data:
+        data.truncate(os.path.getsize(segment) - 1)
+
+    records = list(iter_segment(segment))
+
+    assert len(records) == len(catalog.items) - 1
+
+
+def test_archived_pages_are_extracted_again(catalog, tmp_path):
+    archive_catalog(catalog, tmp_path)
+    segment = PageArchiveReader(str(tmp_path)).segments()[0]
+
+    segment_path, products, failed = reextract_segment(segment)
+
+    assert segment_path == segment
+    assert failed == 0
+    assert [product['item_id'] for product in products] == [item['item_id'] for item in catalog.items]
+    assert [product['url'] for product in products] == [catalog.product_url(item) for item in catalog.items]
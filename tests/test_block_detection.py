@@ -0,0 +1,33 @@
+import pytest
+
+from benchmark.mock_server import CAPTCHA_PAGE, next_data_script
+from core.block_detection import detect_block
+
+PRODUCT_PAGE = (
+    '<html><head><title>Great Value Whole Milk, 1 gal - Walmart.com</title></head><body>'
+    + next_data_script({'props': {'pageProps': {'reviews': [
+        "Robot or human? Neither, just a happy customer",
+        "Access Denied was what I got at checkout, <b>Access Denied</b>",
+        '<div id="px-captcha"></div>',
+    ]}}})
+    + '<h2>Access Denied</h2></body></html>'
+)
+
+
+@pytest.mark.parametrize("page, status_code, url, reason", [
+    (CAPTCHA_PAGE, 200, None, 'robot_check'),
+    (b'<html><head><title>Access Denied</title></head><body>Reference #18</body></html>', 200, None,
+     'access_denied'),
+    ('<html><body><div class="challenge" id="px-captcha"></div></body></html>', 200, None, 'captcha'),
+    ('<html><body>Redirecting</body></html>', 200, 'https://www.walmart.com/blocked?url=L2lwLzE=', 'blocked'),
+    ('', 429, None, 'http_429'),
+    ('<html>Service Unavailable</html>', 503, None, 'http_503'),
+])
+def test_detects_blocks(page, status_code, url, reason):
+    assert detect_block(page, status_code, url) == reason
+
+
+def test_markers_in_the_content_of_a_real_page_are_no_block():
+    assert detect_block(PRODUCT_PAGE, 200, 'https://www.walmart.com/ip/milk/10450114') is None
+    assert detect_block(PRODUCT_PAGE.encode('utf-8')) is None
+    assert detect_block(None, 200) is None
@@ -0,0 +1,159 @@
+import asyncio
+from functools import partial
+
+from mysql.connector.errors import OperationalError
+
+from benchmark.mock_server import MockWalmartServer
+from benchmark.stores import SqliteProductStore
+from core.block_detection import BlockedError
+from core.crawl_engine import CrawlEngine
+from core.pipeline import scrape_product_details
+from core.retry import RetryScheduler
+import search_results_scraper
+from search_results_scraper import list_search_page
+
+
+class BlockedPool:
+    """Driver pool double whose browser is challenged as well"""
+
+    def driver(self):
+        raise BlockedError("Browser challenged too", 'captcha')
+
+
+def crawl(server, fetcher, store, url_filter=None, queue_size=100, retry=None):
+    pool = BlockedPool()
+    with store.product_writer(batch_size=10, handle_signals=False) as writer:
+        engine = CrawlEngine(
+            list_page=partial(list_search_page, pool=pool, fetcher=fetcher),
+            fetch_detail=partial(scrape_product_details, pool=pool, fetcher=fetcher),
+            write=writer.add,
+            url_filter=url_filter,
+            listing_concurrency=2,
+            detail_concurrency=4,
+            queue_size=queue_size,
+            retry=retry,
+            retry_poll_interval=0.05
+        )
+        return asyncio.run(engine.run([server.search_url('milk')]))
+
+
+def stored_item_ids(store):
+    return {row[0] for row in store.connection.execute("SELECT item_id FROM products")}
+
+
+def test_crawls_every_product(catalog, mock_server, fetcher):
+    store = SqliteProductStore()
+    stats = crawl(mock_server, fetcher, store)
+
+    assert stats == {
+        "listing_pages": catalog.max_page,
+        "listing_failed": 0,
+        "products_found": len(catalog.items),
+        "products_skipped": 0,
+        "products_fetched": len(catalog.items),
+        "products_failed": 0,
+        "products_written": len(catalog.items),
+        "retries": 0,
+    }
+    assert stored_item_ids(store) == {item['item_id'] for item in catalog.items}
+
+
+def test_url_filter_runs_once_per_listing_page(catalog, mock_server, fetcher):
+    known = {catalog.product_url(item) for item in catalog.items[::2]}
+    batches = []
+
+    def only_new(product_urls):
+        batches.append(product_urls)
+        return [url for url in product_urls if url not in known]
+
+    store = SqliteProductStore()
+    stats = crawl(mock_server, fetcher, store, url_filter=only_new)
+
+    assert len(batches) == catalog.max_page
+    assert sum(len(batch) for batch in batches) == len(catalog.items)
+    assert stats['products_skipped'] == len(known)
+    assert stats['products_written'] == len(catalog.items) - len(known)
+    assert stored_item_ids(store) == {item['item_id'] for item in catalog.items[1::2]}
+
+
+def test_backpressure_keeps_every_product(catalog, mock_server, fetcher):
+    store = SqliteProductStore()
+    stats = crawl(mock_server, fetcher, store, queue_size=1)
+
+    assert stats['products_written'] == len(catalog.items)
+
+
+def test_challenged_products_are_counted_as_failed(catalog, fetcher):
+    store = SqliteProductStore()
+    with MockWalmartServer(catalog, latency=0, jitter=0, captcha_rate=0.3, captcha_status=429, seed=7) as server:
+        stats = crawl(server, fetcher, store)
+
+    # A page the browser cannot get past either is lost, but the crawl goes on
+    assert stats['listing_failed'] + stats['listing_pages'] >= 1
+    assert stats['products_fetched'] + stats['products_failed'] == stats['products_found']
+    assert stats['products_written'] == stats['products_fetched'] == len(stored_item_ids(store))
+    assert fetcher.challenged > 0
+
+
+def test_challenged_pages_are_retried_or_dead_lettered(catalog, fetcher):
+    dead = []
+    retry = RetryScheduler(base_delay=0.01, max_delay=0.05,
+                           dead_letter=lambda url, error_class, error, attempts: dead.append(url))
+    store = SqliteProductStore()
+    with MockWalmartServer(catalog, latency=0, jitter=0, captcha_rate=0.3, captcha_status=429, seed=7) as server:
+        stats = crawl(server, fetcher, store, retry=retry)
+
+    # Every product is either stored or dead-lettered, none is only logged
+    assert stats['retries'] > 0
+    assert stats['listing_failed'] == len([url for url in dead if '/search' in url])
+    assert stats['products_failed'] == len([url for url in dead if '/ip/' in url])
+    assert stats['products_failed'] + stats['products_written'] == stats['products_found']
+    assert stats['products_written'] == len(stored_item_ids(store))
+    assert len(retry) == 0
+
+
+def test_failed_writes_are_scraped_again(catalog, mock_server, fetcher):
+    store = SqliteProductStore()
+    failed_once = set()
+
+    with store.product_writer(batch_size=1, handle_signals=False) as writer:
+        def flaky_write(product_details):
+            if product_details['url'] not in failed_once:
+                failed_once.add(product_details['url'])
+                raise OperationalError("Lost connection to MySQL server")
+            writer.add(product_details)
+
+        engine = CrawlEngine(
+            list_page=partial(list_search_page, pool=BlockedPool(), fetcher=fetcher),
+            fetch_detail=partial(scrape_product_details, pool=BlockedPool(), fetcher=fetcher),
+            write=flaky_write,
+            retry=RetryScheduler(base_delay=0.01, max_delay=0.05),
+            retry_poll_interval=0.05
+        )
+        stats = asyncio.run(engine.run([mock_server.search_url('milk')]))
+
+    assert stats['retries'] == len(catalog.items)
+    assert stats['products_fetched'] == 2 * len(catalog.items)
+    assert stats['products_written'] == len(catalog.items)
+    assert stored_item_ids(store) == {item['item_id'] for item in catalog.items}
+
+
+def test_listing_mode_retries_failed_pages(catalog, mock_server, fetcher, monkeypatch):
+    fetch = search_results_scraper.fetch_listing_next_data
+    failed_once = set()
+
+    def flaky_fetch(listing_url, pool, fetcher=None):
+        if listing_url not in failed_once:
+            failed_once.add(listing_url)
+            raise TimeoutError(listing_url)
+        return fetch(listing_url, pool, fetcher)
+
+    monkeypatch.setattr(search_results_scraper, 'fetch_listing_next_data', flaky_fetch)
+    monkeypatch.setattr(search_results_scraper, 'generate_search_url', lambda keyword: mock_server.search_url(keyword))
+    retry = RetryScheduler(base_delay=0.01, max_delay=0.05)
+
+    products = search_results_scraper.scrape_search_listing('milk', BlockedPool(), fetcher, retry)
+
+    assert len(failed_once) == catalog.max_page
+    assert retry.retried == catalog.max_page
+    assert {product['item_id'] for product in products} == {item['item_id'] for item in catalog.items}
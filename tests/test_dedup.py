@@ -0,0 +1,79 @@
+import pytest
+
+from core.dedup import (BloomFilter, HashSet, ProductDeduplicator, canonical_url, item_id_from_url, product_keys,
+                        url_hash)
+
+
+class FakeDatabase:
+    """Product lookups of DatabaseManager over a list of stored products"""
+
+    def __init__(self, products):
+        self.products = products
+        self.lookups = []
+
+    def iter_product_keys(self):
+        for item_id, url in self.products:
+            yield {'item_id': item_id, 'url': url}
+
+    def existing_product_hashes(self, hashes):
+        self.lookups.append(list(hashes))
+        return {url_hash(url) for _, url in self.products} & set(hashes)
+
+
+def product_url(item_id, query=''):
+    return f"https://www.walmart.com/ip/product-{item_id}/{item_id}{query}"
+
+
+def test_url_hash_ignores_query_fragment_and_trailing_slash():
+    url = product_url(1)
+
+    assert canonical_url(url + '/?classType=REGULAR#reviews') == url
+    assert url_hash(url + '?athbdg=L1600') == url_hash(url + '/') == url_hash(url)
+    assert url_hash(url) != url_hash(product_url(2))
+
+
+def test_item_id_from_url():
+    assert item_id_from_url(product_url(123)) == '123'
+    assert item_id_from_url('https://www.walmart.com/ip/456?selected=true') == '456'
+    assert item_id_from_url('https://www.walmart.com/browse/dairy/976759') is None
+    assert product_keys(product_url(7)) == ['item:7', f'url:{url_hash(product_url(7))}']
+
+
+@pytest.mark.parametrize("index", [HashSet(), BloomFilter(expected_items=1000, false_positive_rate=0.01)])
+def test_index_has_no_false_negatives(index):
+    keys = [f"item:{i}" for i in range(1000)]
+    for key in keys:
+        index.add(key)
+
+    assert all(key in index for key in keys)
+    assert len(index) == 1000
+
+
+def test_bloom_filter_keeps_its_false_positive_rate():
+    bloom = BloomFilter(expected_items=1000, false_positive_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"item:{i}")
+
+    false_positives = sum(f"other:{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+@pytest.mark.parametrize("use_bloom", [False, True])
+def test_filter_new_skips_stored_and_repeated_products(use_bloom):
+    db = FakeDatabase([(str(i), product_url(i)) for i in range(5)])
+    dedup = ProductDeduplicator(db, use_bloom=use_bloom, expected_items=100).preload()
+
+    urls = [product_url(i) for i in range(3, 8)] + [product_url(6, '?from=search')]
+    assert dedup.filter_new(urls) == [product_url(5), product_url(6), product_url(7)]
+
+    # Handed out once per run, even before the rows are written
+    assert dedup.filter_new([product_url(7), product_url(8)]) == [product_url(8)]
+
+
+def test_bloom_hits_are_confirmed_in_one_batched_lookup():
+    db = FakeDatabase([(str(i), product_url(i)) for i in range(5)])
+    dedup = ProductDeduplicator(db, use_bloom=True, expected_items=100, batch_size=2).preload()
+
+    assert dedup.filter_new([product_url(i) for i in range(6)]) == [product_url(5)]
+    assert [len(batch) for batch in db.lookups] == [2, 2, 1]
+    assert dedup.db_lookups == 3
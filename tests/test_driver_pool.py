@@ -0,0 +1,102 @@
+import pytest
+
+import core.driver_pool
+from core.block_detection import BlockedError
+from core.driver_pool import DriverPool
+
+
+class FakeChrome:
+    """WebDriver double serving the pages of a dict"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.page_source = ''
+        self.current_url = 'about:blank'
+        self.quit_called = False
+
+    def get(self, url):
+        self.page_source = self.pages[url]
+        self.current_url = url
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def launches(monkeypatch):
+    """Chrome launches of the pool; set launches.failing to make the next ones fail"""
+    class Launches(list):
+        failing = 0
+
+    launched = Launches()
+    pages = {
+        'https://www.walmart.com/ip/1': '<html>product</html>',
+        'https://www.walmart.com/ip/2': '<html><title>Robot or human?</title></html>',
+    }
+
+    def get_driver(headless=True):
+        if launched.failing:
+            launched.failing -= 1
+            raise RuntimeError("chromedriver crashed on start")
+        launched.append(FakeChrome(pages))
+        return launched[-1]
+
+    monkeypatch.setattr(core.driver_pool, 'get_driver', get_driver)
+    monkeypatch.setattr(core.driver_pool, 'wait_for_next_data', lambda driver: None)
+    return launched
+
+
+def test_drivers_are_reused_until_max_pages(launches):
+    with DriverPool(size=1, max_pages=2) as pool:
+        for _ in range(3):
+            with pool.driver() as pooled:
+                pooled.get('https://www.walmart.com/ip/1')
+
+        assert len(launches) == 2
+        assert launches[0].quit_called
+        assert pool.stats()['recycled_exhausted'] == 1
+
+
+def test_blocked_driver_is_replaced_on_next_borrow(launches):
+    with DriverPool(size=1) as pool:
+        with pytest.raises(BlockedError):
+            with pool.driver() as pooled:
+                pooled.get('https://www.walmart.com/ip/2')
+        assert len(launches) == 1
+
+        with pool.driver() as pooled:
+            assert pooled.get('https://www.walmart.com/ip/1') == '<html>product</html>'
+        assert len(launches) == 2
+        assert pool.stats()['recycled_blocked'] == 1
+
+
+def test_failed_launch_keeps_the_slot(launches):
+    with DriverPool(size=1, borrow_timeout=1) as pool:
+        with pytest.raises(BlockedError):
+            with pool.driver() as pooled:
+                pooled.get('https://www.walmart.com/ip/2')
+
+        launches.failing = 1
+        with pytest.raises(RuntimeError, match="chromedriver crashed"):
+            with pool.driver():
+                pass
+
+        with pool.driver() as pooled:
+            assert pooled.get('https://www.walmart.com/ip/1') == '<html>product</html>'
+        assert pool.stats()['failed_launches'] == 1
+
+
+def test_error_of_the_block_is_not_hidden_by_relaunch(launches):
+    with DriverPool(size=1) as pool:
+        launches.failing = 1
+        with pytest.raises(BlockedError):
+            with pool.driver() as pooled:
+                pooled.get('https://www.walmart.com/ip/2')
+
+
+def test_borrow_times_out(launches):
+    with DriverPool(size=1, borrow_timeout=0.05) as pool:
+        with pool.driver():
+            with pytest.raises(TimeoutError):
+                with pool.driver():
+                    pass
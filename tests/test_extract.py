@@ -0,0 +1,84 @@
+import pytest
+
+from core.extract import dig, discount_percent, fill_product_data, first_of, parse_size, price_cents
+
+
+@pytest.mark.parametrize("title, size", [
+    ("Great Value Whole Milk, 1 gal", ("1 gal", 1.0, 'gal')),
+    ("Great Value 2% Milk, 1/2 gal", ("1/2 gal", 0.5, 'gal')),
+    ("Ground Beef 1 1/2 lb Tray", ("1 1/2 lb", 1.5, 'lb')),
+    ("Coca-Cola, 12 fl oz, Pack of 12", ("12 fl oz", 12.0, 'fl oz')),
+    ("Simply Orange 52 fl. oz", ("52 fl. oz", 52.0, 'fl oz')),
+    ("Chicken Breast 2lb, 32 oz", ("32 oz", 32.0, 'oz')),
+    ("Bananas 2.5 lbs", ("2.5 lbs", 2.5, 'lb')),
+    ("Nutella 750g Jar", ("750g", 750.0, 'g')),
+    ("Evian Water 1.5 L", ("1.5 L", 1.5, 'l')),
+    ("Large White Eggs, 18 count", ("18 count", 18.0, 'count')),
+    ("Paper Towels, Pack of 6", ("Pack of 6", 6.0, 'count')),
+    ("Sparkling Water 6/12 oz", ("", None, None)),
+    ("Mixed Nuts 4/3 lb", ("", None, None)),
+    ("Nature's Own Honey Wheat Bread", ("", None, None)),
+    ("", ("", None, None)),
+    (None, ("", None, None)),
+])
+def test_parse_size(title, size):
+    assert parse_size(title) == size
+
+
+def test_dig():
+    data = {'a': {'b': [{'c': 1}, None]}}
+
+    assert dig(data, 'a', 'b', 0, 'c') == 1
+    assert dig(data, 'a', 'b', 1, 'c', default='none') == 'none'
+    assert dig(data, 'a', 'b', 5) is None
+    assert dig(data, 'a', 'x', default=[]) == []
+    assert dig(data, 'a', 'b', 'c') is None
+    assert dig(None, 'a') is None
+
+
+def test_first_of():
+    assert first_of(None, '', [], 0) == 0
+    assert first_of(None, '$1.00', '$2.00') == '$1.00'
+    assert first_of(None, '', default='n/a') == 'n/a'
+
+
+@pytest.mark.parametrize("price, cents", [
+    ('$3.48', 348),
+    ('$1,299.00', 129900),
+    ('88¢', 88),
+    ('88 ¢', 88),
+    ('$1.99 - $3.49', 199),
+    ('Now $2.005', 201),
+    (3.48, 348),
+    (12, 1200),
+    ('', None),
+    (None, None),
+    ('Price unavailable', None),
+])
+def test_price_cents(price, cents):
+    assert price_cents(price) == cents
+
+
+def test_discount_percent():
+    assert discount_percent('$2.98', '$3.98') == '25%'
+    assert discount_percent('$3.98', '$3.98') is None
+    assert discount_percent('$3.98', None) is None
+
+
+def test_fill_product_data_falls_back_on_missing_fields():
+    product = fill_product_data({
+        'canonicalUrl': '/ip/Great-Value-Milk-1-2-gal/10450115',
+        'name': 'Great Value 2% Milk, 1/2 gal',
+        'priceInfo': {'currentPrice': {'price': 2.12}},
+        'imageInfo': {'allImages': [{'url': 'https://i5.walmartimages.com/milk.jpg'}]},
+        'category': {'path': [{'name': ' Food '}, {'name': None}]},
+    })
+
+    assert product['item_id'] == '10450115'
+    assert product['price'] == product['mrp'] == '$2.12'
+    assert product['image'] == 'https://i5.walmartimages.com/milk.jpg'
+    assert product['categories'] == ['Food']
+    assert (product['size'], product['size_quantity'], product['size_unit']) == ('1/2 gal', 0.5, 'gal')
+
+    with pytest.raises(ValueError):
+        fill_product_data({'name': 'No id'})
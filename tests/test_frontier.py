@@ -0,0 +1,158 @@
+import pytest
+
+from core.frontier import Frontier
+from core.pipeline import drain_frontier
+from core.retry import RetryScheduler
+
+URLS = [f'https://www.walmart.com/ip/product/{index}' for index in range(5)]
+
+
+class ListWriter:
+    """BufferedProductWriter double keeping what was added and flushed"""
+
+    upsert = False
+
+    def __init__(self):
+        self.added, self.flushed = [], []
+
+    def add(self, product):
+        self.added.append(product)
+
+    def flush(self):
+        self.flushed += self.added
+        self.added = []
+
+
+def statuses(db):
+    return {row['url']: row['status'] for row in db.fetch("SELECT url, status FROM crawl_frontier")}
+
+
+def row_of(db, url):
+    return db.fetch("SELECT * FROM crawl_frontier WHERE url = %s", (url,))[0]
+
+
+def test_enqueue_skips_known_urls(db):
+    frontier = Frontier(db, worker_id='worker-a')
+
+    frontier.enqueue(URLS[:3], subcategory_id=1)
+    frontier.enqueue(URLS, subcategory_id=1)
+
+    assert frontier.stats() == {'pending': 5}
+
+
+def test_claim_leases_by_priority(db):
+    frontier = Frontier(db, worker_id='worker-a')
+    frontier.enqueue(URLS[:3])
+    frontier.enqueue(URLS[3:], priority=1)
+
+    claimed = frontier.claim(3)
+
+    assert [row['url'] for row in claimed] == [URLS[3], URLS[4], URLS[0]]
+    assert [row['url'] for row in Frontier(db, worker_id='worker-b').claim(5)] == URLS[1:3]
+    assert [row_of(db, url)['lease_owner'] for url in URLS] == ['worker-a', 'worker-b', 'worker-b', 'worker-a', 'worker-a']
+
+
+def test_complete_only_by_lease_owner(db):
+    frontier = Frontier(db, worker_id='worker-a')
+    frontier.enqueue(URLS[:2])
+    ids = [row['id'] for row in frontier.claim(2)]
+
+    Frontier(db, worker_id='worker-b').complete(ids)
+    assert set(statuses(db).values()) == {'leased'}
+
+    frontier.complete(ids)
+    assert frontier.stats() == {'done': 2}
+
+
+def test_fail_gives_url_back_after_delay(db):
+    frontier = Frontier(db, worker_id='worker-a')
+    frontier.enqueue(URLS[:1])
+    row = frontier.claim(1)[0]
+
+    frontier.fail(row['id'], 'timeout', delay=60)
+
+    failed = row_of(db, URLS[0])
+    assert (failed['status'], failed['retries'], failed['last_error']) == ('pending', 1, 'timeout')
+    assert frontier.claim(1) == []
+
+    db.execute_query("UPDATE crawl_frontier SET available_at = datetime('now', '-1 seconds')")
+    assert [row['url'] for row in frontier.claim(1)] == URLS[:1]
+
+
+def test_permanent_failure(db):
+    frontier = Frontier(db, worker_id='worker-a')
+    frontier.enqueue(URLS[:1])
+    row = frontier.claim(1)[0]
+
+    frontier.fail(row['id'], 'HTTP 404', permanent=True)
+
+    assert statuses(db) == {URLS[0]: 'failed'}
+
+
+def test_fail_only_by_lease_owner(db):
+    crashed = Frontier(db, worker_id='worker-a')
+    crashed.enqueue(URLS[:1])
+    row = crashed.claim(1)[0]
+    db.expire_leases([row['id']], table='crawl_frontier')
+    reclaimed = Frontier(db, worker_id='worker-b').claim(1)
+
+    # The worker whose lease expired cannot fail the URL another worker now owns
+    crashed.fail(row['id'], 'timeout', permanent=True)
+
+    assert reclaimed[0]['id'] == row['id']
+    assert row_of(db, URLS[0])['status'] == 'leased'
+    assert row_of(db, URLS[0])['lease_owner'] == 'worker-b'
+
+
+def test_drain_completes_and_retries(db, monkeypatch):
+    frontier = Frontier(db, worker_id='worker-a')
+    frontier.enqueue(URLS, subcategory_id=7)
+
+    def scrape(product_urls, pool, scraper, fetcher, archive):
+        for url in product_urls:
+            if url == URLS[2]:
+                yield url, None, TimeoutError("page load timed out")
+            else:
+                yield url, {'url': url}, None
+
+    monkeypatch.setattr('core.pipeline.scrape_all', scrape)
+    writer = ListWriter()
+    drain_frontier(frontier, writer, pool=None, claim_size=2, retry=RetryScheduler(base_delay=60))
+
+    assert [product['url'] for product in writer.flushed] == URLS[:2] + URLS[3:]
+    assert statuses(db) == {**{url: 'done' for url in URLS}, URLS[2]: 'pending'}
+    assert frontier.outstanding([7]) == 1
+
+
+def test_drain_gives_leases_back_when_interrupted(db, monkeypatch):
+    frontier = Frontier(db, worker_id='worker-a')
+    frontier.enqueue(URLS[:3])
+
+    def scrape(product_urls, pool, scraper, fetcher, archive):
+        yield product_urls[0], {'url': product_urls[0]}, None
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr('core.pipeline.scrape_all', scrape)
+    with pytest.raises(KeyboardInterrupt):
+        drain_frontier(frontier, ListWriter(), pool=None, claim_size=3)
+
+    assert frontier.stats() == {'pending': 3}
+    assert {row['retries'] for row in db.fetch("SELECT retries FROM crawl_frontier")} == {0}
+
+
+def test_drain_renews_leases_of_slow_batch(db, monkeypatch):
+    frontier = Frontier(db, worker_id='worker-a', lease_seconds=0)
+    frontier.enqueue(URLS[:2])
+    renewed = []
+    monkeypatch.setattr(frontier, 'renew', renewed.append)
+
+    def scrape(product_urls, pool, scraper, fetcher, archive):
+        for url in product_urls:
+            yield url, {'url': url}, None
+
+    monkeypatch.setattr('core.pipeline.scrape_all', scrape)
+    drain_frontier(frontier, ListWriter(), pool=None, claim_size=2)
+
+    ids = [row['id'] for row in db.fetch("SELECT id FROM crawl_frontier ORDER BY id")]
+    assert renewed == [ids, ids]
+    assert frontier.stats() == {'done': 2}
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+
+import pytest
+import requests
+
+from benchmark.mock_server import MockWalmartServer
+from core.http_fetcher import BotChallengeError
+from core.next_data import find_next_data
+from core.pipeline import scrape_product_details
+from core.retry import classify_error
+
+
+class BrowserPool:
+    """Driver pool double whose browser gets past the challenge, serving the real page"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.opened = []
+
+    @contextmanager
+    def driver(self):
+        yield self
+
+    def get(self, url):
+        self.opened.append(url)
+        return self.catalog.product_page(url.rstrip('/').rsplit('/', 1)[-1]).decode('utf-8')
+
+
+def test_get_page_returns_product_page(catalog, mock_server, fetcher):
+    item = catalog.items[0]
+    page = fetcher.get_page(catalog.product_url(item))
+
+    assert find_next_data(page) is not None
+    assert fetcher.stats() == {"fetched": 1, "challenged": 0}
+
+
+@pytest.mark.parametrize("captcha_status, reason", [
+    (200, 'robot_check'),
+    (429, 'http_429'),
+    (503, 'http_503'),
+])
+def test_get_page_raises_on_challenge(catalog, fetcher, captcha_status, reason):
+    with MockWalmartServer(catalog, latency=0, jitter=0, captcha_rate=1.0, captcha_status=captcha_status) as server:
+        with pytest.raises(BotChallengeError) as raised:
+            fetcher.get_page(catalog.product_url(catalog.items[0]))
+
+    assert raised.value.reason == reason
+    assert fetcher.challenged == 1
+
+
+def test_challenge_falls_back_to_browser(catalog, fetcher):
+    item = catalog.items[3]
+    pool = BrowserPool(catalog)
+
+    with MockWalmartServer(catalog, latency=0, jitter=0, captcha_rate=1.0) as server:
+        product_url = catalog.product_url(item)
+        product_data = scrape_product_details(product_url, pool=pool, fetcher=fetcher)
+
+    assert product_data['item_id'] == item['item_id']
+    assert product_data['url'] == product_url
+    assert pool.opened == [product_url]
+    assert fetcher.challenged == 1
+
+
+def test_regular_page_skips_browser(catalog, mock_server, fetcher):
+    item = catalog.items[5]
+    pool = BrowserPool(catalog)
+
+    product_data = scrape_product_details(catalog.product_url(item), pool=pool, fetcher=fetcher)
+
+    assert product_data['item_id'] == item['item_id']
+    assert pool.opened == []
+
+
+def test_missing_page_is_no_challenge(mock_server, fetcher):
+    pool = BrowserPool(None)
+
+    with pytest.raises(requests.HTTPError) as raised:
+        scrape_product_details(mock_server.base_url + '/ip/gone/1', pool=pool, fetcher=fetcher)
+
+    assert pool.opened == []
+    assert classify_error(raised.value) == 'permanent'
@@ -0,0 +1,32 @@
+import pytest
+
+from core.instrumentation import Metrics
+
+
+def test_failures_are_counted_once_in_their_stage():
+    metrics = Metrics()
+
+    with pytest.raises(ValueError) as raised:
+        with metrics.span('page_load'):
+            with metrics.span('parse'):
+                raise ValueError("No __NEXT_DATA__")
+    # The scrape loop handling the error does not count it again
+    metrics.count_failure(raised.value, 'scrape')
+    metrics.count_failure(KeyError('product'), 'scrape')
+
+    assert metrics.counter_total('failures_total') == 2
+    assert metrics.counter_total('failures_total', stage='parse', error='ValueError') == 1
+    assert metrics.counter_total('failures_total', stage='scrape', error='KeyError') == 1
+    assert metrics.counter_total('failures_total', stage='page_load') == 0
+
+
+def test_span_times_failed_stages_too():
+    metrics = Metrics(keep_samples=True)
+
+    with metrics.span('extract'):
+        pass
+    with pytest.raises(KeyError):
+        with metrics.span('extract'):
+            raise KeyError('product')
+
+    assert len(metrics.samples('stage_duration_seconds', stage='extract')) == 2
@@ -0,0 +1,84 @@
+import pytest
+
+from core.price_history import OTHER_AVAILABILITY, PriceHistory, availability_code, price_observation, price_point
+
+
+class FakeDatabase:
+    """Price history queries of DatabaseManager over an in-memory list of rows"""
+
+    def __init__(self):
+        self.rows = []
+        self.lookups = []
+
+    def get_latest_price_values(self, keys):
+        self.lookups.append(list(keys))
+        latest = {}
+        for row in self.rows:
+            if row[:2] in keys:
+                latest[row[:2]] = row[2:]
+        return latest
+
+    def insert_price_observations(self, rows):
+        self.rows.extend(rows)
+
+
+def observation(item_id='101', store_id='3081', price='3.48', mrp='3.98', availability='IN_STOCK'):
+    return price_observation({'item_id': item_id, 'store_id': store_id, 'price': price,
+                              'mrp': mrp, 'availability': availability})
+
+
+def test_price_observation():
+    assert observation() == (101, 3081, 348, 398, 1)
+    assert observation(store_id=None, mrp=None) == (101, 0, 348, None, 1)
+    assert observation(availability='Limited stock')[4] == availability_code('LIMITED_STOCK')
+    assert observation(availability='BACKORDERED')[4] == OTHER_AVAILABILITY
+    assert observation(item_id='abc') is None
+
+
+@pytest.mark.parametrize("cache_size", [0, 100])
+def test_only_changes_are_written(cache_size):
+    db = FakeDatabase()
+    history = PriceHistory(db, cache_size=cache_size)
+
+    assert history.record([observation(), observation(item_id='102')]) == 2
+    assert history.record([observation(), observation(item_id='102')]) == 0
+    assert history.record([observation(price='2.98'), observation(item_id='102', availability='OUT_OF_STOCK')]) == 2
+    assert history.record([observation(price='2.98', store_id='5260')]) == 1
+
+    assert db.rows == [
+        (101, 3081, 348, 398, 1),
+        (102, 3081, 348, 398, 1),
+        (101, 3081, 298, 398, 1),
+        (102, 3081, 348, 398, 2),
+        (101, 5260, 298, 398, 1),
+    ]
+    assert history.stats()['unchanged'] == 2
+
+
+def test_cached_values_need_no_lookup():
+    db = FakeDatabase()
+    history = PriceHistory(db)
+
+    history.record([observation()])
+    history.record([observation()])
+    history.record([observation(price='2.98')])
+
+    assert db.lookups == [[(101, 3081)]]
+    assert history.stats()['cached'] == 1
+
+
+def test_last_observation_of_a_batch_wins():
+    db = FakeDatabase()
+    history = PriceHistory(db)
+
+    assert history.record([observation(price='3.48'), None, observation(price='2.98')]) == 1
+    assert db.rows == [(101, 3081, 298, 398, 1)]
+
+
+def test_price_point_computes_the_discount():
+    point = price_point({'item_id': 101, 'store_id': 3081, 'ts': None, 'price_cents': 298,
+                         'mrp_cents': 398, 'availability_code': 1})
+
+    assert point['discount_cents'] == 100
+    assert point['discount_percent'] == 25.1
+    assert point['availability'] == 'IN_STOCK'
@@ -0,0 +1,124 @@
+import time
+
+import pytest
+from mysql.connector.errors import DataError, IntegrityError, OperationalError
+
+from core.database import BufferedProductWriter
+from core.retry import RetryScheduler
+
+
+class FakeDatabase:
+    """insert_product_rows of DatabaseManager, refusing rows of the item ids in bad"""
+
+    def __init__(self, bad=(), error=IntegrityError):
+        self.bad = set(bad)
+        self.error = error
+        self.rows = []
+        self.down = 0
+
+    def insert_product_rows(self, rows, upsert=False):
+        if self.down:
+            self.down -= 1
+            raise OperationalError("Lost connection to MySQL server")
+        if any(row[0] in self.bad for row in rows):
+            raise self.error("Duplicate entry for key 'uq_products_item_store'")
+        self.rows.extend(rows)
+
+
+def product(index):
+    return {'item_id': str(index), 'url': f'https://www.walmart.com/ip/{index}', 'store_id': '3081'}
+
+
+def dead_letter_scheduler(dead_letters):
+    return RetryScheduler(base_delay=0.01, max_delay=0.01,
+                          dead_letter=lambda url, error_class, error, attempts: dead_letters.append((url, error_class)))
+
+
+def test_flushes_full_batches():
+    db = FakeDatabase()
+    writer = BufferedProductWriter(db, batch_size=4, flush_interval=60, handle_signals=False)
+
+    for index in range(10):
+        writer.add(product(index))
+
+    assert [row[0] for row in db.rows] == [str(index) for index in range(8)]
+    assert writer.stats()['flushes'] == 2
+    assert writer.stats()['rows_buffered'] == 2
+
+
+def test_flushes_after_the_interval():
+    db = FakeDatabase()
+    writer = BufferedProductWriter(db, batch_size=100, flush_interval=0.05, handle_signals=False)
+
+    writer.add(product(0))
+    assert db.rows == []
+    time.sleep(0.06)
+    writer.add(product(1))
+
+    assert [row[0] for row in db.rows] == ['0', '1']
+
+
+def test_flushes_the_rest_on_exit():
+    db = FakeDatabase()
+    with BufferedProductWriter(db, batch_size=4, flush_interval=60, handle_signals=False) as writer:
+        for index in range(6):
+            writer.add(product(index))
+
+    assert [row[0] for row in db.rows] == [str(index) for index in range(6)]
+    assert writer.stats()['rows_buffered'] == 0
+
+
+def test_failed_writes_keep_their_rows_for_the_retry():
+    db = FakeDatabase()
+    db.down = 2
+    writer = BufferedProductWriter(db, batch_size=2, flush_interval=60, handle_signals=False,
+                                   retry=RetryScheduler(base_delay=0.01, max_delay=0.01))
+
+    # add() does not wait for the backoff, the rows stay buffered meanwhile
+    for index in range(3):
+        writer.add(product(index))
+    assert db.rows == []
+    assert writer.stats()['failed_writes'] >= 1
+
+    writer.flush()
+
+    assert [row[0] for row in db.rows] == ['0', '1', '2']
+    assert writer.stats()['failed_writes'] == 2
+    assert writer.stats()['rows_buffered'] == 0
+
+
+def test_failed_writes_are_raised_once_out_of_attempts():
+    db = FakeDatabase()
+    db.down = 5
+    writer = BufferedProductWriter(db, batch_size=10, handle_signals=False,
+                                   retry=RetryScheduler(max_attempts={'db': 2}, base_delay=0.01, max_delay=0.01))
+    writer.add(product(0))
+
+    with pytest.raises(OperationalError):
+        writer.flush()
+    assert writer.stats()['failed_writes'] == 2
+    assert writer.stats()['rows_buffered'] == 1
+
+
+def test_refused_rows_are_dead_lettered_and_the_rest_written():
+    db = FakeDatabase(bad={'3', '7'})
+    dead_letters = []
+    writer = BufferedProductWriter(db, batch_size=10, handle_signals=False, retry=dead_letter_scheduler(dead_letters))
+
+    for index in range(10):
+        writer.add(product(index))
+
+    assert sorted(row[0] for row in db.rows) == sorted(str(index) for index in range(10) if index not in (3, 7))
+    assert sorted(dead_letters) == [(product(3)['url'], 'permanent'), (product(7)['url'], 'permanent')]
+    assert writer.stats()['rejected_rows'] == 2
+    assert writer.stats()['rows_buffered'] == 0
+
+
+def test_refused_rows_are_dropped_without_scheduler():
+    db = FakeDatabase(bad={'0'}, error=DataError)
+    with BufferedProductWriter(db, batch_size=5, handle_signals=False) as writer:
+        for index in range(5):
+            writer.add(product(index))
+
+    assert sorted(row[0] for row in db.rows) == ['1', '2', '3', '4']
+    assert writer.rejected_rows == 1
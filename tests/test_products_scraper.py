@@ -0,0 +1,29 @@
+import products_scraper
+from core.sharding import SubcategoryShards
+
+
+class SeenIndex:
+    def filter_new(self, product_urls):
+        return product_urls
+
+
+class ListWriter:
+    upsert = False
+
+    def flush(self):
+        pass
+
+
+def test_shard_subcategory_is_only_done_while_leased(db, monkeypatch):
+    ids = db.add_subcategories(1)
+    crashed = SubcategoryShards(db, 'worker-a')
+    subcat = crashed.claim()[0]
+    db.expire_leases(ids)
+    SubcategoryShards(db, 'worker-b').claim()
+
+    monkeypatch.setattr(products_scraper, 'scrape_products', lambda subcat, pool=None: [])
+    products_scraper.process_subcategory(subcat, crashed.complete, ListWriter(), SeenIndex(), pool=None)
+
+    # The worker whose lease was reclaimed cannot mark the subcategory done
+    row = db.fetch("SELECT status, lease_owner FROM subcategories")[0]
+    assert row == {'status': 'pending', 'lease_owner': 'worker-b'}
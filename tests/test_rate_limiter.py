@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from benchmark.mock_server import MockWalmartServer
+from core.http_fetcher import BotChallengeError, HttpFetcher
+from core.rate_limiter import AdaptiveRateLimiter
+
+URL = 'https://www.walmart.com/ip/1'
+
+
+def test_clean_responses_raise_the_rate_up_to_max():
+    limiter = AdaptiveRateLimiter(initial_rate=1.0, max_rate=1.2, increase=0.1)
+
+    limiter.record_success(URL)
+    assert limiter.stats()['www.walmart.com']['rate'] == 1.1
+    for _ in range(5):
+        limiter.record_success(URL)
+
+    assert limiter.stats()['www.walmart.com'] == {"rate": 1.2, "successes": 6, "blocks": 0}
+
+
+def test_blocks_halve_the_rate_down_to_min():
+    limiter = AdaptiveRateLimiter(initial_rate=1.0, min_rate=0.2, decrease=0.5, cooldown=0)
+
+    limiter.record_block(URL, 'captcha')
+    assert limiter.stats()['www.walmart.com']['rate'] == 0.5
+    for _ in range(5):
+        limiter.record_block(URL, 'captcha')
+
+    assert limiter.stats()['www.walmart.com'] == {"rate": 0.2, "successes": 0, "blocks": 6}
+
+
+def test_domains_are_limited_separately():
+    limiter = AdaptiveRateLimiter(initial_rate=1.0, cooldown=0)
+
+    limiter.record_block(URL)
+    limiter.record_success('https://i5.walmartimages.com/milk.jpg')
+
+    assert limiter.stats()['www.walmart.com']['rate'] == 0.5
+    assert limiter.stats()['i5.walmartimages.com']['rate'] == 1.05
+
+
+def test_wait_spaces_requests_at_the_rate():
+    limiter = AdaptiveRateLimiter(initial_rate=20.0, burst=1.0)
+
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.wait(URL)
+
+    # The first token is in the bucket, the other three take 1/20s each
+    assert time.monotonic() - started == pytest.approx(0.15, abs=0.05)
+
+
+def test_block_pauses_the_domain_for_the_cooldown():
+    limiter = AdaptiveRateLimiter(initial_rate=100.0, decrease=1.0, cooldown=0.1)
+    limiter.wait(URL)
+    limiter.record_block(URL, 'captcha')
+
+    started = time.monotonic()
+    limiter.wait(URL)
+
+    assert time.monotonic() - started >= 0.1
+
+
+def test_fetcher_feeds_blocks_and_clean_pages_to_the_limiter(catalog):
+    limiter = AdaptiveRateLimiter(initial_rate=1000.0, max_rate=1000.0, cooldown=0)
+    with MockWalmartServer(catalog, latency=0, jitter=0, captcha_rate=0.5, captcha_status=429, seed=3) as server, \
+            HttpFetcher(pool_size=1, timeout=10, rate_limiter=limiter) as fetcher:
+        for item in catalog.items[:10]:
+            try:
+                fetcher.get_page(catalog.product_url(item))
+            except BotChallengeError:
+                pass
+
+    domain_stats = next(iter(limiter.stats().values()))
+    assert domain_stats['blocks'] == fetcher.challenged > 0
+    assert domain_stats['successes'] == 10 - fetcher.challenged
@@ -0,0 +1,109 @@
+from core.refresh import PriceRefresher
+
+LISTING_URL = 'https://www.walmart.com/search?q=bread'
+
+
+class FakeDatabase:
+    """The product updates of DatabaseManager a refresh makes, recorded"""
+
+    def __init__(self):
+        self.touched, self.updates, self.failed = [], [], []
+
+    def touch_products(self, product_ids):
+        self.touched += product_ids
+
+    def update_product_columns(self, updates):
+        self.updates += updates
+
+    def mark_refresh_failed(self, product_ids):
+        self.failed += product_ids
+
+
+def stored(row_id, item_id, store_id, price, availability='IN_STOCK'):
+    return {
+        'id': row_id, 'item_id': item_id, 'store_id': store_id, 'keyword': 'bread',
+        'url': f'https://www.walmart.com/ip/{item_id}', 'name': f'Bread {item_id}', 'image': '',
+        'price': price, 'mrp': price, 'discount': '', 'availability': availability,
+    }
+
+
+def tile(item_id, store_id, price):
+    return {
+        '__typename': 'Product',
+        'usItemId': item_id,
+        'canonicalUrl': f'/ip/{item_id}',
+        'name': f'Bread {item_id}',
+        'priceInfo': {'currentPrice': {'priceString': price}},
+        'availabilityStatusV2': {'value': 'IN_STOCK'},
+        'fulfillmentSummary': [{'storeId': store_id}],
+    }
+
+
+def listing(tiles):
+    return {'props': {'pageProps': {'initialData': {'searchResult': {
+        'itemStacks': [{'items': tiles}],
+        'paginationV2': {'maxPage': 1},
+    }}}}}
+
+
+class StoreSite:
+    """Listing and product pages whose prices depend on the store they are rendered for"""
+
+    def __init__(self, prices, sticky=True):
+        self.prices = prices
+        self.sticky = sticky
+        self.listed, self.fetched = [], []
+
+    def rendered_store(self, store_id):
+        return store_id if self.sticky else '1000'
+
+    def list_page(self, url, store_id):
+        self.listed.append(store_id)
+        store = self.rendered_store(store_id)
+        return listing([tile(item_id, store, price) for (item_id, store_id), price in self.prices.items()
+                        if store_id == store])
+
+    def fetch_detail(self, url, store_id):
+        self.fetched.append((url, store_id))
+        store = self.rendered_store(store_id)
+        item_id = url.rsplit('/', 1)[-1]
+        return {**stored(None, item_id, store, self.prices[(item_id, store)]), 'url': url}
+
+
+def test_every_store_row_gets_its_own_store_price():
+    site = StoreSite({('1', '3081'): '$2.00', ('1', '5260'): '$2.50', ('1', '1000'): '$9.99'})
+    db = FakeDatabase()
+    refresher = PriceRefresher(db, site.list_page, site.fetch_detail)
+
+    stats = refresher.refresh([stored(10, '1', '3081', '$2.00'), stored(11, '1', '5260', '$2.25')], [LISTING_URL])
+
+    assert sorted(site.listed) == ['3081', '5260']
+    assert db.touched == [10]
+    assert db.updates == [(11, {'price': '$2.50', 'mrp': '$2.50'})]
+    assert site.fetched == [('https://www.walmart.com/ip/1', '5260')]
+    assert stats['store_mismatches'] == 0
+
+
+def test_page_of_another_store_is_not_written():
+    site = StoreSite({('1', '1000'): '$9.99'}, sticky=False)
+    db = FakeDatabase()
+    refresher = PriceRefresher(db, site.list_page, site.fetch_detail)
+
+    stats = refresher.refresh([stored(10, '1', '3081', '$2.00')], [LISTING_URL])
+
+    assert db.updates == []
+    assert db.touched == []
+    assert db.failed == [10]
+    assert stats['store_mismatches'] == 1
+
+
+def test_listing_page_budget_is_shared_by_all_stores():
+    site = StoreSite({('1', '3081'): '$2.00', ('2', '5260'): '$3.00'})
+    db = FakeDatabase()
+    refresher = PriceRefresher(db, site.list_page, site.fetch_detail, listing_page_budget=1)
+
+    refresher.refresh([stored(10, '1', '3081', '$2.00'), stored(11, '2', '5260', '$3.00')], [LISTING_URL])
+
+    assert site.listed == ['3081']
+    assert sorted(db.touched) == [10, 11]
+    assert site.fetched == [('https://www.walmart.com/ip/2', '5260')]
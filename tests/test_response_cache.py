@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.http_fetcher import HttpFetcher
+from core.response_cache import ResponseCache, classify_url
+
+SEARCH_URL = 'https://www.walmart.com/search?q=milk'
+CATEGORY_URL = 'https://www.walmart.com/browse/food/dairy/976759_9176907'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with ResponseCache(str(tmp_path), ttls={'search': 0.05}) as cache:
+        yield cache
+
+
+@pytest.fixture
+def etag_server(catalog):
+    """Search page server answering 304 Not Modified to a request carrying its ETag"""
+    conditions = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            conditions.append(self.headers.get('If-None-Match'))
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = catalog.listing_page(1)
+            self.send_response(200)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}/search?q=milk", conditions
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_classify_url():
+    assert classify_url(SEARCH_URL) == 'search'
+    assert classify_url(CATEGORY_URL) == 'category'
+    assert classify_url('https://www.walmart.com/cp/food/976759') == 'category'
+    assert classify_url('https://www.walmart.com/ip/milk/10450114') == 'product'
+
+
+def test_entries_are_fresh_for_their_ttl(cache):
+    cache.put(SEARCH_URL, b'<html>results</html>', etag='"v1"')
+
+    assert cache.get(SEARCH_URL) == b'<html>results</html>'
+    time.sleep(0.06)
+
+    # A stale entry is no hit, but keeps what it takes to revalidate it
+    assert cache.get(SEARCH_URL) is None
+    entry = cache.lookup(SEARCH_URL)
+    assert not entry['fresh']
+    assert entry['etag'] == '"v1"'
+    assert entry['body'] == b'<html>results</html>'
+
+    cache.refresh(SEARCH_URL)
+    assert cache.get(SEARCH_URL) == b'<html>results</html>'
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['revalidated'] == 1
+
+
+def test_product_pages_are_not_cached(cache):
+    cache.put('https://www.walmart.com/ip/milk/10450114', b'<html>product</html>')
+
+    assert cache.get('https://www.walmart.com/ip/milk/10450114') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    with ResponseCache(str(tmp_path), max_bytes=2500) as cache:
+        bodies = {f"{CATEGORY_URL}?page={page}": os.urandom(1000) for page in range(3)}
+        urls = list(bodies)
+        for url in urls[:2]:
+            cache.put(url, bodies[url])
+            time.sleep(0.01)
+        # Read last, so the second page is the least recently used one
+        cache.get(urls[0])
+        time.sleep(0.01)
+        cache.put(urls[2], bodies[urls[2]])
+
+        assert cache.get(urls[1]) is None
+        assert cache.get(urls[0]) == bodies[urls[0]]
+        assert cache.get(urls[2]) == bodies[urls[2]]
+        assert cache.stats()['evicted'] == 1
+
+
+def test_fetcher_revalidates_stale_pages(cache, etag_server):
+    url, conditions = etag_server
+    with HttpFetcher(pool_size=1, timeout=10, cache=cache) as fetcher:
+        page = fetcher.get_page(url)
+        assert fetcher.get_page(url) == page
+        time.sleep(0.06)
+        assert fetcher.get_page(url) == page
+
+    # Fresh page served from the cache, stale one revalidated with its ETag
+    assert conditions == [None, '"v1"']
+    assert cache.stats()['revalidated'] == 1
+    assert cache.get(url) == page
@@ -0,0 +1,90 @@
+import pytest
+from mysql.connector.errors import DataError, IntegrityError, OperationalError
+from requests import Response
+from requests.exceptions import ConnectionError as RequestsConnectionError, HTTPError
+from selenium.common.exceptions import TimeoutException
+
+from core.block_detection import BlockedError
+from core.retry import RetryScheduler, backoff_delay, classify_error
+
+
+def http_error(status_code):
+    response = Response()
+    response.status_code = status_code
+    return HTTPError(f"{status_code} Error", response=response)
+
+
+@pytest.mark.parametrize("error, error_class", [
+    (BlockedError("Robot or human?", 'captcha'), 'block'),
+    (IntegrityError("Duplicate entry"), 'permanent'),
+    (DataError("Data too long for column"), 'permanent'),
+    (OperationalError("Lost connection"), 'db'),
+    (http_error(404), 'permanent'),
+    (http_error(410), 'permanent'),
+    (http_error(503), 'timeout'),
+    (TimeoutException("page load"), 'timeout'),
+    (RequestsConnectionError("refused"), 'timeout'),
+    (ValueError("no __NEXT_DATA__"), 'parse'),
+    (KeyError('product'), 'parse'),
+    (RuntimeError("?"), 'unknown'),
+])
+def test_classify_error(error, error_class):
+    assert classify_error(error) == error_class
+
+
+def test_backoff_doubles_with_jitter_up_to_the_cap():
+    for attempt, (low, high) in enumerate([(0.5, 1), (1, 2), (2, 4), (4, 8), (5, 10), (5, 10)], start=1):
+        for _ in range(20):
+            assert low <= backoff_delay(attempt, base_delay=1, max_delay=10) <= high
+
+
+def test_failed_items_wait_out_their_backoff():
+    retry = RetryScheduler(base_delay=0.05, max_delay=0.05)
+    retry.add(['fresh'])
+    retry.fail('failed', TimeoutException("page load"))
+
+    # Only the fresh item is due, the failed one is not waited for
+    assert retry.next_batch() == ['fresh']
+    assert retry.next_batch() == []
+    assert retry.retrying('failed')
+
+    assert retry.next_batch(wait=True) == ['failed']
+    assert retry.next_batch(wait=True) == []
+
+
+def test_dead_letters_once_out_of_attempts():
+    dead = []
+    retry = RetryScheduler(max_attempts={'timeout': 2}, base_delay=0, max_delay=0,
+                           dead_letter=lambda *args: dead.append(args))
+    error = TimeoutException("page load")
+
+    assert retry.fail('url', error) == 'timeout'
+    assert retry.next_batch() == ['url']
+    retry.fail('url', error)
+
+    assert dead == [('url', 'timeout', error, 2)]
+    assert not retry.retrying('url')
+    assert len(retry) == 0
+    assert retry.stats() == {"queued": 0, "retried": 1, "dead_lettered": 1}
+
+
+def test_permanent_errors_are_not_retried():
+    dead = []
+    retry = RetryScheduler(dead_letter=lambda item, error_class, *_: dead.append((item, error_class)))
+
+    retry.fail('gone', http_error(404))
+
+    assert dead == [('gone', 'permanent')]
+    assert len(retry) == 0
+
+
+def test_success_resets_the_attempts():
+    retry = RetryScheduler(max_attempts={'timeout': 2}, base_delay=0, max_delay=0)
+    error = TimeoutException("page load")
+
+    retry.fail('url', error)
+    retry.succeed('url')
+    retry.fail('url', error)
+
+    assert retry.dead_lettered == 0
+    assert retry.retrying('url')
@@ -0,0 +1,139 @@
+from core.sharding import SubcategoryShards, shard_progress
+
+
+def leases(db):
+    return {row['id']: row for row in db.fetch("SELECT * FROM subcategories")}
+
+
+def test_claim_leases_a_shard_per_worker(db):
+    db.add_subcategories(5)
+    first = SubcategoryShards(db, 'worker-a', shard_size=2)
+    second = SubcategoryShards(db, 'worker-b', shard_size=2)
+
+    assert [subcat['id'] for subcat in first.claim()] == [1, 2]
+    assert [subcat['id'] for subcat in second.claim()] == [3, 4]
+
+    rows = leases(db)
+    assert [rows[id]['lease_owner'] for id in (1, 2, 3, 4, 5)] == ['worker-a', 'worker-a', 'worker-b', 'worker-b', None]
+    assert [rows[id]['attempts'] for id in (1, 2, 3, 4, 5)] == [1, 1, 1, 1, 0]
+
+
+def test_claim_skips_done_and_takes_null_status(db):
+    db.add_subcategories(2, status='done')
+    unset = db.add_subcategories(2, status=None)
+
+    shard = SubcategoryShards(db, 'worker-a').claim()
+
+    assert [subcat['id'] for subcat in shard] == unset
+
+
+def test_complete_only_by_lease_owner(db):
+    ids = db.add_subcategories(2)
+    owner = SubcategoryShards(db, 'worker-a')
+    owner.claim()
+
+    SubcategoryShards(db, 'worker-b').complete(ids[0])
+    owner.complete(ids[1])
+
+    rows = leases(db)
+    assert rows[ids[0]]['status'] == 'pending'
+    assert rows[ids[0]]['lease_owner'] == 'worker-a'
+    assert rows[ids[1]]['status'] == 'done'
+    assert rows[ids[1]]['lease_owner'] is None
+    assert SubcategoryShards(db, 'worker-c').claim() == []
+
+
+def test_heartbeat_of_other_worker_renews_nothing(db):
+    pending = db.add_subcategories(1)
+    unset = db.add_subcategories(1, status=None)
+    ids = pending + unset
+    shards = SubcategoryShards(db, 'worker-a', lease_seconds=600)
+    shards.claim()
+    shards.complete(ids[0])
+    db.expire_leases(ids)
+
+    # A heartbeat of another worker does not touch the leases
+    SubcategoryShards(db, 'worker-b').renew(ids)
+    assert [subcat['id'] for subcat in SubcategoryShards(db, 'worker-c').claim()] == unset
+
+
+def test_heartbeat_keeps_lease_alive(db):
+    pending = db.add_subcategories(1)
+    unset = db.add_subcategories(1, status=None)
+    ids = pending + unset
+    shards = SubcategoryShards(db, 'worker-a', lease_seconds=600)
+    shards.claim()
+    db.expire_leases(ids)
+
+    shards.renew(ids)
+
+    # NULL status counts as unfinished, its lease is renewed like a pending one
+    assert SubcategoryShards(db, 'worker-b').claim() == []
+    rows = db.fetch("SELECT id FROM subcategories WHERE lease_expires_at > datetime('now', '+500 seconds')")
+    assert sorted(row['id'] for row in rows) == ids
+
+
+def test_heartbeat_skips_done_subcategories(db):
+    ids = db.add_subcategories(2)
+    shards = SubcategoryShards(db, 'worker-a')
+    shards.claim()
+    shards.complete(ids[0])
+
+    shards.renew(ids)
+
+    rows = leases(db)
+    assert rows[ids[0]]['lease_expires_at'] is None
+    assert rows[ids[1]]['lease_expires_at'] is not None
+
+
+def test_expired_lease_is_reclaimed(db):
+    ids = db.add_subcategories(3)
+    crashed = SubcategoryShards(db, 'worker-a', shard_size=3)
+    crashed.claim()
+    assert SubcategoryShards(db, 'worker-b').claim() == []
+
+    db.expire_leases(ids[:2])
+    reclaimed = SubcategoryShards(db, 'worker-b', shard_size=3).claim()
+
+    assert [subcat['id'] for subcat in reclaimed] == ids[:2]
+    rows = leases(db)
+    assert [rows[id]['lease_owner'] for id in ids] == ['worker-b', 'worker-b', 'worker-a']
+    assert [rows[id]['attempts'] for id in ids] == [2, 2, 1]
+
+    # The worker that lost its lease can no longer finish the subcategory
+    crashed.complete(ids[0])
+    assert leases(db)[ids[0]]['status'] == 'pending'
+
+
+def test_claims_stop_after_max_attempts(db):
+    ids = db.add_subcategories(1)
+    for attempt in range(2):
+        assert SubcategoryShards(db, f'worker-{attempt}', max_attempts=2).claim()
+        db.expire_leases(ids)
+
+    assert SubcategoryShards(db, 'worker-2', max_attempts=2).claim() == []
+
+
+def test_release_hands_shard_back(db):
+    ids = db.add_subcategories(2)
+    shards = SubcategoryShards(db, 'worker-a')
+    shards.claim()
+
+    SubcategoryShards(db, 'worker-b').release(ids)
+    assert SubcategoryShards(db, 'worker-b').claim() == []
+
+    shards.release(ids)
+    assert [subcat['id'] for subcat in SubcategoryShards(db, 'worker-b').claim()] == ids
+
+
+def test_progress_counts_exhausted_subcategories_as_failed(db):
+    ids = db.add_subcategories(4)
+    shards = SubcategoryShards(db, 'worker-a', shard_size=3, max_attempts=1)
+    shards.claim()
+    shards.complete(ids[0])
+    db.expire_leases(ids[1:2])
+
+    progress = shard_progress(db, max_attempts=1)
+
+    assert progress['states'] == {'done': 1, 'leased': 1, 'failed': 1, 'pending': 1}
+    assert [(worker['lease_owner'], worker['subcategories']) for worker in progress['workers']] == [('worker-a', 1)]